@@ -0,0 +1,66 @@
+# Measure the import cost of every utils submodule with `python -X importtime`, next to what it cost
+# when utils/__init__.py imported pandas, folium, shapely and geopandas eagerly
+# Run from the notebooks directory: python -m benchmarks.import_time
+import os
+import subprocess
+import sys
+
+SUBMODULES = [
+    'utils',
+    'utils.constants',
+    'utils.printer',
+    'utils.schema',
+    'utils.datamall',
+    'utils.cache',
+    'utils.helper',
+    'utils.data_cleaning',
+    'utils.spatial_index',
+    'utils.catchment',
+    'utils.maps',
+    'utils.geodataframe',
+    'utils.pipeline',
+    'utils.scenarios',
+]
+# Heavy third-party packages that should only load when a function needs them
+HEAVY_PACKAGES = ['pandas', 'geopandas', 'shapely', 'folium', 'branca', 'requests', 'scipy', 'pyproj']
+# What utils/__init__.py ran before the heavy dependencies were loaded lazily; run ahead of a
+# submodule's import, it reproduces the old cost of that submodule
+EAGER_IMPORTS = 'import pandas, folium, shapely.geometry, geopandas'
+REPEATS = 3
+
+
+# Import a module in a fresh interpreter and get its import time (us) and the heavy packages it loaded
+def measureImport(module: str, eager: bool = False):
+    # Packages imported through utils.__getattr__ are not always listed by -X importtime, so check sys.modules
+    code = f'import sys, {module}; print(",".join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))' if module else 'pass'
+    if eager:
+        code = f'{EAGER_IMPORTS}; {code}'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=os.getcwd(), check=True)
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level entries (no leading spaces in the name column) add up to the full cost
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total_us += int(cumulative)
+    return total_us, [p for p in result.stdout.strip().split(',') if p]
+
+
+def main():
+    # Interpreter startup (site, encodings) is common to every run
+    startup_us = min(measureImport('')[0] for _ in range(REPEATS))
+    print(f"{'module':<22}{'eager ms':>10}{'lazy ms':>10}{'saved ms':>10}  heavy packages loaded")
+    for module in SUBMODULES:
+        runs = [measureImport(module) for _ in range(REPEATS)]
+        lazy_us = max(min(total for total, _ in runs) - startup_us, 0)
+        eager_us = max(min(measureImport(module, eager=True)[0] for _ in range(REPEATS)) - startup_us, 0)
+        print(f"{module:<22}{eager_us / 1000:>10.1f}{lazy_us / 1000:>10.1f}{(eager_us - lazy_us) / 1000:>10.1f}"
+              f"  {', '.join(runs[0][1]) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Benchmark the prebuilt RegionIndex against the gpd.sjoin path of createPTStopsDF
+# Run from the notebooks directory: python -m benchmarks.region_index
+# The counts of both paths are compared in tests/test_spatial_index.py
+import time
+import numpy as np
+import geopandas as gpd
+import pandas as pd
+from utils.geodataframe import createAreaGeoDF
+from utils.helper import createPTStopsDF
+from utils.spatial_index import RegionIndex
+
+SIZES = [5_000, 50_000, 500_000]
+
+
+# Create random stops inside the bounding box of the regions
+def createRandomStops(regions: gpd.GeoDataFrame, num_points: int, seed: int = 0) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = regions.total_bounds
+    lon = rng.uniform(minx, maxx, num_points)
+    lat = rng.uniform(miny, maxy, num_points)
+    return gpd.GeoDataFrame(
+        {'Longitude': lon, 'Latitude': lat},
+        geometry=gpd.points_from_xy(lon, lat), crs="EPSG:4326")
+
+
+def timeCall(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    regions = createAreaGeoDF()
+    _, build_seconds = timeCall(RegionIndex, regions)
+    print(f"RegionIndex built in {build_seconds * 1000:.1f} ms")
+
+    rows = []
+    for num_points in SIZES:
+        stops = createRandomStops(regions, num_points)
+        _, sjoin_seconds = timeCall(createPTStopsDF, regions, stops, 'bus')
+        region_index = RegionIndex(regions)
+        _, index_seconds = timeCall(
+            createPTStopsDF, regions, stops, 'bus', region_index=region_index)
+        # Later consumers of the same stop type (e.g. addBusStopClusters) reuse the assignment
+        _, shared_seconds = timeCall(region_index.assignStops, stops, 'bus')
+        rows.append({
+            'points': num_points,
+            'sjoin_s': round(sjoin_seconds, 4),
+            'region_index_s': round(index_seconds, 4),
+            'speedup': round(sjoin_seconds / index_seconds, 1),
+            'shared_assignment_s': round(shared_seconds, 6),
+        })
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# Time and memory-profile the utils functions on synthetic data at 1x, 10x and 100x Singapore scale
+# Run from the notebooks directory, fully offline:
+#   python -m benchmarks.suite --output results.json
+#   python -m benchmarks.suite --scales 1 10 --compare results.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib.metadata import version
+from typing import Callable, Dict
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from benchmarks.synthetic import createBusStopRecords, createPopulationDF, writeDataset
+
+SCALES = [1, 10, 100]
+REPEATS = 3
+# A case this much slower than the baseline is reported as a regression
+REGRESSION_RATIO = 1.2
+PACKAGES = ['pandas', 'numpy', 'shapely', 'geopandas', 'folium', 'pyarrow', 'scipy', 'pyproj']
+
+
+# Load the synthetic inputs the way the notebooks do
+def loadInputs(paths: Dict[str, str]) -> dict:
+    from utils.data_cleaning import cleanHDBDF, cleanTrainStationDF
+    from utils.geodataframe import cleanRegionPTDF, createAreaGeoDF, getLandArea
+    from utils.helper import addDensityDiscrepancies, createPTStopsDF, getDataframe
+    from utils.spatial_index import RegionIndex
+
+    with open(paths['bus_stops']) as f:
+        bus_records = json.load(f)['value']
+    bus_df = getDataframe(bus_records)
+    bus_routes = pd.read_parquet(paths['bus_routes'])
+    bus_services = pd.read_parquet(paths['bus_services'])
+    regions = createAreaGeoDF(paths['regions'], None)
+    train_raw = gpd.read_file(paths['train_stations'])
+    train_df = cleanTrainStationDF(train_raw, mrt_json=paths['mrt_json'])
+    population_csv = pd.read_csv(paths['population'])
+    population = cleanHDBDF(population_csv, regions_csv=paths['regions'])
+
+    bus_gdf = gpd.GeoDataFrame(bus_df, geometry=gpd.points_from_xy(bus_df.Longitude, bus_df.Latitude))
+    train_gdf = gpd.GeoDataFrame(train_df, geometry=train_df.GEOMETRY)
+    region_index = RegionIndex(regions)
+    bus_counts = createPTStopsDF(regions, bus_gdf, 'bus', region_index=region_index)
+    train_counts = createPTStopsDF(regions, train_gdf, 'train', region_index=region_index)
+    region_pt = cleanRegionPTDF(regions, bus_counts, train_counts)
+
+    analysis = region_pt.merge(population[['Area', 'population_count']], on='Area', how='inner')
+    analysis = addDensityDiscrepancies(getLandArea(analysis))
+
+    return {
+        'paths': paths, 'bus_records': bus_records, 'bus_df': bus_df, 'bus_gdf': bus_gdf,
+        'bus_routes': bus_routes, 'bus_services': bus_services,
+        'regions': regions, 'train_raw': train_raw, 'train_df': train_df, 'train_gdf': train_gdf,
+        'population_csv': population_csv, 'population': population,
+        'bus_counts': bus_counts, 'train_counts': train_counts, 'region_pt': region_pt, 'analysis': analysis,
+    }
+
+
+# Get one zero-argument call per utils function, using the prepared inputs
+def createCases(inputs: dict) -> Dict[str, Callable]:
+    from utils import accessibility, geodataframe
+    from utils.archives import loadBusStopLayer, loadTrainStationLayer
+    from utils.accessibility import TrainNetwork
+    from utils.bus_network import BusNetwork
+    from utils.catchment import StopCatchment
+    from utils.data_cleaning import cleanHDBDF, cleanTrainStationDF, streamHDBDF
+    from utils.geodataframe import (addDensityHeatmap, cleanRegionPTDF, createAreaGeoDF,
+                                    createChoropleth, getLandArea)
+    from utils.grid import SpatialGrid
+    from utils.helper import addDensityDiscrepancies, createPTStopsDF, getDataframe, getDensityDiscrepancyDF
+    from utils.maps import addBusStopMarkers, createSingaporeMap
+    from utils.pipeline import DensityPipeline
+    from utils.schema import compactDF
+    from utils.scenarios import ScenarioEvaluator, combineStationSets
+    from utils.spatial_index import RegionIndex
+    from utils.trends import Snapshot, analyseTrends
+
+    regions, analysis, paths = inputs['regions'], inputs['analysis'], inputs['paths']
+    land_area_columns = ['land_area-km2'] + [col for col in analysis if 'density' in col or 'per_capita' in col]
+    base_table = analysis.drop(columns=land_area_columns)
+
+    def getLandAreaCold():
+        # Measure the calculation, not the session cache
+        geodataframe.LAND_AREA_CACHE.clear()
+        return getLandArea(inputs['region_pt'].copy())
+
+    def createAccessibilityDF():
+        accessibility.TRAVEL_TIME_CACHE.clear()
+        return TrainNetwork(inputs['train_df']).createAccessibilityDF(regions, 'interchanges')
+
+    def renderDensityMap():
+        folium_map = addDensityHeatmap(analysis, createSingaporeMap(), 'total')
+        return folium_map.get_root().render()
+
+    def renderBusStopMarkers():
+        folium_map = addBusStopMarkers(inputs['bus_df'], createSingaporeMap(), lightweight=True)
+        return folium_map.get_root().render()
+
+    def scoreScenarios():
+        candidates = inputs['train_df'].drop_duplicates('STN_NAME').head(40).reset_index(drop=True)
+        coordinates = candidates['COORDINATES'].to_numpy()
+        candidates = candidates.assign(Longitude=shapely.get_x(coordinates), Latitude=shapely.get_y(coordinates))
+        phases = {f'P{i}': candidates['STN_NO'].iloc[i * 4:(i + 1) * 4].tolist() for i in range(10)}
+        evaluator = ScenarioEvaluator(analysis, candidates, RegionIndex(regions))
+        return evaluator.scoreScenarios(combineStationSets(phases, 3))
+
+    # Three yearly snapshots, written next to the other synthetic files
+    directory = os.path.dirname(inputs['paths']['regions'])
+    snapshots = []
+    for year in range(2021, 2024):
+        population_path = os.path.join(directory, f'population_{year}.csv')
+        bus_stops_path = os.path.join(directory, f'bus_stops_{year}.csv')
+        createPopulationDF(len(regions) // 100, seed=year).to_csv(population_path, index=False)
+        pd.DataFrame(createBusStopRecords(len(regions) // 100, seed=year)).to_csv(bus_stops_path, index=False)
+        snapshots.append(Snapshot(year, population_path, bus_stops_path, inputs['paths']['train_stations']))
+
+    def createGridDF():
+        grid = SpatialGrid(regions, 250, 'hex')
+        return grid.createGridDF(inputs['population'], {'bus': inputs['bus_df'], 'train': inputs['train_df']})
+
+    return {
+        'helper.getDataframe': lambda: getDataframe(inputs['bus_records']),
+        'data_cleaning.cleanHDBDF': lambda: cleanHDBDF(inputs['population_csv'], regions_csv=paths['regions']),
+        'data_cleaning.streamHDBDF': lambda: streamHDBDF(paths['population'], regions_csv=paths['regions']),
+        'data_cleaning.cleanTrainStationDF': lambda: cleanTrainStationDF(inputs['train_raw'], mrt_json=paths['mrt_json']),
+        'archives.loadTrainStationLayer': lambda: loadTrainStationLayer(inputs['paths']['train_stations_zip']),
+        'archives.loadBusStopLayer': lambda: loadBusStopLayer(inputs['paths']['bus_stops_zip']),
+        'geodataframe.createAreaGeoDF': lambda: createAreaGeoDF(inputs['paths']['regions'], None),
+        'spatial_index.RegionIndex': lambda: RegionIndex(regions),
+        'helper.createPTStopsDF[sjoin]': lambda: createPTStopsDF(regions, inputs['bus_gdf'], 'bus'),
+        'helper.createPTStopsDF[region_index]':
+            lambda: createPTStopsDF(regions, inputs['bus_gdf'], 'bus', region_index=RegionIndex(regions)),
+        'geodataframe.cleanRegionPTDF':
+            lambda: cleanRegionPTDF(regions, inputs['bus_counts'], inputs['train_counts']),
+        'geodataframe.getLandArea': getLandAreaCold,
+        'helper.addDensityDiscrepancies': lambda: addDensityDiscrepancies(base_table.assign(**{
+            'land_area-km2': analysis['land_area-km2']})),
+        'helper.getDensityDiscrepancyDF': lambda: getDensityDiscrepancyDF(analysis, 'total'),
+        'schema.compactDF': lambda: compactDF(inputs['bus_df'], 'bus_df'),
+        'geodataframe.createChoropleth': lambda: createChoropleth(
+            analysis, [f'normalized_{pt_type}_density_discrepancy' for pt_type in ['bus', 'train', 'total']]),
+        'geodataframe.addDensityHeatmap[render]': renderDensityMap,
+        'maps.addBusStopMarkers[lightweight, render]': renderBusStopMarkers,
+        'catchment.StopCatchment': lambda: StopCatchment(inputs['bus_df'], inputs['train_df']).createCatchmentDF(
+            inputs['bus_df'][['Longitude', 'Latitude']]),
+        'grid.SpatialGrid[250m hex]': createGridDF,
+        'pipeline.DensityPipeline': lambda: DensityPipeline(
+            regions, inputs['population'], {'bus': inputs['bus_gdf'], 'train': inputs['train_gdf']}),
+        'scenarios.ScenarioEvaluator': scoreScenarios,
+        'accessibility.TrainNetwork': createAccessibilityDF,
+        'trends.analyseTrends[3 years]': lambda: analyseTrends(
+            regions, snapshots, regions_csv=paths['regions'], mrt_json=paths['mrt_json'])['total_growth'],
+        'bus_network.BusNetwork': lambda: BusNetwork(inputs['bus_routes'], inputs['bus_services']),
+        'bus_network.createServiceDF': lambda: BusNetwork(inputs['bus_routes'], inputs['bus_services']).createServiceDF(
+            inputs['bus_df'], RegionIndex(regions)),
+    }
+
+
+# Time a call (best and mean of several runs), then measure its peak traced allocation in one more run
+def measureCase(func: Callable, repeats: int) -> dict:
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+
+    # tracemalloc sees Python and NumPy allocations, but not GEOS / Arrow buffers
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'rows': len(result) if hasattr(result, '__len__') and not isinstance(result, str) else None,
+        'seconds': min(seconds),
+        'mean_seconds': float(np.mean(seconds)),
+        'peak_mib': peak / 1024 ** 2,
+    }
+
+
+def runScale(scale: int, repeats: int, only: list = None) -> list:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = writeDataset(directory, scale)
+        results = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            inputs = loadInputs(paths)
+            cases = createCases(inputs)
+            for name, func in cases.items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                results.append({'case': name, 'scale': scale, **measureCase(func, repeats)})
+
+    for result in results:
+        print(f"{scale:>4}x  {result['case']:<44}{result['seconds']:>10.4f} s{result['peak_mib']:>10.1f} MiB")
+    return results
+
+
+def getGitCommit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Print every case that got slower than the baseline results
+def compareResults(baseline: dict, current: dict) -> pd.DataFrame:
+    keys = ['case', 'scale']
+    merged = pd.DataFrame(baseline['results']).merge(
+        pd.DataFrame(current['results']), on=keys, suffixes=('_baseline', ''))
+    merged['ratio'] = merged['seconds'] / merged['seconds_baseline']
+    merged['memory_ratio'] = merged['peak_mib'] / merged['peak_mib_baseline']
+    merged['regression'] = merged['ratio'] > REGRESSION_RATIO
+
+    print(f"\nCompared with {baseline.get('git_commit')} ({baseline.get('created')}):")
+    print(merged[keys + ['seconds_baseline', 'seconds', 'ratio', 'memory_ratio', 'regression']].to_string(index=False))
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the utils functions on synthetic data.")
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--only', nargs='+', help="only run cases whose name contains one of these")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        results += runScale(scale, args.repeats, args.only)
+
+    current = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': getGitCommit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': {package: version(package) for package in PACKAGES},
+        'repeats': args.repeats,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compareResults(json.load(f), current)['regression']
+        # Non-zero exit so a CI job can fail on a regression
+        raise SystemExit(int(regressions.any()))
+
+
+if __name__ == '__main__':
+    main()
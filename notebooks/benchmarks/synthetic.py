@@ -0,0 +1,229 @@
+# Synthetic inputs with the same schemas as the data/ files, at multiples of Singapore's size
+# Scale 1 has as many Areas, subzones, bus stops and stations as the real data
+import json
+import os
+import tempfile
+import zipfile
+from itertools import product
+from typing import Dict
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from utils.constants import FREQUENCY_PERIODS
+
+# Rough extent of the real regions, and the size of the real data
+BOUNDS = (103.6, 1.16, 104.09, 1.47)
+NUM_AREAS = 100
+POPULATED_SHARE = 0.55
+SUBZONES_PER_AREA = 6
+POINTS_PER_POLYGON = 400
+NUM_BUS_STOPS = 5_100
+# About 26k BusRoutes rows
+NUM_BUS_SERVICES = 580
+STOPS_PER_ROUTE = 22
+ROUTE_WINDOW = 300
+NUM_STATIONS = 230
+DEPOT_SHARE = 0.05
+
+DWELLING_TYPES = [
+    'HDB 1- and 2-Room Flats', 'HDB 3-Room Flats', 'HDB 4-Room Flats', 'HDB 5-Room and Executive Flats',
+    'HUDC Flats (excluding those privatised)', 'Landed Properties', 'Condominiums and Other Apartments', 'Others',
+]
+# Subzone suffixes that cleanHDBDF strips (KEY_WORDS) before matching the Area name
+SUBZONE_SUFFIXES = ['North', 'South', 'East', 'West', 'Central', 'Rise']
+LINES = ['NS', 'EW', 'CC', 'DT', 'NE', 'TE']
+
+# Consonant-vowel syllables never spell a KEY_WORD, so names only match where intended
+CONSONANTS = 'bdfgklmnprstvz'
+VOWELS = 'aiou'
+
+
+# Get n distinct capitalised names such as "Bakomi"
+def createNames(n: int, syllables: int = 3) -> list:
+    parts = [c + v for c, v in product(CONSONANTS, VOWELS)]
+    names = (''.join(combo).capitalize() for combo in product(parts, repeat=syllables))
+    return [next(names) for _ in range(n)]
+
+
+# Lay out one tile per Area, extending the extent (not shrinking the Areas) as the scale grows
+def createTiles(num_areas: int, scale: int):
+    minx, miny, maxx, maxy = BOUNDS
+    width, height = (maxx - minx) * np.sqrt(scale), (maxy - miny) * np.sqrt(scale)
+    n_cols = int(np.ceil(np.sqrt(num_areas * width / height)))
+    n_rows = int(np.ceil(num_areas / n_cols))
+    tile_w, tile_h = width / n_cols, height / n_rows
+
+    idx = np.arange(num_areas)
+    centres = np.column_stack([minx + (idx % n_cols + 0.5) * tile_w, miny + (idx // n_cols + 0.5) * tile_h])
+    return centres, (tile_w, tile_h), (minx, miny, minx + width, miny + height)
+
+
+# Regions in the All Regions_Coordinates.csv layout: one star-shaped ring per Area
+def createRegionsDF(scale: int = 1, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    num_areas = NUM_AREAS * scale
+    centres, (tile_w, tile_h), _ = createTiles(num_areas, scale)
+
+    # Sorted angles around the centre always give a simple polygon, kept inside its tile
+    angles = np.sort(rng.uniform(0, 2 * np.pi, (num_areas, POINTS_PER_POLYGON)), axis=1)
+    # A smooth outline with a few bulges and some vertex noise, like a real boundary
+    phases = rng.uniform(0, 2 * np.pi, (num_areas, 3, 1))
+    radii = 0.38 + sum(0.025 * np.sin(k * angles + phases[:, k - 2]) for k in range(2, 5))
+    radii += rng.uniform(-0.003, 0.003, radii.shape)
+    lon = centres[:, [0]] + radii * tile_w * np.cos(angles)
+    lat = centres[:, [1]] + radii * tile_h * np.sin(angles)
+
+    return pd.DataFrame({
+        'Area': np.repeat(createNames(num_areas), POINTS_PER_POLYGON),
+        'Point Order': np.tile(np.arange(1, POINTS_PER_POLYGON + 1) / 10_000, num_areas),
+        'Polygon ID': np.repeat(np.arange(num_areas), POINTS_PER_POLYGON),
+        'Latitude': lat.ravel(),
+        'Longitude': lon.ravel(),
+    })
+
+
+# Dwelling counts in the population_subzone.csv layout
+def createPopulationDF(scale: int = 1, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    areas = np.array(createNames(NUM_AREAS * scale))
+    areas = areas[rng.random(len(areas)) < POPULATED_SHARE]
+
+    subzones = [(area, f"{area} {suffix}") for area in areas for suffix in SUBZONE_SUFFIXES[:SUBZONES_PER_AREA]]
+    rows = len(subzones) * len(DWELLING_TYPES)
+    hse = rng.integers(0, 3_000, rows)
+    # About a third of the real rows have no dwellings
+    hse[rng.random(rows) < 0.3] = 0
+
+    return pd.DataFrame({
+        'PA': np.repeat([pa for pa, _ in subzones], len(DWELLING_TYPES)),
+        'SZ': np.repeat([sz for _, sz in subzones], len(DWELLING_TYPES)),
+        'TOD': np.tile(DWELLING_TYPES, len(subzones)),
+        'HSE': hse,
+        'Time': 2023,
+    })
+
+
+# Bus stops as returned by getAllRecords for the DataMall BusStops dataset
+def createBusStopRecords(scale: int = 1, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    _, _, (minx, miny, maxx, maxy) = createTiles(NUM_AREAS * scale, scale)
+    n = NUM_BUS_STOPS * scale
+    lon, lat = rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n)
+    roads = createNames(max(n // 20, 1))
+
+    return [
+        {'BusStopCode': f'{i:05d}' if i < 100_000 else str(i), 'RoadName': f'{roads[i % len(roads)]} Road',
+         'Description': f'Blk {i % 900 + 100}', 'Latitude': float(y), 'Longitude': float(x)}
+        for i, (x, y) in enumerate(zip(lon, lat))
+    ]
+
+
+# BusRoutes and BusServices tables for the stops of createBusStopRecords
+def createBusRoutes(bus_stop_records: list, scale: int = 1, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    codes = pd.DataFrame(bus_stop_records).sort_values('Longitude')['BusStopCode'].to_numpy()
+    num_services = NUM_BUS_SERVICES * scale
+
+    routes = []
+    for service in range(num_services):
+        # Each service visits nearby stops, then runs back in the other direction
+        start = rng.integers(0, max(len(codes) - ROUTE_WINDOW, 1))
+        window = codes[start:start + ROUTE_WINDOW]
+        stops = rng.choice(window, size=min(STOPS_PER_ROUTE, len(window)), replace=False)
+        for direction, sequence in [(1, stops), (2, stops[::-1])]:
+            routes.append(pd.DataFrame({
+                'ServiceNo': str(service + 1), 'Operator': 'SBST', 'Direction': direction,
+                'StopSequence': np.arange(1, len(sequence) + 1), 'BusStopCode': sequence,
+                'Distance': np.round(np.arange(len(sequence)) * 0.4, 1),
+                'WD_FirstBus': '0530', 'WD_LastBus': '2330',
+            }))
+    routes = pd.concat(routes, ignore_index=True)
+
+    def createHeadways():
+        low = rng.integers(3, 20, num_services * 2)
+        headways = pd.Series([f'{a:02d}-{a + b:02d}' for a, b in zip(low, rng.integers(0, 8, len(low)))])
+        # Some services do not run in every period
+        return headways.mask(rng.random(len(low)) < 0.1, '-')
+
+    services = pd.DataFrame({
+        'ServiceNo': np.repeat([str(service + 1) for service in range(num_services)], 2),
+        'Operator': 'SBST',
+        'Direction': np.tile([1, 2], num_services),
+        'Category': rng.choice(['TRUNK', 'FEEDER', 'EXPRESS'], num_services * 2, p=[0.7, 0.25, 0.05]),
+        **{period: createHeadways() for period in FREQUENCY_PERIODS},
+    })
+    return routes, services
+
+
+# Station polygons in the TrainStationCoordinates.json layout, and the matching MRTLRTStnPtt.json records
+def createTrainStations(scale: int = 1, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    _, _, (minx, miny, maxx, maxy) = createTiles(NUM_AREAS * scale, scale)
+    n = NUM_STATIONS * scale
+    names = [f"{name.upper()} MRT STATION" for name in createNames(n, syllables=4)]
+    is_depot = rng.random(n) < DEPOT_SHARE
+    names = [name.replace('MRT STATION', 'DEPOT') if depot else name for name, depot in zip(names, is_depot)]
+
+    centres = shapely.points(rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n))
+    stations = gpd.GeoDataFrame({
+        'TYP_CD': 0, 'STN_NAM': '', 'ATTACHEMEN': '',
+        'TYP_CD_DES': np.where(rng.random(n) < 0.85, 'MRT', 'LRT'),
+        'STN_NAM_DE': names,
+    }, geometry=shapely.buffer(centres, 0.0008, quad_segs=10), crs="EPSG:4326")
+
+    # Every station gets a number on one line, and some are interchanges on a second line
+    lines = rng.integers(0, len(LINES), (n, 2))
+    stn_no = [f"{LINES[a]}{i % 40 + 1}" + (f"/{LINES[b]}{i % 37 + 1}" if a != b and i % 5 == 0 else '')
+              for i, (a, b) in enumerate(lines)]
+    mrt_records = [{'STN_NAME': name, 'STN_NO': no} for name, no, depot in zip(names, stn_no, is_depot) if not depot]
+    return stations, mrt_records
+
+
+# Zip a layer as a shapefile in SVY21 inside a folder, like the LTA archives (e.g. TrainStation_Jul2024.zip)
+def writeZippedShapefile(geo_df: gpd.GeoDataFrame, zip_path: str, folder: str, layer: str) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        geo_df.to_crs("EPSG:3414").to_file(os.path.join(directory, f'{layer}.shp'))
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name in sorted(os.listdir(directory)):
+                archive.write(os.path.join(directory, name), f'{folder}/{name}')
+
+
+# Write a full synthetic data directory, laid out like data/
+def writeDataset(directory: str, scale: int = 1, seed: int = 0) -> Dict[str, str]:
+    paths = {
+        'regions': os.path.join(directory, 'All Regions_Coordinates.csv'),
+        'population': os.path.join(directory, 'hsetod2023', 'population_subzone.csv'),
+        'bus_stops': os.path.join(directory, 'BusStops.json'),
+        'bus_routes': os.path.join(directory, 'BusRoutes.parquet'),
+        'bus_services': os.path.join(directory, 'BusServices.parquet'),
+        'train_stations': os.path.join(directory, 'RapidTransitSystemStation', 'TrainStationCoordinates.json'),
+        'mrt_json': os.path.join(directory, 'MRTLRTStnPtt.json'),
+        'train_stations_zip': os.path.join(directory, 'TrainStation_Jul2024.zip'),
+        'bus_stops_zip': os.path.join(directory, 'BusStopLocation_Jul2024.zip'),
+    }
+    for path in paths.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    createRegionsDF(scale, seed).to_csv(paths['regions'], index=False)
+    createPopulationDF(scale, seed).to_csv(paths['population'], index=False)
+    bus_stop_records = createBusStopRecords(scale, seed)
+    with open(paths['bus_stops'], 'w') as f:
+        # The DataMall response body
+        json.dump({'value': bus_stop_records}, f)
+    # Bus routes and services are stored like the loadSnapshot cache
+    routes, services = createBusRoutes(bus_stop_records, scale, seed)
+    routes.to_parquet(paths['bus_routes'], index=False)
+    services.to_parquet(paths['bus_services'], index=False)
+
+    stations, mrt_records = createTrainStations(scale, seed)
+    stations.to_file(paths['train_stations'], driver='GeoJSON')
+    writeZippedShapefile(stations, paths['train_stations_zip'], 'TrainStation_Jul2024', 'RapidTransitSystemStation')
+    bus_stops = pd.DataFrame(bus_stop_records)
+    writeZippedShapefile(gpd.GeoDataFrame(
+        {'BUS_STOP_N': bus_stops['BusStopCode'], 'BUS_ROOF_N': 'B01', 'LOC_DESC': bus_stops['Description']},
+        geometry=gpd.points_from_xy(bus_stops['Longitude'], bus_stops['Latitude']), crs="EPSG:4326"),
+        paths['bus_stops_zip'], 'BusStopLocation_Jul2024', 'BusStop')
+    with open(paths['mrt_json'], 'w') as f:
+        json.dump(mrt_records, f)
+    return paths
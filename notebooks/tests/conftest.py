@@ -0,0 +1,5 @@
+# The utils package lives in notebooks/, next to the notebooks that import it
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,119 @@
+# Train travel times on a small network, against minutes worked out edge by edge
+import numpy as np
+import pytest
+import shapely
+
+from utils import accessibility, gpd, pd
+from utils.accessibility import (DWELL_MINUTES, RAIL_SPEEDS, TRANSFER_MINUTES, WALK_METRES_PER_MINUTE,
+                                 TrainNetwork)
+from utils.catchment import projectToMetres
+
+# Rows as cleanTrainStationDF gives them: one per line at interchanges, sorted by LINE and NUM.
+# EPSILON is a one-station line about 100 m from GAMMA; the PE loop and its PTC hub are not
+# connected to the MRT lines.
+STATIONS = [
+    ('CC1', 'EPSILON', 'CC', 1, 'MRT', 103.820, 1.3009),
+    ('EW1', 'ALPHA', 'EW', 1, 'MRT', 103.800, 1.300),
+    ('EW2', 'CENTRAL', 'EW', 2, 'MRT', 103.810, 1.300),
+    ('EW3', 'GAMMA', 'EW', 3, 'MRT', 103.820, 1.300),
+    ('NS1', 'CENTRAL', 'NS', 1, 'MRT', 103.810, 1.300),
+    ('NS2', 'DELTA', 'NS', 2, 'MRT', 103.810, 1.310),
+    ('PE1', 'PE ONE', 'PE', 1, 'LRT', 103.835, 1.320),
+    ('PE2', 'PE TWO', 'PE', 2, 'LRT', 103.835, 1.325),
+    ('PTC', 'HUB', 'PTC', 0, 'LRT', 103.830, 1.320),
+]
+
+
+@pytest.fixture(scope='module')
+def network():
+    df = pd.DataFrame(STATIONS, columns=['STN_NO', 'STN_NAME', 'LINE', 'NUM', 'TYPE', 'lon', 'lat'])
+    df['COORDINATES'] = shapely.points(df['lon'], df['lat'])
+    return TrainNetwork(df)
+
+
+def metres(a: str, b: str) -> float:
+    coordinates = {name: (lon, lat) for _, name, _, _, _, lon, lat in STATIONS}
+    (x1, y1), (x2, y2) = projectToMetres(*np.transpose([coordinates[a], coordinates[b]]))
+    return np.hypot(x1 - x2, y1 - y2)
+
+
+def ride(a: str, b: str, train_type: str = 'MRT') -> float:
+    return metres(a, b) / (RAIL_SPEEDS[train_type] * 1000 / 60) + DWELL_MINUTES
+
+
+def test_travel_times_to_an_interchange(network):
+    minutes = network.getTravelTimes(['CENTRAL'])
+    expected = {
+        'CENTRAL': 0,
+        'ALPHA': ride('ALPHA', 'CENTRAL'),
+        'GAMMA': ride('CENTRAL', 'GAMMA'),
+        # Either platform of CENTRAL is a start, so no transfer
+        'DELTA': ride('CENTRAL', 'DELTA'),
+        'EPSILON': ride('CENTRAL', 'GAMMA') + TRANSFER_MINUTES + metres('GAMMA', 'EPSILON') / WALK_METRES_PER_MINUTE,
+    }
+    for station, value in expected.items():
+        assert minutes[station] == pytest.approx(value)
+    # The LRT loop has no link to the MRT lines
+    assert np.isinf(minutes[['HUB', 'PE ONE', 'PE TWO']]).all()
+
+
+def test_travel_times_change_lines_and_use_the_hub(network):
+    minutes = network.getTravelTimes(['ALPHA'])
+    assert minutes['DELTA'] == pytest.approx(
+        ride('ALPHA', 'CENTRAL') + TRANSFER_MINUTES + ride('CENTRAL', 'DELTA'))
+
+    minutes = network.getTravelTimes(['HUB'])
+    # The hub is joined to both ends of the loop, and the loop ends to each other
+    assert minutes['PE ONE'] == pytest.approx(ride('HUB', 'PE ONE', 'LRT'))
+    assert minutes['PE TWO'] == pytest.approx(min(
+        ride('HUB', 'PE TWO', 'LRT'), ride('HUB', 'PE ONE', 'LRT') + ride('PE ONE', 'PE TWO', 'LRT')))
+
+
+def test_travel_time_matrix_matches_single_searches(network):
+    matrix = network.travelTimeMatrix
+    for station in ['CENTRAL', 'ALPHA', 'HUB']:
+        expected = network.getTravelTimes([station])
+        np.testing.assert_allclose(matrix[station].to_numpy(), expected.to_numpy())
+    assert set(network.interchanges) == {'CENTRAL'}
+    with pytest.raises(ValueError):
+        network.getTravelTimes(['NOWHERE'])
+
+
+def test_travel_time_cache_is_bounded(network, monkeypatch):
+    monkeypatch.setattr(accessibility, 'TRAVEL_TIME_CACHE_SIZE', 2)
+    accessibility.TRAVEL_TIME_CACHE.clear()
+    for station in ['ALPHA', 'GAMMA', 'ALPHA', 'DELTA']:
+        network.getTravelTimes([station])
+
+    # GAMMA was the least recently used
+    assert list(accessibility.TRAVEL_TIME_CACHE) == [(network.key, ('ALPHA',)), (network.key, ('DELTA',))]
+
+
+def square(lon: float, lat: float, half: float = 0.001):
+    return shapely.box(lon - half, lat - half, lon + half, lat + half)
+
+
+def test_accessibility_walks_to_the_best_of_the_nearest_stations(network):
+    regions = gpd.GeoDataFrame({
+        'Area': ['West', 'North', 'Loop'],
+        'geometry': [square(103.802, 1.300), square(103.811, 1.309), square(103.834, 1.322)],
+    })
+    result = network.createAccessibilityDF(regions, 'CENTRAL')
+    assert result['Area'].tolist() == ['West', 'North', 'Loop']
+
+    minutes = network.getTravelTimes(['CENTRAL'])
+    points = shapely.point_on_surface(regions.geometry.to_numpy())
+    start = projectToMetres(shapely.get_x(points), shapely.get_y(points))
+    first = network.platforms.drop_duplicates('STN_NAME')
+    stations = network.points[first.index]
+    for row, point in enumerate(start[:2]):
+        # Brute force over the three nearest stations
+        walk = np.hypot(*(stations - point).T) / WALK_METRES_PER_MINUTE
+        nearest = np.argsort(walk)[:3]
+        total = walk[nearest] + minutes[first['STN_NAME'].to_numpy()[nearest]].to_numpy()
+        best = nearest[np.argmin(total)]
+        assert result.loc[row, 'access_station'] == first['STN_NAME'].iloc[best]
+        assert result.loc[row, 'walk_minutes'] == pytest.approx(walk[best])
+        assert result.loc[row, 'accessibility_minutes'] == pytest.approx(total.min())
+    # Only unconnected LRT stations are near the loop
+    assert np.isnan(result.loc[2, 'accessibility_minutes'])
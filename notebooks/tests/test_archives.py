@@ -0,0 +1,64 @@
+# Zipped LTA layers read in place, against the extracted GeoJSON and the DataMall records
+import os
+import zipfile
+
+import numpy as np
+import pytest
+import shapely
+
+from benchmarks.synthetic import writeDataset
+from utils import gpd, pd
+from utils.archives import loadBusStopLayer, loadTrainStationLayer
+from utils.data_cleaning import cleanTrainStationDF
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+TRAIN_STATION_ZIP = os.path.join(DATA_DIR, 'TrainStation_Jul2024.zip')
+TRAIN_STATION_JSON = os.path.join(DATA_DIR, 'RapidTransitSystemStation', 'TrainStationCoordinates.json')
+MRT_JSON = os.path.join(DATA_DIR, 'MRTLRTStnPtt.json')
+
+
+def assertSameStations(result: pd.DataFrame, expected: pd.DataFrame):
+    columns = ['STN_NO', 'STN_NAME', 'TYPE', 'LINE', 'NUM']
+    pd.testing.assert_frame_equal(result[columns], expected[columns])
+    # The shapefile is in SVY21, so only the round trip to WGS84 differs
+    assert shapely.hausdorff_distance(result['GEOMETRY'].to_numpy(), expected['GEOMETRY'].to_numpy()).max() < 1e-9
+    np.testing.assert_allclose(shapely.get_coordinates(result['COORDINATES'].to_numpy()),
+                               shapely.get_coordinates(expected['COORDINATES'].to_numpy()), atol=1e-9)
+
+
+@pytest.mark.skipif(not os.path.exists(TRAIN_STATION_ZIP), reason="data/TrainStation_Jul2024.zip is not checked out")
+@pytest.mark.filterwarnings('ignore:Non closed ring detected')
+def test_train_station_archive_matches_the_json():
+    expected = cleanTrainStationDF(gpd.read_file(TRAIN_STATION_JSON), mrt_json=MRT_JSON)
+    result = cleanTrainStationDF(loadTrainStationLayer(TRAIN_STATION_ZIP), mrt_json=MRT_JSON)
+    assert len(result) == 215
+    assertSameStations(result, expected)
+
+
+@pytest.fixture(scope='module')
+def paths(tmp_path_factory):
+    return writeDataset(str(tmp_path_factory.mktemp('synthetic')))
+
+
+def test_synthetic_train_station_archive_matches_the_json(paths):
+    expected = cleanTrainStationDF(gpd.read_file(paths['train_stations']), mrt_json=paths['mrt_json'])
+    result = cleanTrainStationDF(loadTrainStationLayer(paths['train_stations_zip']), mrt_json=paths['mrt_json'])
+    assertSameStations(result, expected)
+
+
+def test_bus_stop_archive_matches_the_datamall_records(paths):
+    records = pd.DataFrame(pd.read_json(paths['bus_stops'])['value'].tolist())
+    stops = loadBusStopLayer(paths['bus_stops_zip'])
+
+    assert stops['BusStopCode'].tolist() == records['BusStopCode'].tolist()
+    assert stops['Description'].tolist() == records['Description'].tolist()
+    np.testing.assert_allclose(stops[['Longitude', 'Latitude']], records[['Longitude', 'Latitude']], atol=1e-9)
+
+
+def test_bus_stop_archive_without_a_layer_is_rejected(tmp_path):
+    # Like transport_node_bus_202406.zip, which holds only ridership counts
+    zip_path = str(tmp_path / 'transport_node_bus.zip')
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.writestr('transport_node_bus.csv', 'PT_CODE,TOTAL_TAP_IN_VOLUME\n01012,100\n')
+    with pytest.raises(ValueError, match='no bus stop layer'):
+        loadBusStopLayer(zip_path)
@@ -0,0 +1,121 @@
+# BusNetwork service frequencies and the buses per hour of every Area
+import numpy as np
+import pytest
+import shapely
+
+from utils import gpd, pd
+from utils.bus_network import BusNetwork, parseFrequency
+from utils.geodataframe import cleanRegionPTDF
+from utils.helper import addDensityDiscrepancies, getCountColumn
+from utils.spatial_index import RegionIndex
+
+
+def test_parse_frequency():
+    headways = pd.Series(['08-12', '10', ' 5 - 15 ', '-', '00-00', '', None, 'N/A', 6])
+    expected = [6.0, 6.0, 6.0, 0.0, np.nan, np.nan, np.nan, np.nan, 10.0]
+    np.testing.assert_allclose(parseFrequency(headways).to_numpy(), expected)
+
+
+@pytest.fixture
+def routes():
+    # Service 1 runs A-B-C-A as a loop, service 2 runs B-C and back, service 3 has no BusServices row
+    return pd.DataFrame({
+        'ServiceNo': ['1'] * 4 + ['2'] * 4 + ['3'] * 2,
+        'Direction': [1, 1, 1, 1, 1, 1, 2, 2, 1, 1],
+        'StopSequence': [1, 2, 3, 4, 1, 2, 1, 2, 1, 2],
+        'BusStopCode': ['1001', '1002', '1003', '1001', '1002', '1003', '1003', '1002', '1003', '1004'],
+    })
+
+
+@pytest.fixture
+def services():
+    return pd.DataFrame({
+        'ServiceNo': ['1', '2', '2'],
+        'Direction': [1, 1, 2],
+        'AM_Peak_Freq': ['10', '-', '06-14'],
+        'AM_Offpeak_Freq': ['12', '15', '12'],
+        'PM_Peak_Freq': ['10', '12', 'N/A'],
+        'PM_Offpeak_Freq': ['15', '20', '15'],
+    })
+
+
+def test_route_frequencies_fall_back_only_for_missing_headways(routes, services):
+    frequency = BusNetwork(routes, services, period='PM_Peak_Freq').routes.set_index(['ServiceNo', 'Direction'])['frequency']
+    # 'N/A' falls back to the service's own mean over the other periods: 06-14, 12 and 15 minutes
+    assert frequency[('1', 1)] == pytest.approx(6)
+    assert frequency[('2', 1)] == pytest.approx(5)
+    assert frequency[('2', 2)] == pytest.approx(np.mean([6, 5, 4]))
+    assert frequency[('3', 1)] == 1
+
+    # '-' means the service does not run in the period, not a missing headway
+    am_peak = BusNetwork(routes, services).routes.set_index(['ServiceNo', 'Direction'])['frequency']
+    assert am_peak[('2', 1)] == 0
+    assert am_peak[('2', 2)] == pytest.approx(6)
+
+
+def test_stops_count_a_loop_terminal_once(routes, services):
+    stops = BusNetwork(routes, services).stops
+    assert stops.index.tolist() == ['01001', '01002', '01003', '01004']
+    assert stops['bus_routes_count'].tolist() == [1, 3, 4, 1]
+    np.testing.assert_allclose(stops['bus_frequency'], [6, 12, 13, 1])
+
+
+def test_stop_service_matches_numeric_codes_and_unserved_stops(routes, services):
+    # Parquet / CSV give the codes back as numbers without their leading zeros
+    bus_stops = pd.DataFrame({'BusStopCode': [1003, 1005, 1001]})
+    stops_df = BusNetwork(routes, services).createStopServiceDF(bus_stops)
+    assert stops_df['bus_routes_count'].tolist() == [4, 0, 1]
+    assert stops_df['bus_frequency'].tolist() == [13, 0, 6]
+
+
+def test_duplicate_services_keep_the_more_frequent_entry(routes, services):
+    services = pd.concat([services, services.iloc[[0]].assign(AM_Peak_Freq='05')], ignore_index=True)
+    frequency = BusNetwork(routes, services).routes.set_index(['ServiceNo', 'Direction'])['frequency']
+    assert frequency[('1', 1)] == pytest.approx(12)
+
+
+def test_unknown_period(routes, services):
+    with pytest.raises(ValueError, match='Unknown frequency period'):
+        BusNetwork(routes, services, period='Night_Freq')
+
+
+@pytest.fixture
+def regions():
+    return gpd.GeoDataFrame({'Area': ['West', 'East']},
+                            geometry=[shapely.box(103.80, 1.30, 103.82, 1.32), shapely.box(103.82, 1.30, 103.84, 1.32)],
+                            crs="EPSG:4326")
+
+
+@pytest.fixture
+def bus_stops():
+    # 1004 is outside both regions, 1005 has no route
+    return pd.DataFrame({
+        'BusStopCode': ['01001', '01002', '01003', '01004', '01005'],
+        'Longitude': [103.81, 103.81, 103.83, 103.90, 103.83],
+        'Latitude': [1.31, 1.31, 1.31, 1.31, 1.31],
+    })
+
+
+def test_weighted_stops_keep_the_stop_count_next_to_buses_per_hour(routes, services, regions, bus_stops):
+    weighted = BusNetwork(routes, services).createWeightedStopsDF(bus_stops, RegionIndex(regions))
+
+    # AM peak: service 1 runs 6 buses per hour (once at its loop terminal 1001), service 2 0 and 6, service 3 1
+    assert weighted['Area'].tolist() == ['West', 'East']
+    assert weighted['bus_stops_count'].tolist() == [2, 2]
+    np.testing.assert_allclose(weighted['bus_frequency'], [6 + 6 + 0 + 6, 6 + 0 + 6 + 1])
+
+
+def test_total_stops_stays_a_count_with_bus_frequency(routes, services, regions, bus_stops):
+    weighted = BusNetwork(routes, services).createWeightedStopsDF(bus_stops, RegionIndex(regions))
+    train_stops = pd.DataFrame({'Area': ['East'], 'train_stops_count': [1]})
+    regionPT_df = cleanRegionPTDF(regions, weighted, train_stops)
+
+    assert regionPT_df['total_stops'].tolist() == [2, 3]
+    assert regionPT_df['normalized_stops'].tolist() == pytest.approx([2 / 3, 1])
+
+    # Only the bus discrepancy is measured in buses per hour
+    regionPT_df = regionPT_df.assign(population_count=[100, 100], **{'land_area-km2': [1.0, 1.0]})
+    analysis = addDensityDiscrepancies(pd.DataFrame(regionPT_df.drop(columns='geometry')))
+    assert getCountColumn(analysis, 'bus') == 'bus_frequency'
+    np.testing.assert_allclose(analysis['bus_stops_density'], [18, 13])
+    np.testing.assert_allclose(analysis['total_stops_density'], [2, 3])
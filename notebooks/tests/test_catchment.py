@@ -0,0 +1,58 @@
+# KD-tree catchments against brute-force distances in SVY21
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import writeDataset
+from utils import gpd, pd
+from utils.catchment import SVY21, StopCatchment
+from utils.data_cleaning import cleanTrainStationDF
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    paths = writeDataset(str(tmp_path_factory.mktemp('synthetic')))
+    bus_df = pd.DataFrame(pd.read_json(paths['bus_stops'])['value'].tolist())
+    train_df = cleanTrainStationDF(gpd.read_file(paths['train_stations']), mrt_json=paths['mrt_json'])
+
+    # Homes spread over the same extent as the stops
+    rng = np.random.default_rng(1)
+    points_df = pd.DataFrame({
+        'Longitude': rng.uniform(bus_df['Longitude'].min(), bus_df['Longitude'].max(), 300),
+        'Latitude': rng.uniform(bus_df['Latitude'].min(), bus_df['Latitude'].max(), 300),
+    })
+    return bus_df, train_df, points_df
+
+
+# Every pairwise distance (m), projected by geopandas rather than the module's transformer
+def getDistances(points_df: pd.DataFrame, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    points = gpd.GeoSeries(gpd.points_from_xy(points_df['Longitude'], points_df['Latitude']), crs="EPSG:4326")
+    points = points.to_crs(SVY21)
+    stops = gpd.GeoSeries(gpd.points_from_xy(lon, lat), crs="EPSG:4326").to_crs(SVY21)
+    return np.hypot(points.x.to_numpy()[:, None] - stops.x.to_numpy(), points.y.to_numpy()[:, None] - stops.y.to_numpy())
+
+
+def test_catchment_matches_brute_force(inputs):
+    bus_df, train_df, points_df = inputs
+    catchment_df = StopCatchment(bus_df, train_df).createCatchmentDF(points_df, radii=(400, 800))
+
+    bus_distances = getDistances(points_df, bus_df['Longitude'], bus_df['Latitude'])
+    # One point per MRT station, however many lines stop there
+    mrt = train_df[train_df['TYPE'] == 'MRT'].drop_duplicates('STN_NAME')
+    coordinates = gpd.GeoSeries(mrt['COORDINATES'].to_numpy())
+    train_distances = getDistances(points_df, coordinates.x, coordinates.y)
+
+    for radius in (400, 800):
+        np.testing.assert_array_equal(catchment_df[f'bus_stops_within_{radius}m'], (bus_distances <= radius).sum(axis=1))
+        np.testing.assert_array_equal(catchment_df[f'train_stations_within_{radius}m'],
+                                      (train_distances <= radius).sum(axis=1))
+    assert catchment_df['bus_stops_within_800m'].max() > 0 and catchment_df['train_stations_within_800m'].max() > 0
+
+    np.testing.assert_allclose(catchment_df['nearest_mrt_distance_m'], train_distances.min(axis=1), atol=1e-6)
+    assert catchment_df['nearest_mrt'].tolist() == mrt['STN_NAME'].to_numpy()[train_distances.argmin(axis=1)].tolist()
+
+
+def test_catchment_counts_only_the_given_train_types(inputs):
+    bus_df, train_df, points_df = inputs
+    catchment = StopCatchment(bus_df, train_df, train_types=('MRT', 'LRT'))
+    assert len(catchment.station_names) == train_df['STN_NAME'].nunique()
+    assert set(StopCatchment(bus_df, train_df).station_names) == set(train_df.loc[train_df['TYPE'] == 'MRT', 'STN_NAME'])
@@ -0,0 +1,49 @@
+# The shared choropleth payload against the per-value branca colour map it replaced
+import numpy as np
+import pytest
+import shapely
+
+from utils import gpd
+from utils.geodataframe import addChoroplethLayer, createChoropleth, createLayerStyle
+from utils.helper import NO_DATA_COLOUR, createColorMap, evaluateColorMap
+from utils.maps import createSingaporeMap
+
+
+@pytest.fixture
+def regions():
+    values = [0, 3, 7.5, np.nan, 12]
+    squares = [shapely.box(103.7 + i / 10, 1.3, 103.75 + i / 10, 1.35) for i in range(len(values))]
+    return gpd.GeoDataFrame({'Area': list('ABCDE'), 'total_stops': values}, geometry=squares, crs="EPSG:4326")
+
+
+@pytest.mark.parametrize('vmin, vmax', [(0, 12), (-1, 1), (5, 5)])
+def test_evaluate_color_map_matches_branca(vmin, vmax):
+    colormap = createColorMap(vmin, vmax, caption='metric')
+    values = np.r_[np.linspace(vmin - 1, vmax + 1, 50), vmin, vmax]
+    assert evaluateColorMap(colormap, values).tolist() == [colormap(value) for value in values]
+
+
+def test_missing_values_are_no_data_grey():
+    colormap = createColorMap(0, 10, caption='metric')
+    assert evaluateColorMap(colormap, [np.nan, 10]).tolist() == [NO_DATA_COLOUR, colormap(10)]
+
+
+def test_choropleth_bakes_colours_into_properties(regions):
+    choropleth = createChoropleth(regions, ['total_stops'])
+    colormap = createColorMap(0, 12, caption='total_stops')
+    colours = {feature['properties']['Area']: feature['properties']['total_stops_colour']
+               for feature in choropleth.geojson['features']}
+
+    assert choropleth.ranges['total_stops'] == (0, 12)
+    assert colours == {'A': colormap(0), 'B': colormap(3), 'C': colormap(7.5), 'D': NO_DATA_COLOUR, 'E': colormap(12)}
+
+
+def test_layer_style_is_one_browser_function(regions):
+    choropleth = createChoropleth(regions, ['total_stops'])
+    folium_map = addChoroplethLayer(choropleth, createSingaporeMap(), 'total_stops', caption="PT Stops",
+                                    style={"color": "black"}, tooltip=None, empty_style={"fillOpacity": 0})
+    html = folium_map.get_root().render()
+
+    assert str(createLayerStyle('total_stops', {"color": "black"}, {"fillOpacity": 0})) in html
+    # No per-feature style table from a Python style_function
+    assert '_styler' not in html
@@ -0,0 +1,37 @@
+# The headless runner on a synthetic data directory
+import os
+
+import pytest
+
+from benchmarks.synthetic import writeDataset
+from utils import pd
+from utils.cli import REPORT_DIR, ROOT_DIR, createParser, main
+
+
+def test_default_report_dir_is_not_the_committed_report():
+    report_dir = createParser().parse_args([]).report_dir
+    assert report_dir == REPORT_DIR
+    assert os.path.abspath(report_dir) != os.path.join(ROOT_DIR, 'report')
+
+
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('synthetic'))
+    paths = writeDataset(directory)
+    # The DataMall response body, as a plain table
+    pd.DataFrame(pd.read_json(paths['bus_stops'])['value'].tolist()).to_csv(
+        os.path.join(directory, 'BusStops.csv'), index=False)
+    return directory
+
+
+def test_writes_the_rankings_to_the_report_dir(data_dir, tmp_path):
+    report_dir = str(tmp_path / 'report')
+    reports = main(['--data-dir', data_dir, '--bus-stops', os.path.join(data_dir, 'BusStops.csv'),
+                    '--report-dir', report_dir, '--workers', '1', '--no-maps', '--top', '1'])
+
+    assert [report.stage for report in reports][-1] == 'rankings'
+    region_df = pd.read_csv(os.path.join(report_dir, 'region_analysis.csv'))
+    assert (region_df['total_stops'] == region_df['bus_stops_count'] + region_df['train_stops_count']).all()
+    for pt_type in ['bus', 'train', 'total']:
+        ranking = pd.read_csv(os.path.join(report_dir, f'underserved_{pt_type}_areas.csv'))
+        assert (ranking[f'{pt_type}_density_discrepancy'] > 0).all()
@@ -0,0 +1,119 @@
+# The vectorised cleaning functions against row-by-row versions of the original notebook code, on data/
+import os
+import re
+
+import pytest
+import shapely
+
+from utils import gpd, pd
+from utils.data_cleaning import cleanHDBDF, cleanTrainStationDF, streamHDBDF
+from utils.helper import capitalize, loadMRTJSON, prepare_area_list, strip_key_words
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+TRAIN_STATIONS_JSON = os.path.join(DATA_DIR, 'RapidTransitSystemStation', 'TrainStationCoordinates.json')
+POPULATION_CSV = os.path.join(DATA_DIR, 'hsetod2023', 'population_subzone.csv')
+REGIONS_CSV = os.path.join(DATA_DIR, 'All Regions_Coordinates.csv')
+MRT_JSON = os.path.join(DATA_DIR, 'MRTLRTStnPtt.json')
+
+
+# cleanTrainStationDF as it was, one row at a time
+def cleanTrainStationRows(dataframe: pd.DataFrame) -> pd.DataFrame:
+    stations = dataframe[dataframe.apply(lambda row: 'depot' not in row['STN_NAM_DE'].lower(), axis=1)]
+    stations = stations.drop(['TYP_CD', 'STN_NAM', 'ATTACHEMEN'], axis=1).rename(
+        columns={'TYP_CD_DES': 'TYPE', 'STN_NAM_DE': 'STN_NAME', 'geometry': 'GEOMETRY'})
+    stations['COORDINATES'] = stations['GEOMETRY'].apply(lambda polygon: polygon.centroid)
+
+    new_df = pd.merge(stations, loadMRTJSON(MRT_JSON), on="STN_NAME", how="inner")
+    new_df = new_df.drop_duplicates(subset="STN_NAME", keep='last')
+    expanded = new_df['STN_NO'].apply(lambda station: station.split('/')).explode().rename('STN_NO').to_frame()
+    expanded = expanded.merge(new_df.drop(columns=['STN_NO']), left_index=True, right_index=True).reset_index(drop=True)
+
+    def splitAlphanumeric(station):
+        match = re.match(r'([a-zA-Z]+)(\d*)', station)
+        return (match.group(1), match.group(2) or None) if match else (None, None)
+
+    expanded[['LINE', 'NUM']] = expanded['STN_NO'].apply(lambda x: pd.Series(splitAlphanumeric(x)))
+    expanded['NUM'] = pd.to_numeric(expanded['NUM'], errors='coerce').fillna(0).astype(int)
+    return expanded.sort_values(by=['LINE', 'NUM']).reset_index(drop=True)
+
+
+@pytest.mark.skipif(not os.path.exists(TRAIN_STATIONS_JSON), reason="needs data/RapidTransitSystemStation")
+def test_clean_train_stations_matches_row_by_row():
+    stations = gpd.read_file(TRAIN_STATIONS_JSON)
+    expected = cleanTrainStationRows(stations.copy())
+    result = cleanTrainStationDF(stations.copy(), mrt_json=MRT_JSON)
+
+    assert list(result.columns) == list(expected.columns)
+    columns = ['STN_NO', 'TYPE', 'STN_NAME', 'LINE', 'NUM']
+    pd.testing.assert_frame_equal(result[columns], expected[columns], check_dtype=False)
+    assert shapely.equals_exact(result['COORDINATES'].to_numpy(), expected['COORDINATES'].to_numpy(), 1e-12).all()
+    assert not result['STN_NAME'].str.contains('DEPOT', case=False).any()
+
+
+# determine_area as it was: scan the Area names for the subzone, then for the subzone without key words
+def determineAreaRow(row, area_list: list) -> str:
+    sz_value = row['SZ'].lower()
+    for value in (sz_value, strip_key_words(sz_value)):
+        if value in area_list:
+            return capitalize(value)
+    return row['PA']
+
+
+# cleanHDBDF as it was, one row at a time
+def cleanHDBRows(dataframe: pd.DataFrame) -> pd.DataFrame:
+    df = dataframe[dataframe['HSE'] != 0].copy()
+    area_list = prepare_area_list(REGIONS_CSV)
+    df['Area'] = df.apply(lambda row: determineAreaRow(row, area_list), axis=1)
+    new_df = df.groupby('Area').agg({
+        'HSE': 'sum',
+        'PA': lambda x: list(dict.fromkeys(x)),
+        'SZ': lambda x: list(dict.fromkeys(x)),
+        'TOD': lambda x: ', '.join(x),
+        'Time': 'max'
+    }).reset_index()
+    return new_df.rename(columns={"SZ": "HDBSubzone", "TOD": "Type", "HSE": "population_count", "Time": "Year"})
+
+
+@pytest.mark.skipif(not os.path.exists(POPULATION_CSV), reason="needs data/hsetod2023")
+def test_clean_hdb_matches_row_by_row():
+    population = pd.read_csv(POPULATION_CSV)
+    pd.testing.assert_frame_equal(cleanHDBDF(population.copy(), regions_csv=REGIONS_CSV), cleanHDBRows(population.copy()))
+
+
+def test_clean_hdb_matches_row_by_row_on_edge_cases():
+    # Exact Area names, names only matching without key words, unmatched subzones and a zero HSE row
+    population = pd.DataFrame({
+        'PA': ['Bedok', 'Bedok', 'Queenstown', 'Tampines', 'Tampines'],
+        'SZ': ['Bedok North', 'Kembangan', 'Commonwealth', 'Tampines East', 'Simei'],
+        'TOD': ['HDB 3-Room Flats', 'HDB 4-Room Flats', 'HDB 5-Room and Executive Flats',
+                'HDB 3-Room Flats', 'HDB 4-Room Flats'],
+        'HSE': [100, 20, 0, 40, 60],
+        'Time': [2023] * 5,
+    })
+    pd.testing.assert_frame_equal(cleanHDBDF(population.copy(), regions_csv=REGIONS_CSV), cleanHDBRows(population.copy()))
+
+
+@pytest.mark.skipif(not os.path.exists(POPULATION_CSV), reason="needs data/hsetod2023")
+@pytest.mark.parametrize('chunksize', [97, 100_000])
+def test_stream_hdb_matches_clean_hdb(chunksize):
+    expected = cleanHDBDF(pd.read_csv(POPULATION_CSV), regions_csv=REGIONS_CSV)
+    result = streamHDBDF(POPULATION_CSV, chunksize=chunksize, regions_csv=REGIONS_CSV)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+
+
+@pytest.mark.skipif(not os.path.exists(POPULATION_CSV), reason="needs data/hsetod2023")
+def test_stream_hdb_keeps_one_row_per_area_and_year(tmp_path):
+    population = pd.read_csv(POPULATION_CSV)
+    years = []
+    for year in (2021, 2022):
+        path = tmp_path / f'population_{year}.csv'
+        population.assign(Time=year, HSE=population['HSE'] * (year - 2020)).to_csv(path, index=False)
+        years.append(str(path))
+
+    result = streamHDBDF(years, chunksize=500, regions_csv=REGIONS_CSV)
+    single = cleanHDBDF(population, regions_csv=REGIONS_CSV)
+    assert len(result) == 2 * len(single)
+    for year, factor in ((2021, 1), (2022, 2)):
+        counts = result[result['Year'] == year].set_index('Area')['population_count']
+        pd.testing.assert_series_equal(counts, single.set_index('Area')['population_count'] * factor,
+                                       check_dtype=False)
@@ -0,0 +1,131 @@
+# fetchAllRecords against a local stub of the DataMall $skip paging
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from utils.datamall import fetchAllRecords
+
+PAGE_SIZE = 10
+
+
+class StubDataMall(ThreadingHTTPServer):
+    """
+    Serves `records` PAGE_SIZE at a time. `failures` maps a $skip to the error
+    statuses returned before the page succeeds, `delays` to seconds to wait,
+    and `pages` overrides the body of a $skip.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, records, failures=None, delays=None, pages=None):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.records = records
+        self.failures = {skip: list(statuses) for skip, statuses in (failures or {}).items()}
+        self.delays = delays or {}
+        self.pages = pages or {}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/BusStops"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        skip = int(parse_qs(urlparse(self.path).query)['$skip'][0])
+        assert self.headers['AccountKey'] == 'key'
+        with server.lock:
+            server.requests[skip] += 1
+            status = server.failures[skip].pop(0) if server.failures.get(skip) else 200
+        time.sleep(server.delays.get(skip, 0))
+
+        page = server.pages.get(skip, server.records[skip:skip + PAGE_SIZE])
+        body = json.dumps({'value': page} if status == 200 else {'error': status}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(records, **kwargs):
+        server = StubDataMall(records, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def createRecords(n: int) -> list:
+    return [{'BusStopCode': f'{i:05d}'} for i in range(n)]
+
+
+def fetch(server, **kwargs) -> list:
+    kwargs = {'max_workers': 3, 'page_size': PAGE_SIZE, 'backoff_factor': 0, **kwargs}
+    return fetchAllRecords(server.url, 'key', **kwargs)
+
+
+def test_stops_after_the_wave_with_the_first_empty_page(stub):
+    server = stub(createRecords(45))
+    assert fetch(server) == createRecords(45)
+    # Waves of 3: 0-20, then 30-50, where 50 is the first empty page
+    assert server.requests == {skip: 1 for skip in range(0, 60, PAGE_SIZE)}
+
+
+def test_empty_dataset(stub):
+    server = stub([])
+    assert fetch(server) == []
+    assert set(server.requests) == {0, 10, 20}
+
+
+def test_pages_past_the_first_empty_page_are_discarded(stub):
+    server = stub(createRecords(50), pages={20: []})
+    assert fetch(server) == createRecords(20)
+    assert 30 not in server.requests
+
+
+def test_retries_rate_limits_and_server_errors(stub):
+    server = stub(createRecords(25), failures={0: [502], 10: [429, 503], 20: [500, 504, 429]})
+    assert fetch(server) == createRecords(25)
+    assert server.requests[0] == 2
+    assert server.requests[10] == 3
+    assert server.requests[20] == 4
+
+
+def test_gives_up_after_max_retries(stub):
+    server = stub(createRecords(25), failures={10: [503] * 10})
+    with pytest.raises(requests.exceptions.RetryError):
+        fetch(server, max_retries=2)
+    assert server.requests[10] == 3
+
+
+def test_client_errors_are_not_retried(stub):
+    server = stub(createRecords(25), failures={0: [401]})
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetch(server)
+    assert server.requests[0] == 1
+
+
+def test_keeps_skip_order_when_pages_finish_out_of_order(stub):
+    # Within every wave, the first page is the slowest to arrive
+    server = stub(createRecords(55), delays={0: 0.2, 10: 0.1, 30: 0.2, 40: 0.1})
+    assert fetch(server) == createRecords(55)
@@ -0,0 +1,125 @@
+# Region geometries, their parquet cache and their geodesic areas, against fixed references
+import os
+import shutil
+
+import numpy as np
+import pytest
+import shapely
+
+from benchmarks.synthetic import writeDataset
+from utils import geodataframe, pd
+from utils.geodataframe import calculateGeodesicAreas, createAreaGeoDF
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+REGIONS_CSV = os.path.join(DATA_DIR, 'All Regions_Coordinates.csv')
+
+# The tolerance stated by calculateGeodesicAreas, and the one for geometries above a square metre
+AREA_RTOL = 2.5e-6
+LARGE_AREA_RTOL = 1e-9
+
+# Areas (m2) given by area.area, the package calculateGeodesicAreas replaced
+REFERENCE_SHAPES = {
+    'POLYGON ((103.8 1.3, 103.81 1.3, 103.81 1.31, 103.8 1.31, 103.8 1.3))': 1238881.4840553934,
+    # A hole, a multipolygon, a clockwise ring and a sliver of under a square metre
+    'POLYGON ((103.7 1.35, 103.75 1.35, 103.75 1.4, 103.7 1.4, 103.7 1.35), '
+    '(103.71 1.36, 103.71 1.37, 103.72 1.37, 103.72 1.36, 103.71 1.36))': 29732299.79113391,
+    'MULTIPOLYGON (((103.9 1.3, 103.92 1.3, 103.91 1.32, 103.9 1.3)), '
+    '((103.95 1.25, 103.97 1.25, 103.97 1.26, 103.95 1.26, 103.95 1.25)))': 4955569.305402856,
+    'POLYGON ((103.6 1.2, 103.6 1.25, 103.65 1.25, 103.6 1.2))': 15486495.555848023,
+    'POLYGON ((103.85 1.22, 103.850005 1.22, 103.850005 1.220003, 103.85 1.22))': 0.09291914939931593,
+}
+REFERENCE_AREAS = {
+    'Western Water Catchment': 65476517.87488669,
+    'North-eastern Islands': 54399782.75731995,
+    'Bedok': 21879439.795202367,
+    'Jurong East': 18541412.581201043,
+    'Sister 1a': 1044.1792057802804,
+    'Pulau Satumu 2': 95.34756008209474,
+    # Slivers left by the source coordinates
+    'Lazarus 2a': 0.0003247275206523265,
+    'Lazarus 2b': 0.0012653811871669606,
+    'Lazarus 2c': 0.0014723902457598975,
+}
+REFERENCE_TOTAL = 867866076.248267
+
+
+def test_areas_match_the_reference_shapes():
+    areas = calculateGeodesicAreas(shapely.from_wkt(list(REFERENCE_SHAPES)))
+    np.testing.assert_allclose(areas, list(REFERENCE_SHAPES.values()), rtol=LARGE_AREA_RTOL)
+    # Empty geometries have no area
+    assert calculateGeodesicAreas(np.array([shapely.Polygon()], dtype=object)).tolist() == [0]
+
+
+@pytest.mark.skipif(not os.path.exists(REGIONS_CSV), reason="data/All Regions_Coordinates.csv is not checked out")
+def test_areas_match_the_references_of_the_regions():
+    regions = createAreaGeoDF(REGIONS_CSV, None).set_index('Area')
+    areas = calculateGeodesicAreas(regions.geometry.to_numpy())
+    assert areas.sum() == pytest.approx(REFERENCE_TOTAL, rel=LARGE_AREA_RTOL)
+
+    areas = dict(zip(regions.index, areas))
+    for area, reference in REFERENCE_AREAS.items():
+        assert areas[area] == pytest.approx(reference, rel=AREA_RTOL if reference < 1 else LARGE_AREA_RTOL)
+
+
+def assertValidRegions(regions, csv_path: str):
+    areas = pd.read_csv(csv_path)['Area'].dropna().unique()
+    assert sorted(regions['Area']) == sorted(areas)
+    geometries = regions.geometry.to_numpy()
+    assert (shapely.get_type_id(geometries) == 6).all()
+    assert shapely.is_valid(geometries).all()
+    assert not shapely.is_empty(geometries).any()
+
+
+@pytest.mark.skipif(not os.path.exists(REGIONS_CSV), reason="data/All Regions_Coordinates.csv is not checked out")
+def test_regions_are_valid_multipolygons():
+    regions = createAreaGeoDF(REGIONS_CSV, None)
+    assert len(regions) == 100
+    assertValidRegions(regions, REGIONS_CSV)
+
+
+@pytest.fixture
+def regions_csv(tmp_path):
+    return writeDataset(str(tmp_path / 'synthetic'))['regions']
+
+
+def test_synthetic_regions_are_valid_multipolygons(regions_csv):
+    assertValidRegions(createAreaGeoDF(regions_csv, None), regions_csv)
+
+
+def test_cache_is_rebuilt_when_the_source_changes(regions_csv, tmp_path, monkeypatch):
+    # Count the builds from the CSV, as opposed to reads of the cache
+    builds = []
+    createMultiPolygons = geodataframe.createMultiPolygons
+
+    def countBuilds(*args):
+        builds.append(args)
+        return createMultiPolygons(*args)
+    monkeypatch.setattr(geodataframe, 'createMultiPolygons', countBuilds)
+    cache_path = str(tmp_path / 'cache' / 'regions.parquet')
+
+    regions = createAreaGeoDF(regions_csv, cache_path)
+    cached = createAreaGeoDF(regions_csv, cache_path)
+    assert len(builds) == 1
+    assert cached.attrs == {}
+    assert cached.geometry.geom_equals_exact(regions.geometry, 0).all()
+
+    # The same file under another path
+    other_csv = str(tmp_path / 'other.csv')
+    shutil.copy(regions_csv, other_csv)
+    createAreaGeoDF(other_csv, cache_path)
+    assert len(builds) == 2
+
+    # An Area removed from the source
+    df = pd.read_csv(other_csv)
+    df[df['Area'] != regions['Area'].iloc[0]].to_csv(other_csv, index=False)
+    edited = createAreaGeoDF(other_csv, cache_path)
+    assert len(builds) == 3
+    assert len(edited) == len(regions) - 1
+    assertValidRegions(edited, other_csv)
+
+    # Only touched, so the size is unchanged
+    stat = os.stat(other_csv)
+    os.utime(other_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    createAreaGeoDF(other_csv, cache_path)
+    createAreaGeoDF(other_csv, cache_path)
+    assert len(builds) == 4
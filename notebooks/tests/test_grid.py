@@ -0,0 +1,55 @@
+# SpatialGrid population redistribution and the legend caveat for Area population
+import numpy as np
+import pytest
+import shapely
+
+from utils import gpd, pd
+from utils.grid import AREA_POPULATION_CAVEAT, SpatialGrid
+from utils.maps import createSingaporeMap
+
+
+@pytest.fixture
+def grid():
+    # Two side by side Areas of roughly 2 km x 2 km
+    regions = gpd.GeoDataFrame({'Area': ['West', 'East']},
+                               geometry=[shapely.box(103.80, 1.30, 103.82, 1.32), shapely.box(103.82, 1.30, 103.84, 1.32)],
+                               crs="EPSG:4326")
+    return SpatialGrid(regions, cell_size=500)
+
+
+@pytest.fixture
+def stops():
+    return {'bus': pd.DataFrame({'Longitude': [103.805, 103.835], 'Latitude': [1.305, 1.315]})}
+
+
+def test_area_population_is_uniform_within_an_area(grid, stops):
+    population = pd.DataFrame({'Area': ['West', 'East'], 'population_count': [1000, 3000]})
+    grid_df = grid.createGridDF(population, stops)
+
+    assert grid_df.attrs['population_from'] == 'Area'
+    assert grid_df['population_count'].sum() == pytest.approx(4000)
+    density = grid_df['population_count'] / grid_df['land_area-km2']
+    full = np.isclose(grid_df['land_area-km2'], grid.cellArea / 1e6)
+    assert density[full & (grid_df['Area'] == 'West')].nunique() == 1
+
+
+def test_subzone_population_adds_resolution(grid, stops):
+    # West is split into a southern subzone holding all of its people and an empty northern one
+    subzones = gpd.GeoDataFrame({'population_count': [1000, 0, 3000]},
+                                geometry=[shapely.box(103.80, 1.30, 103.82, 1.31), shapely.box(103.80, 1.31, 103.82, 1.32),
+                                          shapely.box(103.82, 1.30, 103.84, 1.32)],
+                                crs="EPSG:4326")
+    grid_df = grid.createGridDF(None, stops, subzones=subzones)
+
+    assert grid_df.attrs['population_from'] == 'subzone'
+    assert grid_df['population_count'].sum() == pytest.approx(4000)
+    centres = shapely.centroid(grid.getGeoDataFrame(grid_df).geometry.to_numpy())
+    west = grid_df['Area'].to_numpy() == 'West'
+    # Only cells reaching into the southern subzone are populated, up to half a cell (~0.0023 deg) past it
+    assert (shapely.get_y(centres[west]) < 1.3125).all()
+
+
+def test_legend_carries_the_area_population_caveat(grid, stops):
+    population = pd.DataFrame({'Area': ['West', 'East'], 'population_count': [1000, 3000]})
+    html = grid.addDensityHeatmap(grid.createGridDF(population, stops), createSingaporeMap(), 'bus').get_root().render()
+    assert AREA_POPULATION_CAVEAT in html
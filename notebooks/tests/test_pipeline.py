@@ -0,0 +1,100 @@
+# DensityPipeline updates against addDensityDiscrepancies run from scratch on the updated inputs
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import writeDataset
+from utils import gpd, pd
+from utils.data_cleaning import cleanHDBDF, cleanTrainStationDF
+from utils.geodataframe import calculateGeodesicAreas, createAreaGeoDF
+from utils.helper import addDensityDiscrepancies
+from utils.pipeline import DensityPipeline
+from utils.spatial_index import RegionIndex
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    paths = writeDataset(str(tmp_path_factory.mktemp('synthetic')))
+    regions = createAreaGeoDF(paths['regions'], None)
+    population = cleanHDBDF(pd.read_csv(paths['population']), regions_csv=paths['regions'])
+    bus_df = pd.DataFrame(pd.read_json(paths['bus_stops'])['value'].tolist())
+    train_df = cleanTrainStationDF(gpd.read_file(paths['train_stations']), mrt_json=paths['mrt_json'])
+    stops = {
+        'bus': gpd.GeoDataFrame(bus_df, geometry=gpd.points_from_xy(bus_df.Longitude, bus_df.Latitude)),
+        'train': gpd.GeoDataFrame(train_df, geometry=train_df.GEOMETRY),
+    }
+    return regions, population, stops
+
+
+# The discrepancy table of the notebook, built from scratch
+def rebuild(regions: gpd.GeoDataFrame, population: pd.DataFrame, stops: dict) -> pd.DataFrame:
+    df = regions[['Area', 'geometry']].merge(population[['Area', 'population_count']], on='Area')
+    df = df.sort_values('Area').reset_index(drop=True)
+    region_index = RegionIndex(regions)
+    for pt_type, stops_gdf in stops.items():
+        counts = region_index.countStops(stops_gdf, pt_type)
+        df = df.merge(counts, on='Area', how='left')
+        df[f'{pt_type}_stops_count'] = df[f'{pt_type}_stops_count'].fillna(0).astype(int)
+    df['total_stops'] = df[[f'{pt_type}_stops_count' for pt_type in stops]].sum(axis=1)
+    df['land_area-km2'] = calculateGeodesicAreas(df.geometry.to_numpy()) / 1e6
+    return addDensityDiscrepancies(pd.DataFrame(df.drop(columns='geometry')))
+
+
+def assertMatchesRebuild(pipeline: DensityPipeline, expected: pd.DataFrame):
+    result = pd.DataFrame(pipeline.getDataFrame().drop(columns='geometry'))
+    assert sorted(result.columns) == sorted(expected.columns)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False, rtol=1e-9)
+
+
+def test_build_matches_rebuild(inputs):
+    regions, population, stops = inputs
+    assertMatchesRebuild(DensityPipeline(regions, population, stops), rebuild(regions, population, stops))
+
+
+def test_update_stops_matches_rebuild(inputs):
+    regions, population, stops = inputs
+    pipeline = DensityPipeline(regions, population, stops)
+
+    # A new pull where half the bus stops of one Area are gone, then one where every stop moved
+    area = pipeline.table['bus_stops_count'].idxmax()
+    in_area = stops['bus'].intersects(regions.set_index('Area').geometry[area]).to_numpy()
+    bus_gdf = stops['bus'][~in_area | (np.cumsum(in_area) % 2 == 0)]
+    report = pipeline.updateStops('bus', bus_gdf)
+    assertMatchesRebuild(pipeline, rebuild(regions, population, {**stops, 'bus': bus_gdf}))
+    # The raw density is recomputed for that Area only; normalized columns may still renormalize every Area
+    assert report.recomputed['bus_stops_density'] == 1
+
+    bus_gdf = stops['bus'].iloc[::3].copy()
+    bus_gdf['geometry'] = bus_gdf.geometry.translate(0.002, 0.001)
+    pipeline.updateStops('bus', bus_gdf)
+    assertMatchesRebuild(pipeline, rebuild(regions, population, {**stops, 'bus': bus_gdf}))
+
+
+@pytest.mark.parametrize('new_areas', [0, 3])
+def test_update_population_matches_rebuild(inputs, new_areas):
+    regions, population, stops = inputs
+    # Leave some Areas without residents at first, so the update gives them their first population
+    initial = population.iloc[new_areas:]
+    pipeline = DensityPipeline(regions, initial, stops)
+
+    updated = population.copy()
+    updated.loc[updated.index[::5], 'population_count'] *= 2
+    updated = pd.concat([updated, pd.DataFrame({'Area': ['Not A Region'], 'population_count': [100]})])
+    pipeline.updatePopulation(updated)
+
+    expected = rebuild(regions, updated, stops)
+    assert len(pipeline.table) == len(expected)
+    assertMatchesRebuild(pipeline, expected)
+
+
+def test_update_region_matches_rebuild(inputs):
+    regions, population, stops = inputs
+    pipeline = DensityPipeline(regions, population, stops)
+
+    area = population['Area'].iloc[len(population) // 2]
+    edited = regions.copy()
+    index = np.flatnonzero(edited['Area'] == area)[0]
+    edited.loc[index, 'geometry'] = edited.geometry.iloc[index].buffer(-0.002)
+    report = pipeline.updateRegion(area, edited.geometry.iloc[index])
+
+    assertMatchesRebuild(pipeline, rebuild(edited, population, stops))
+    assert report.recomputed['population_density'] == 1
@@ -0,0 +1,70 @@
+# Profiler install / uninstall: every patched name is a wrapper inside the block and the original after it
+import inspect
+import sys
+import tracemalloc
+
+import folium
+import geopandas
+import pytest
+
+import utils.data_cleaning  # noqa: F401  (both import helper functions by name)
+import utils.pipeline  # noqa: F401
+from utils import helper, profiling
+from utils.profiling import PROFILED_MODULES, profiled
+
+
+# Every function bound in a loaded utils module or __main__, by (module, attribute)
+def getFunctions() -> dict:
+    return {(name, attribute): value
+            for name, module in list(sys.modules.items()) if name == '__main__' or name.startswith('utils.')
+            for attribute, value in list(vars(module).items()) if inspect.isfunction(value)}
+
+
+@pytest.fixture
+def main_module(monkeypatch):
+    # A notebook that ran `from utils.helper import normalizeColumn`
+    main = sys.modules['__main__']
+    monkeypatch.setattr(main, 'normalizeColumn', helper.normalizeColumn, raising=False)
+    return main
+
+
+def test_uninstall_restores_every_original(main_module):
+    functions = getFunctions()
+    library = (geopandas.sjoin, geopandas.GeoDataFrame.to_json, folium.Map.save)
+    # Defined by folium.Map itself or inherited, depending on the folium version
+    repr_html = vars(folium.Map).get('_repr_html_')
+    was_tracing = tracemalloc.is_tracing()
+
+    with profiled(memory=True) as profiler:
+        patched = getFunctions()
+        # The defining module, modules that imported the name and __main__ all see the same wrapper
+        for name, attribute in [('utils.helper', 'normalizeColumn'), ('__main__', 'normalizeColumn'),
+                                ('utils.helper', 'dropRows'), ('utils.data_cleaning', 'dropRows'),
+                                ('utils.helper', 'addDensityDiscrepancies'), ('utils.pipeline', 'addDensityDiscrepancies')]:
+            assert patched[(name, attribute)] is vars(helper)[attribute]
+            assert patched[(name, attribute)].__wrapped__ is functions[('utils.helper', attribute)]
+        assert geopandas.sjoin is not library[0]
+        assert vars(folium.Map)['_repr_html_'] is not repr_html
+
+        main_module.normalizeColumn(helper.pd.DataFrame({'x': [1.0, 2.0]}), 'x')
+        assert [record.function for record in profiler.records] == ['helper.normalizeColumn']
+
+    assert getFunctions() == functions
+    for (name, attribute), original in functions.items():
+        assert vars(sys.modules[name])[attribute] is original
+    assert (geopandas.sjoin, geopandas.GeoDataFrame.to_json, folium.Map.save) == library
+    # An inherited method is deleted again rather than left as a copy on the subclass
+    assert vars(folium.Map).get('_repr_html_') is repr_html
+    assert tracemalloc.is_tracing() == was_tracing
+    assert all(module in sys.modules for module in PROFILED_MODULES)
+
+
+def test_uninstall_deletes_patched_inherited_methods(monkeypatch):
+    # GeoDataFrame inherits head from pandas
+    monkeypatch.setattr(profiling, 'LIBRARY_CALLS', [('geopandas.GeoDataFrame', 'head')])
+    with profiled(memory=False) as profiler:
+        assert 'head' in vars(geopandas.GeoDataFrame)
+        geopandas.GeoDataFrame({'x': [1, 2]}).head(1)
+    assert [record.rows_out for record in profiler.records] == [1]
+    assert 'head' not in vars(geopandas.GeoDataFrame)
+    assert geopandas.GeoDataFrame.head is helper.pd.DataFrame.head
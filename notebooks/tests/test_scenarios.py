@@ -0,0 +1,92 @@
+# Scenario scores from the incidence matrix, against addDensityDiscrepancies re-run with the new stations
+import numpy as np
+import pytest
+import shapely
+
+from benchmarks.synthetic import writeDataset
+from utils import gpd, pd
+from utils.data_cleaning import cleanHDBDF, cleanTrainStationDF
+from utils.geodataframe import createAreaGeoDF
+from utils.helper import addDensityDiscrepancies
+from utils.pipeline import DensityPipeline
+from utils.scenarios import ScenarioEvaluator, combineStationSets
+from utils.spatial_index import RegionIndex
+
+
+@pytest.fixture(scope='module')
+def evaluator(tmp_path_factory):
+    paths = writeDataset(str(tmp_path_factory.mktemp('synthetic')))
+    regions = createAreaGeoDF(paths['regions'], None)
+    population = cleanHDBDF(pd.read_csv(paths['population']), regions_csv=paths['regions'])
+    bus_df = pd.DataFrame(pd.read_json(paths['bus_stops'])['value'].tolist())
+    train_df = cleanTrainStationDF(gpd.read_file(paths['train_stations']), mrt_json=paths['mrt_json'])
+    baseline_df = pd.DataFrame(DensityPipeline(regions, population, {
+        'bus': gpd.GeoDataFrame(bus_df, geometry=gpd.points_from_xy(bus_df.Longitude, bus_df.Latitude)),
+        'train': gpd.GeoDataFrame(train_df, geometry=train_df.GEOMETRY),
+    }).getDataFrame().drop(columns='geometry'))
+
+    # Two candidates in the least served Area, one in each of a few others, and one off the map
+    baseline_df = baseline_df.sort_values('Area').reset_index(drop=True)
+    least_served = baseline_df.loc[baseline_df['train_stops_count'].idxmin(), 'Area']
+    areas = [least_served, least_served] + baseline_df['Area'].iloc[[3, 10, 20]].tolist()
+    geometries = regions.set_index('Area').geometry
+    points = shapely.point_on_surface(geometries[areas].to_numpy())
+    candidates_df = pd.DataFrame({
+        'STN_NO': ['TE1', 'TE2', 'TE3', 'TE4', 'TE5', 'XX1'],
+        'Area': areas + [None],
+        'Longitude': np.append(shapely.get_x(points), 0.0),
+        'Latitude': np.append(shapely.get_y(points), 0.0),
+    })
+    return ScenarioEvaluator(baseline_df, candidates_df, RegionIndex(regions)), baseline_df, candidates_df
+
+
+# The train discrepancy of every Area, from the baseline table with the scenario's stations added
+def rerun(baseline_df: pd.DataFrame, candidates_df: pd.DataFrame, stations) -> np.ndarray:
+    df = baseline_df[['Area', 'population_count', 'land_area-km2', 'train_stops_count']].copy()
+    added = candidates_df[candidates_df['STN_NO'].isin(stations)]['Area'].value_counts()
+    df['train_stops_count'] += df['Area'].map(added).fillna(0).astype(int)
+    return addDensityDiscrepancies(df, ('train',))['train_density_discrepancy'].to_numpy()
+
+
+def test_incidence_counts_each_candidate_in_its_area(evaluator):
+    scenario_evaluator, baseline_df, candidates_df = evaluator
+    expected = np.zeros_like(scenario_evaluator.incidence)
+    for station, area in enumerate(candidates_df['Area']):
+        if pd.notna(area):
+            expected[np.flatnonzero(scenario_evaluator.areas == area)[0], station] = 1
+    np.testing.assert_array_equal(scenario_evaluator.incidence, expected)
+
+    selection = scenario_evaluator.createSelectionMatrix([[], ['TE2', 'TE4'], ['XX1']])
+    np.testing.assert_array_equal(selection, [[0] * 6, [0, 1, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1]])
+
+
+def test_discrepancy_matches_rerunning_the_notebook_formulas(evaluator):
+    scenario_evaluator, baseline_df, candidates_df = evaluator
+    np.testing.assert_allclose(scenario_evaluator.baseline_discrepancy,
+                               baseline_df['train_density_discrepancy'], rtol=1e-6, atol=1e-9)
+
+    scenarios = [[], ['TE1'], ['TE1', 'TE2'], ['TE3', 'TE4', 'TE5'], ['XX1'], ['TE1', 'TE2', 'TE3', 'TE4', 'TE5']]
+    discrepancy = scenario_evaluator.getDiscrepancy(scenario_evaluator.createSelectionMatrix(scenarios))
+    for row, stations in enumerate(scenarios):
+        np.testing.assert_allclose(discrepancy[row], rerun(baseline_df, candidates_df, stations),
+                                   rtol=1e-6, atol=1e-9)
+    # The new stations do move the discrepancy
+    assert not np.allclose(discrepancy[1], discrepancy[0])
+
+
+def test_scores_rank_by_the_reduction_of_the_rerun_totals(evaluator):
+    scenario_evaluator, baseline_df, candidates_df = evaluator
+    scenarios = combineStationSets({'West': ['TE1', 'TE2'], 'East': ['TE3'], 'Nowhere': ['XX1']}, 2)
+    ranked = scenario_evaluator.scoreScenarios(scenarios, batch_size=2)
+
+    assert sorted(ranked['scenario']) == sorted(scenarios)
+    assert ranked['discrepancy_reduction'].is_monotonic_decreasing
+    baseline_total = np.clip(baseline_df['train_density_discrepancy'], 0, None).sum()
+    for row in ranked.itertuples():
+        discrepancy = rerun(baseline_df, candidates_df, scenarios[row.scenario])
+        assert row.train_density_discrepancy == pytest.approx(np.clip(discrepancy, 0, None).sum(), rel=1e-6)
+        assert row.underserved_areas == (discrepancy > 0).sum()
+        assert row.discrepancy_reduction == pytest.approx(baseline_total - np.clip(discrepancy, 0, None).sum(),
+                                                          rel=1e-6, abs=1e-9)
+    # A station off the map changes nothing
+    assert ranked.set_index('scenario').loc['Nowhere', 'discrepancy_reduction'] == pytest.approx(0, abs=1e-9)
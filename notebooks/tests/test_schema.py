@@ -0,0 +1,32 @@
+# Compact dtypes: Type bitmasks comparable across frames, counts kept wide enough to sum
+import pytest
+
+from benchmarks.synthetic import writeDataset
+from utils import pd
+from utils.data_cleaning import cleanHDBDF
+from utils.schema import TYPE_LABELS, decodeTypes, encodeTypes, optimizeDtypes
+
+
+def test_type_bits_are_the_same_in_every_frame():
+    flats, _ = encodeTypes(pd.Series(['HDB 4-Room Flats', 'HDB 3-Room Flats, HDB 4-Room Flats']))
+    mixed, labels = encodeTypes(pd.Series(['Landed Properties, HDB 4-Room Flats', 'HDB 4-Room Flats']))
+
+    # 'HDB 4-Room Flats' alone is the same mask, though the frames hold different types
+    assert flats[0] == mixed[1] == 1 << TYPE_LABELS.index('HDB 4-Room Flats')
+    assert labels == list(TYPE_LABELS)
+    assert decodeTypes(flats[1]) == ['HDB 3-Room Flats', 'HDB 4-Room Flats']
+    assert decodeTypes(mixed[0]) == ['HDB 4-Room Flats', 'Landed Properties']
+    with pytest.raises(ValueError, match='Unknown dwelling types'):
+        encodeTypes(pd.Series(['HDB 4-Room Flats, Shophouses']))
+
+
+def test_counts_stay_int64(tmp_path):
+    paths = writeDataset(str(tmp_path))
+    population = cleanHDBDF(pd.read_csv(paths['population']), compact=True, regions_csv=paths['regions'])
+    assert population['population_count'].dtype == 'int64'
+    assert population['Year'].dtype.itemsize < 8
+
+    counts = optimizeDtypes(pd.DataFrame({'bus_stops_count': [30000, 30000], 'total_stops': [30000, 30000],
+                                          'NUM': [1, 2]}))
+    assert counts[['bus_stops_count', 'total_stops']].sum().tolist() == [60000, 60000]
+    assert counts['NUM'].dtype == 'int8'
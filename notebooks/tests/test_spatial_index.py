@@ -0,0 +1,61 @@
+# RegionIndex counts against the gpd.sjoin path of createPTStopsDF, and when its assignment is reused
+import numpy as np
+import pytest
+import shapely
+
+from benchmarks.synthetic import writeDataset
+from utils import gpd, pd
+from utils.geodataframe import createAreaGeoDF
+from utils.helper import createPTStopsDF
+from utils.spatial_index import RegionIndex
+
+
+@pytest.fixture(scope='module')
+def regions(tmp_path_factory):
+    return createAreaGeoDF(writeDataset(str(tmp_path_factory.mktemp('synthetic')))['regions'], None)
+
+
+# Random points over the regions and beyond, plus region vertices
+def createStops(regions: gpd.GeoDataFrame, seed: int = 0) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = regions.total_bounds
+    points = shapely.points(rng.uniform(minx - 0.01, maxx + 0.01, 3000), rng.uniform(miny - 0.01, maxy + 0.01, 3000))
+    vertices = shapely.points(shapely.get_coordinates(regions.geometry.to_numpy())[::7])
+    return gpd.GeoDataFrame(geometry=np.concatenate([points, vertices]), crs="EPSG:4326")
+
+
+def test_counts_match_sjoin(regions):
+    stops = createStops(regions)
+    expected = createPTStopsDF(regions, stops, 'bus')
+    region_index = RegionIndex(regions)
+    pd.testing.assert_frame_equal(region_index.countStops(stops, 'bus'), expected, check_dtype=False)
+    # Vertices lie on the boundary, which 'intersects' counts as inside
+    assert set(range(3000, len(stops))) <= set(region_index.assignStops(stops, 'bus').index)
+
+    # Polygons take the generic intersects query
+    stations = stops.iloc[::10].set_geometry(shapely.buffer(stops.geometry.to_numpy()[::10], 0.0008))
+    pd.testing.assert_frame_equal(RegionIndex(regions).countStops(stations, 'train'),
+                                  createPTStopsDF(regions, stations, 'train'), check_dtype=False)
+
+
+def test_assignment_is_reused_only_for_the_same_stops(regions):
+    region_index = RegionIndex(regions)
+    stops = createStops(regions)
+    assigned = region_index.assignStops(stops, 'bus')
+    assert region_index.assignStops(stops, 'bus') is assigned
+
+    # An edited copy, a longer frame and an explicit refresh are assigned again
+    moved = stops.copy()
+    moved['geometry'] = stops.geometry.translate(0.01, 0.0)
+    pd.testing.assert_frame_equal(region_index.countStops(moved, 'bus'), createPTStopsDF(regions, moved, 'bus'),
+                                  check_dtype=False)
+    assert region_index.assignStops(stops, 'bus') is not assigned
+
+    longer = pd.concat([stops, createStops(regions, seed=1)], ignore_index=True)
+    pd.testing.assert_frame_equal(region_index.countStops(longer, 'bus'), createPTStopsDF(regions, longer, 'bus'),
+                                  check_dtype=False)
+    refreshed = region_index.assignStops(longer, 'bus', refresh=True)
+    assert region_index.assignStops(longer, 'bus') is refreshed
+    # Another stop type keeps its own assignment
+    region_index.assignStops(moved, 'train')
+    assert region_index.assignStops(longer, 'bus') is refreshed
@@ -0,0 +1,66 @@
+# Multi-year trends: the least-squares growth rates and the per-year analysis in worker processes
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import createBusStopRecords, createPopulationDF, writeDataset
+from utils import helper, pd
+from utils.pipeline import loadRegions
+from utils.trends import Snapshot, analyseTrends, createGrowthDF, getGrowthRates
+
+
+def test_growth_rates_match_polyfit_skipping_missing_years():
+    matrix = pd.DataFrame({
+        'Rising': [0.1, 0.2, 0.4, 0.5],
+        'Gap': [0.3, np.nan, 0.1, 0.0],
+        'Flat': [0.2, 0.2, 0.2, 0.2],
+        'Single': [np.nan, np.nan, 0.7, np.nan],
+        'Empty': [np.nan] * 4,
+    }, index=pd.Index([2020, 2021, 2022, 2024], name='Year'))
+    rates = getGrowthRates(matrix)
+
+    for area in ['Rising', 'Gap', 'Flat']:
+        observed = matrix[area].dropna()
+        slope = np.polyfit(observed.index.to_numpy(dtype=float), observed.to_numpy(), 1)[0]
+        assert rates[area] == pytest.approx(slope, abs=1e-12)
+    # One year or none gives no trend
+    assert np.isnan(rates['Single']) and np.isnan(rates['Empty'])
+
+
+def test_growth_df_ranks_widening_areas_first():
+    trend_df = pd.DataFrame({
+        'Year': [2021, 2022, 2021, 2022, 2022],
+        'Area': ['A', 'A', 'B', 'B', 'C'],
+        'total_density_discrepancy': [0.1, 0.3, 0.4, 0.2, 0.5],
+    })
+    growth_df = createGrowthDF(trend_df)
+    assert growth_df['Area'].tolist() == ['A', 'B', 'C']
+    assert growth_df['widening'].tolist() == [True, False, False]
+    assert growth_df.loc[0, ['first_discrepancy', 'last_discrepancy', 'years']].tolist() == [0.1, 0.3, 2]
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('synthetic'))
+    paths = writeDataset(directory)
+    snapshots = []
+    for year in (2022, 2023):
+        population_path = f'{directory}/population_{year}.csv'
+        bus_stops_path = f'{directory}/bus_stops_{year}.csv'
+        createPopulationDF(seed=year).to_csv(population_path, index=False)
+        pd.DataFrame(createBusStopRecords(seed=year)).to_csv(bus_stops_path, index=False)
+        snapshots.append(Snapshot(year, population_path, bus_stops_path, paths['train_stations']))
+    return paths, snapshots
+
+
+def test_workers_read_the_lookup_files_they_are_given(dataset):
+    paths, snapshots = dataset
+    regions = loadRegions(paths['regions'], None)
+    defaults = (helper.REGIONS_CSV, helper.MRT_JSON)
+
+    serial = analyseTrends(regions, snapshots, 1, paths['regions'], paths['mrt_json'])
+    parallel = analyseTrends(regions, snapshots, 2, paths['regions'], paths['mrt_json'])
+    pd.testing.assert_frame_equal(serial['trend'], parallel['trend'])
+    pd.testing.assert_frame_equal(serial['total_growth'], parallel['total_growth'])
+    assert sorted(serial['trend']['Year'].unique()) == [2022, 2023]
+    # Nothing is configured through the helper module
+    assert (helper.REGIONS_CSV, helper.MRT_JSON) == defaults
@@ -1,4 +1,34 @@
-import pandas as pd
-import folium
-from shapely.geometry import Polygon
-import geopandas as gpd
+import importlib
+import os
+
+# Heavy dependencies are imported on first access (PEP 562), so submodules that
+# do not need them (e.g. constants, printer) load without pandas/geopandas/folium
+_LAZY_IMPORTS = {
+    'pd': ('pandas', None),
+    'folium': ('folium', None),
+    'Polygon': ('shapely.geometry', 'Polygon'),
+    'gpd': ('geopandas', None),
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module_name, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attribute:
+        value = getattr(value, attribute)
+    # Cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
+
+
+# UTILS_PROFILE=1 instruments the utils modules as soon as the package is imported (see utils.profiling)
+if os.environ.get('UTILS_PROFILE'):
+    from utils.profiling import enableFromEnvironment
+    enableFromEnvironment()
@@ -0,0 +1,165 @@
+# TRAIN TRAVEL-TIME ACCESSIBILITY
+import hashlib
+from collections import OrderedDict
+from functools import cached_property
+from typing import Sequence, Union
+import numpy as np
+import shapely
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from . import pd, gpd
+from utils.catchment import projectToMetres
+
+# Average running speeds (km/h) between stations, and the stop at every station (min)
+RAIL_SPEEDS = {'MRT': 45, 'LRT': 25}
+DWELL_MINUTES = 0.5
+# Changing lines: fixed penalty plus the walk between the platforms
+TRANSFER_MINUTES = 4
+# Stations of different lines this close (m) are a walking transfer, e.g. Bukit Panjang LRT / MRT
+TRANSFER_RADIUS = 250
+WALK_METRES_PER_MINUTE = 80
+# Stations considered when walking from an Area into the network
+ACCESS_STATIONS = 3
+# The city: the default destination of createAccessibilityDF
+CITY_STATIONS = ('RAFFLES PLACE MRT STATION',)
+
+# Station-to-destination minutes already computed, keyed by network and destinations; the least
+# recently used are dropped past TRAVEL_TIME_CACHE_SIZE, which covers the city, the interchanges
+# and a few ad-hoc destinations for several networks
+TRAVEL_TIME_CACHE = OrderedDict()
+TRAVEL_TIME_CACHE_SIZE = 64
+
+
+class TrainNetwork:
+    """
+    Travel times on the train network of cleanTrainStationDF.
+
+    Every row (one per line at interchanges) is a platform node. Rows are
+    sorted by LINE and NUM, so consecutive rows of a line are adjacent
+    stations, joined by the running time over the straight-line distance plus
+    a dwell. Platforms of the same station (the parts of a slashed STN_NO),
+    and platforms of other lines within TRANSFER_RADIUS, are joined by a
+    transfer. An unnumbered line code such as PTC or STC is the hub of the LRT
+    loops sharing its first letter, and is joined to both ends of each loop.
+
+    Shortest paths come from scipy's Dijkstra on the CSR graph. Results from
+    one or many destinations at once are cached, so every Area reuses them.
+    """
+
+    def __init__(self, train_stations_df: pd.DataFrame):
+        self.platforms = train_stations_df[['STN_NO', 'STN_NAME', 'LINE', 'NUM', 'TYPE']].reset_index(drop=True)
+        coordinates = train_stations_df['COORDINATES'].to_numpy()
+        self.points = projectToMetres(shapely.get_x(coordinates), shapely.get_y(coordinates))
+        self.n_platforms = len(self.platforms)
+
+        edges = pd.concat([self.createLineEdges(), self.createHubEdges(), self.createTransferEdges()])
+        # A pair joined twice (e.g. same station and nearby) keeps the faster link
+        edges = edges.groupby(['src', 'dst'], as_index=False)['minutes'].min()
+        self.graph = csr_matrix((edges['minutes'], (edges['src'], edges['dst'])),
+                                shape=(self.n_platforms, self.n_platforms))
+        self.key = hashlib.sha1(b''.join(
+            array.tobytes() for array in (self.graph.indptr, self.graph.indices, self.graph.data))).hexdigest()
+
+        # One node per station name, for walking in from an Area
+        self.station_names, self.station_idx = np.unique(self.platforms['STN_NAME'].to_numpy(), return_inverse=True)
+        first = np.unique(self.station_idx, return_index=True)[1]
+        self.station_tree = cKDTree(self.points[first])
+
+    # Get the riding minutes between platforms, at the speed of the departing platform's TYPE
+    def getRideMinutes(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        metres = np.hypot(*(self.points[src] - self.points[dst]).T)
+        speed = self.platforms['TYPE'].map(RAIL_SPEEDS).fillna(RAIL_SPEEDS['LRT']).to_numpy()[src]
+        return metres / (speed * 1000 / 60) + DWELL_MINUTES
+
+    def createLineEdges(self) -> pd.DataFrame:
+        lines = self.platforms['LINE'].to_numpy()
+        src = np.flatnonzero(lines[:-1] == lines[1:])
+        return pd.DataFrame({'src': src, 'dst': src + 1, 'minutes': self.getRideMinutes(src, src + 1)})
+
+    def createHubEdges(self) -> pd.DataFrame:
+        is_hub = self.platforms['NUM'].to_numpy() == 0
+        lines = self.platforms['LINE'].to_numpy()
+        src, dst = [], []
+        for hub in np.flatnonzero(is_hub & (self.platforms.groupby('LINE')['LINE'].transform('size') == 1)):
+            for line in np.unique(lines[~is_hub]):
+                if line[0] == lines[hub][0]:
+                    ends = np.flatnonzero(lines == line)[[0, -1]]
+                    src += [hub] * len(ends)
+                    dst += list(ends)
+        src, dst = np.array(src, dtype=int), np.array(dst, dtype=int)
+        return pd.DataFrame({'src': src, 'dst': dst, 'minutes': self.getRideMinutes(src, dst)})
+
+    def createTransferEdges(self) -> pd.DataFrame:
+        pairs = cKDTree(self.points).query_pairs(TRANSFER_RADIUS, output_type='ndarray')
+        names = self.platforms['STN_NAME'].to_numpy()
+        same_station = pd.DataFrame({'platform': np.arange(self.n_platforms), 'STN_NAME': names})
+        same_station = same_station.merge(same_station, on='STN_NAME')
+        same_station = same_station[same_station['platform_x'] < same_station['platform_y']]
+
+        src = np.concatenate([pairs[:, 0], same_station['platform_x'].to_numpy()]).astype(int)
+        dst = np.concatenate([pairs[:, 1], same_station['platform_y'].to_numpy()]).astype(int)
+        # Consecutive platforms of one line are already joined by a ride
+        lines = self.platforms['LINE'].to_numpy()
+        keep = lines[src] != lines[dst]
+        src, dst = src[keep], dst[keep]
+        metres = np.hypot(*(self.points[src] - self.points[dst]).T)
+        return pd.DataFrame({'src': src, 'dst': dst, 'minutes': TRANSFER_MINUTES + metres / WALK_METRES_PER_MINUTE})
+
+    @property
+    def interchanges(self) -> np.ndarray:
+        counts = self.platforms.groupby('STN_NAME')['LINE'].nunique()
+        return counts[counts > 1].index.to_numpy()
+
+    # Get the platforms of station names
+    def getPlatforms(self, stations: Sequence[str]) -> np.ndarray:
+        missing = set(stations) - set(self.station_names)
+        if missing:
+            raise ValueError(f"Unknown stations: {sorted(missing)}")
+        return np.flatnonzero(self.platforms['STN_NAME'].isin(stations).to_numpy())
+
+    # Get the minutes from every station to the nearest of the destinations, in one multi-source search
+    def getTravelTimes(self, destinations: Sequence[str]) -> pd.Series:
+        key = (self.key, tuple(sorted(set(destinations))))
+        if key not in TRAVEL_TIME_CACHE:
+            minutes = dijkstra(self.graph, directed=False, indices=self.getPlatforms(key[1]), min_only=True)
+            # Start from whichever platform of a station is fastest
+            TRAVEL_TIME_CACHE[key] = pd.Series(minutes).groupby(self.station_idx).min().to_numpy()
+        TRAVEL_TIME_CACHE.move_to_end(key)
+        while len(TRAVEL_TIME_CACHE) > TRAVEL_TIME_CACHE_SIZE:
+            TRAVEL_TIME_CACHE.popitem(last=False)
+        return pd.Series(TRAVEL_TIME_CACHE[key], index=pd.Index(self.station_names, name='STN_NAME'))
+
+    # Station x station minutes for every pair of stations
+    @cached_property
+    def travelTimeMatrix(self) -> pd.DataFrame:
+        minutes = dijkstra(self.graph, directed=False)
+        # Fastest pair of platforms for every pair of stations
+        minutes = pd.DataFrame(minutes).groupby(self.station_idx).min().T.groupby(self.station_idx).min().T
+        return pd.DataFrame(minutes.to_numpy(), index=self.station_names, columns=self.station_names)
+
+    # Get the minutes from every Area to the destinations: walk to one of the nearest stations, then ride
+    def createAccessibilityDF(self, regions: gpd.GeoDataFrame,
+                              destinations: Union[str, Sequence[str]] = CITY_STATIONS) -> pd.DataFrame:
+        if isinstance(destinations, str):
+            destinations = self.interchanges if destinations == 'interchanges' else [destinations]
+        station_minutes = self.getTravelTimes(destinations).to_numpy()
+
+        # Walk from a point that is always inside the Area
+        points = shapely.point_on_surface(regions.geometry.to_numpy())
+        start = projectToMetres(shapely.get_x(points), shapely.get_y(points))
+        k = min(ACCESS_STATIONS, len(self.station_names))
+        distances, stations = self.station_tree.query(start, k=list(range(1, k + 1)))
+
+        total = distances / WALK_METRES_PER_MINUTE + station_minutes[stations]
+        best = np.argmin(total, axis=1)
+        rows = np.arange(len(start))
+        accessibility = total[rows, best]
+
+        return pd.DataFrame({
+            'Area': regions['Area'].to_numpy(),
+            'access_station': self.station_names[stations[rows, best]],
+            'walk_minutes': distances[rows, best] / WALK_METRES_PER_MINUTE,
+            # No route to any destination
+            'accessibility_minutes': np.where(np.isfinite(accessibility), accessibility, np.nan),
+        })
@@ -0,0 +1,124 @@
+# ZIPPED SHAPEFILE / GEOJSON LOADER
+# Reads the layers of the data/ archives in place through GDAL's /vsizip/, without extracting them
+import os
+import zipfile
+from contextlib import contextmanager
+from typing import List, Sequence, Tuple
+import shapely
+from pyproj import CRS, Transformer
+from . import gpd
+
+try:
+    import pyogrio
+except ImportError:  # geopandas falls back to fiona
+    pyogrio = None
+
+try:
+    import pyarrow  # noqa: F401
+    USE_ARROW = pyogrio is not None
+except ImportError:
+    USE_ARROW = False
+
+LAYER_SUFFIXES = ('.shp', '.geojson', '.json')
+# Columns cleanTrainStationDF needs; TYP_CD, STN_NAM and ATTACHEMEN are never read
+TRAIN_STATION_COLUMNS = ['TYP_CD_DES', 'STN_NAM_DE']
+# LTA BusStopLocation shapefile fields, renamed to the DataMall BusStops names
+BUS_STOP_COLUMNS = {'BUS_STOP_N': 'BusStopCode', 'LOC_DESC': 'Description'}
+
+
+# Skip matching the ESRI .prj of a shapefile against the whole EPSG database, which takes
+# ~0.14 s per open; the WKT alone is enough to reproject
+@contextmanager
+def skipEPSGMatching():
+    if pyogrio is None:
+        yield
+        return
+    previous = pyogrio.get_gdal_config_option('USE_OSR_FIND_MATCHES')
+    pyogrio.set_gdal_config_options({'USE_OSR_FIND_MATCHES': 'NO'})
+    try:
+        yield
+    finally:
+        pyogrio.set_gdal_config_options({'USE_OSR_FIND_MATCHES': previous})
+
+
+# Get the vector layers inside an archive, e.g. ['TrainStation_Jul2024/RapidTransitSystemStation.shp']
+def listLayers(zip_path: str) -> List[str]:
+    with zipfile.ZipFile(zip_path) as archive:
+        return [name for name in archive.namelist()
+                if name.lower().endswith(LAYER_SUFFIXES) and not name.startswith('__MACOSX')]
+
+
+# Get the GDAL path of a layer inside an archive (the first layer when none is given)
+def getVSIPath(zip_path: str, member: str = None) -> str:
+    layers = listLayers(zip_path)
+    if member is None:
+        if not layers:
+            raise ValueError(f"{zip_path} has no shapefile or GeoJSON layer (found only non-spatial files)")
+        member = layers[0]
+    elif member not in layers:
+        raise ValueError(f"{member} is not a layer of {zip_path}, expected one of {layers}")
+    return f"/vsizip/{os.path.abspath(zip_path)}/{member}"
+
+
+def getLayerInfo(path: str) -> Tuple[CRS, List[str]]:
+    if pyogrio is not None:
+        with skipEPSGMatching():
+            info = pyogrio.read_info(path)
+        return CRS.from_user_input(info['crs']), list(info['fields'])
+    sample = gpd.read_file(path, rows=1)
+    return sample.crs, sample.columns.drop('geometry').tolist()
+
+
+# Read a layer of an archive, with only some columns and optionally only features in a WGS84 bbox
+def readZippedLayer(zip_path: str, member: str = None, columns: Sequence[str] = None,
+                    bbox: Tuple[float, float, float, float] = None, crs: str = "EPSG:4326") -> gpd.GeoDataFrame:
+    path = getVSIPath(zip_path, member)
+    layer_crs, fields = getLayerInfo(path)
+    if columns is not None:
+        missing = set(columns) - set(fields)
+        if missing:
+            raise ValueError(f"{path} has no columns {sorted(missing)}, available: {fields}")
+        columns = list(columns)
+    if bbox is not None and layer_crs is not None:
+        # The filter runs in the layer's CRS, e.g. SVY21 metres for the LTA shapefiles
+        bbox = Transformer.from_crs("EPSG:4326", layer_crs, always_xy=True).transform_bounds(*bbox)
+
+    if pyogrio is not None:
+        # Some LTA polygons have unclosed rings
+        with skipEPSGMatching():
+            geo_df = pyogrio.read_dataframe(path, columns=columns, bbox=bbox, on_invalid='fix', use_arrow=USE_ARROW)
+    else:
+        geo_df = gpd.read_file(path, bbox=bbox, include_fields=columns)
+
+    invalid = ~shapely.is_valid(geo_df.geometry.to_numpy())
+    if invalid.any():
+        geo_df.loc[invalid, 'geometry'] = shapely.make_valid(geo_df.geometry.to_numpy()[invalid])
+    if geo_df.crs is not None and crs is not None and not geo_df.crs.equals(crs):
+        geo_df = geo_df.to_crs(crs)
+    return geo_df
+
+
+# Train station polygons from e.g. TrainStation_Jul2024.zip, ready for cleanTrainStationDF
+def loadTrainStationLayer(zip_path: str, member: str = None, bbox=None) -> gpd.GeoDataFrame:
+    return readZippedLayer(zip_path, member, TRAIN_STATION_COLUMNS, bbox)
+
+
+# Bus stop points from an LTA BusStopLocation archive, with the columns of getDataframe's BusStops,
+# so they work with createPTStopsDF and the maps without calling the API
+def loadBusStopLayer(zip_path: str, member: str = None, bbox=None) -> gpd.GeoDataFrame:
+    if member is None and not listLayers(zip_path):
+        # e.g. transport_node_bus_202406.zip, which only holds the tap-in/tap-out counts per stop
+        raise ValueError(f"{zip_path} has no bus stop layer, only non-spatial files; pass a BusStops "
+                         f"table or an LTA BusStopLocation archive with BUS_STOP_N and LOC_DESC")
+    path = getVSIPath(zip_path, member)
+    columns = [col for col in BUS_STOP_COLUMNS if col in getLayerInfo(path)[1]]
+    if 'BUS_STOP_N' not in columns:
+        raise ValueError(f"{path} is not a bus stop layer (no BUS_STOP_N column)")
+
+    stops = readZippedLayer(zip_path, member, columns, bbox).rename(columns=BUS_STOP_COLUMNS)
+    # Multi-part or polygon features are reduced to a point
+    points = shapely.point_on_surface(stops.geometry.to_numpy())
+    stops['BusStopCode'] = stops['BusStopCode'].astype(str).str.zfill(5)
+    stops['Longitude'], stops['Latitude'] = shapely.get_x(points), shapely.get_y(points)
+    return stops.set_geometry(gpd.GeoSeries(points, index=stops.index, crs=stops.crs))
+
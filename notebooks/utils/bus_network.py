@@ -0,0 +1,111 @@
+# BUS NETWORK AND SERVICE FREQUENCIES
+import numpy as np
+from . import pd
+from utils.constants import FREQUENCY_PERIODS
+from utils.spatial_index import RegionIndex
+
+
+# DataMall headway of a service that is not dispatched in the period
+NO_SERVICE = '-'
+
+
+# Parse DataMall headways ("08-12", "10", "-", "00-00") into buses per hour:
+# 0 for "-" (no dispatch in the period), NaN when the headway is missing or unparseable
+def parseFrequency(headways: pd.Series) -> pd.Series:
+    text = headways.astype(str).str.strip()
+    bounds = text.str.extract(r'^(\d+)\s*(?:-\s*(\d+))?$').astype(float)
+    minutes = bounds.mean(axis=1)
+    frequency = 60 / minutes.where(minutes > 0)
+    return frequency.mask(text == NO_SERVICE, 0.0)
+
+
+# Normalise stop codes, which come back from Parquet / CSV as numbers with their leading zeros stripped
+def normalizeStopCodes(codes: pd.Series) -> pd.Series:
+    return codes.astype(str).str.strip().str.zfill(5)
+
+
+class BusNetwork:
+    """
+    Routes of the DataMall BusRoutes table with their service frequencies.
+
+    Every (ServiceNo, Direction) is one route. Each stop gets the number of
+    routes calling there and their buses per hour, summed over those routes.
+
+    Route frequencies come from BusServices (mean headway of `period`). A "-"
+    headway means the route is not dispatched in that period, so it adds 0
+    buses per hour. Only a route missing from BusServices, or with an
+    unparseable headway, falls back to its own mean over the other periods,
+    then to one bus per hour (the weight of every route without BusServices).
+    """
+
+    def __init__(self, routes_df: pd.DataFrame, services_df: pd.DataFrame = None, period: str = 'AM_Peak_Freq'):
+        if period not in FREQUENCY_PERIODS:
+            raise ValueError(f"Unknown frequency period '{period}', expected one of {FREQUENCY_PERIODS}")
+
+        calls = routes_df[['ServiceNo', 'Direction', 'BusStopCode']].copy()
+        calls['BusStopCode'] = normalizeStopCodes(calls['BusStopCode'])
+        calls['Direction'] = calls['Direction'].astype(int)
+        # A loop service calls at its terminal twice, but is one route (and one bus) there
+        calls = calls.drop_duplicates()
+
+        self.routes = calls[['ServiceNo', 'Direction']].drop_duplicates().sort_values(
+            ['ServiceNo', 'Direction']).reset_index(drop=True)
+        self.routes['frequency'] = self.getRouteFrequencies(services_df, period)
+
+        # Routes and buses per hour calling at every stop
+        calls = calls.merge(self.routes, on=['ServiceNo', 'Direction'])
+        self.stops = calls.groupby('BusStopCode').agg(
+            bus_routes_count=('frequency', 'size'), bus_frequency=('frequency', 'sum'))
+
+    # Get the buses per hour of every route, aligned with self.routes
+    def getRouteFrequencies(self, services_df: pd.DataFrame, period: str) -> np.ndarray:
+        if services_df is None:
+            return np.ones(len(self.routes))
+
+        services = services_df[['ServiceNo', 'Direction']].copy()
+        services['Direction'] = services['Direction'].astype(int)
+        services['frequency'] = parseFrequency(services_df[period]).to_numpy()
+        # The route's own level of service, for a headway that is missing rather than "-"
+        services['fallback'] = np.nan
+        other_periods = [col for col in FREQUENCY_PERIODS if col != period and col in services_df.columns]
+        if other_periods:
+            other = pd.concat([parseFrequency(services_df[col]) for col in other_periods], axis=1)
+            services['fallback'] = other.mean(axis=1).to_numpy()
+        # Operators can list the same service twice; keep the more frequent entry
+        services = services.groupby(['ServiceNo', 'Direction'], as_index=False)[['frequency', 'fallback']].max()
+
+        frequency = self.routes.merge(services, on=['ServiceNo', 'Direction'], how='left')
+        return frequency['frequency'].fillna(frequency['fallback']).fillna(1).to_numpy()
+
+    # Get the routes and buses per hour of every stop, for a BusStops table
+    def createStopServiceDF(self, bus_stops_df: pd.DataFrame) -> pd.DataFrame:
+        # Stops no route calls at have no service
+        service = self.stops.reindex(normalizeStopCodes(bus_stops_df['BusStopCode']))
+        stops_df = bus_stops_df.copy()
+        stops_df['bus_routes_count'] = service['bus_routes_count'].fillna(0).astype(int).to_numpy()
+        stops_df['bus_frequency'] = service['bus_frequency'].fillna(0.0).to_numpy()
+        return stops_df
+
+    # Get the service totals of every Area, matching stops to regions like createPTStopsDF
+    def createServiceDF(self, bus_stops_df: pd.DataFrame, region_index: RegionIndex) -> pd.DataFrame:
+        stops_df = self.createStopServiceDF(bus_stops_df)
+        stop_idx, region_idx = region_index.queryPoints(
+            stops_df['Longitude'].to_numpy(dtype=float), stops_df['Latitude'].to_numpy(dtype=float))
+
+        n_regions = len(region_index.areas)
+        service_df = pd.DataFrame({
+            'Area': region_index.areas,
+            'bus_stops_count': np.bincount(region_idx, minlength=n_regions),
+            'bus_routes_count': np.bincount(
+                region_idx, weights=stops_df['bus_routes_count'].to_numpy()[stop_idx], minlength=n_regions).astype(int),
+            'bus_frequency': np.bincount(
+                region_idx, weights=stops_df['bus_frequency'].to_numpy()[stop_idx], minlength=n_regions),
+        })
+        # Same rows as createPTStopsDF: only Areas with at least one stop
+        return service_df[service_df['bus_stops_count'] > 0].reset_index(drop=True)
+
+    # Replacement for createPTStopsDF(..., 'bus') that adds the buses per hour of every Area;
+    # the bus discrepancy uses bus_frequency, total_stops keeps adding up bus_stops_count
+    def createWeightedStopsDF(self, bus_stops_df: pd.DataFrame, region_index: RegionIndex) -> pd.DataFrame:
+        service_df = self.createServiceDF(bus_stops_df, region_index)
+        return service_df[['Area', 'bus_stops_count', 'bus_frequency']]
@@ -0,0 +1,75 @@
+# DATAMALL SNAPSHOT CACHE
+import os
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import List, Optional
+from . import pd
+from utils.constants import DATASETS
+
+CACHE_DIR = "../data/cache"
+# DataMall bus stops / routes only change a few times a year
+DEFAULT_TTL = timedelta(days=30)
+
+
+@dataclass
+class CacheReport:
+    dataset: str
+    status: str                 # 'hit', 'miss', 'expired' or 'refresh'
+    age: Optional[timedelta]    # Age of the snapshot that was served
+    load_seconds: float
+    rows: int
+
+
+# Every lookup made in this process, oldest first
+CACHE_LOG: List[CacheReport] = []
+
+
+# Get the on-disk location of a dataset snapshot
+def snapshotPath(dataset: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f"{dataset}.parquet")
+
+
+# Get the age of a snapshot, or None if it has not been cached yet
+def snapshotAge(dataset: str, cache_dir: str = CACHE_DIR) -> Optional[timedelta]:
+    path = snapshotPath(dataset, cache_dir)
+    if not os.path.exists(path):
+        return None
+    return timedelta(seconds=time.time() - os.path.getmtime(path))
+
+
+# Write a snapshot atomically so an interrupted run never leaves a partial file
+def saveSnapshot(df: pd.DataFrame, dataset: str, cache_dir: str = CACHE_DIR) -> str:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = snapshotPath(dataset, cache_dir)
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+# Load a dataset from the cache, going to DataMall only when the snapshot is missing or stale
+def loadSnapshot(dataset: str, acc_key: str = None, cache_dir: str = CACHE_DIR,
+                 ttl: timedelta = DEFAULT_TTL, refresh: bool = False, verbose: bool = True) -> pd.DataFrame:
+    start = time.perf_counter()
+    age = snapshotAge(dataset, cache_dir)
+
+    if age is not None and not refresh and age <= ttl:
+        status = 'hit'
+        df = pd.read_parquet(snapshotPath(dataset, cache_dir))
+    else:
+        if acc_key is None:
+            raise ValueError(f"No fresh snapshot of '{dataset}' in {cache_dir}; an acc_key is required to fetch it")
+        status = 'miss' if age is None else ('refresh' if refresh else 'expired')
+        from utils.datamall import fetchAllRecords
+        df = pd.DataFrame(fetchAllRecords(DATASETS[dataset], acc_key))
+        saveSnapshot(df, dataset, cache_dir)
+        age = timedelta(0)
+
+    report = CacheReport(dataset, status, age, time.perf_counter() - start, len(df))
+    CACHE_LOG.append(report)
+    if verbose:
+        from utils.printer import printCacheReport
+        printCacheReport(report)
+
+    return df
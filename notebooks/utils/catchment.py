@@ -0,0 +1,70 @@
+# WALKING-DISTANCE CATCHMENTS
+from functools import lru_cache
+from typing import Sequence, Tuple
+import numpy as np
+import shapely
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+from . import pd
+
+# SVY21 / Singapore TM, in metres
+SVY21 = "EPSG:3414"
+# Typical walking catchments for bus stops and MRT stations
+CATCHMENT_RADII = (400, 800)
+
+
+@lru_cache(maxsize=None)
+def getTransformer(crs: str = SVY21) -> Transformer:
+    return Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+
+
+# Project longitude / latitude arrays to metres in one call
+def projectToMetres(lon: np.ndarray, lat: np.ndarray, crs: str = SVY21) -> np.ndarray:
+    x, y = getTransformer(crs).transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    return np.column_stack([x, y])
+
+
+class StopCatchment:
+    """
+    KD-trees of bus stops and train stations in SVY21 metres, for counting the
+    stops within walking distance of many points at once. Unlike
+    createPTStopsDF, this ignores Area boundaries, so a stop just across a
+    boundary still serves the homes near it.
+    """
+
+    def __init__(self, bus_stops_df: pd.DataFrame, train_stations_df: pd.DataFrame,
+                 train_types: Sequence[str] = ('MRT',)):
+        # Bus stops as returned by getAllRecords / getDataframe
+        self.bus_tree = cKDTree(projectToMetres(bus_stops_df['Longitude'], bus_stops_df['Latitude']))
+
+        # cleanTrainStationDF has one row per line at interchanges, so keep one per station
+        stations = train_stations_df[train_stations_df['TYPE'].isin(train_types)]
+        stations = stations.drop_duplicates(subset='STN_NAME').reset_index(drop=True)
+        coordinates = stations['COORDINATES'].to_numpy()
+        self.station_names = stations['STN_NAME'].to_numpy()
+        self.train_tree = cKDTree(projectToMetres(shapely.get_x(coordinates), shapely.get_y(coordinates)))
+
+    # Count the bus stops within a radius (m) of every point
+    def countBusStops(self, points: np.ndarray, radius: float) -> np.ndarray:
+        return self.bus_tree.query_ball_point(points, radius, return_length=True, workers=-1)
+
+    # Count the train stations within a radius (m) of every point
+    def countTrainStations(self, points: np.ndarray, radius: float) -> np.ndarray:
+        return self.train_tree.query_ball_point(points, radius, return_length=True, workers=-1)
+
+    # Get the distance (m) to, and the name of, the nearest train station for every point
+    def nearestTrainStation(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        distances, idx = self.train_tree.query(points, k=1, workers=-1)
+        return distances, self.station_names[idx]
+
+    # Add catchment metrics to a frame of population points or grid cells with Longitude / Latitude
+    def createCatchmentDF(self, points_df: pd.DataFrame, radii: Sequence[float] = CATCHMENT_RADII) -> pd.DataFrame:
+        points = projectToMetres(points_df['Longitude'], points_df['Latitude'])
+        catchment_df = points_df.copy()
+
+        for radius in radii:
+            catchment_df[f'bus_stops_within_{radius}m'] = self.countBusStops(points, radius)
+            catchment_df[f'train_stations_within_{radius}m'] = self.countTrainStations(points, radius)
+
+        catchment_df['nearest_mrt_distance_m'], catchment_df['nearest_mrt'] = self.nearestTrainStation(points)
+        return catchment_df
@@ -0,0 +1,279 @@
+# HEADLESS BATCH RUNNER
+# Runs the 02_HDB-PT_visualization analysis end to end, e.g. nightly on a server:
+#   cd notebooks && python -m utils.cli --report-dir /srv/report
+# or from anywhere with PYTHONPATH=<repo>/notebooks
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from utils.constants import FREQUENCY_PERIODS
+from utils.profiling import PROFILE_DIR_ENV, PROFILE_ENV, PROFILE_LOG_ENV, PROFILE_STAGE_ENV, profileStage
+
+# Repository layout, so the runner works from any working directory
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(ROOT_DIR, 'data')
+# Scratch output, so a run never overwrites the committed report/ (pass --report-dir ../report to refresh it)
+REPORT_DIR = os.path.join(ROOT_DIR, 'output')
+
+
+@dataclass
+class StageReport:
+    stage: str
+    seconds: float
+    peak_mib: Optional[float]   # Peak RSS of the process that ran the stage
+    growth_mib: Optional[float] # How much the stage raised that peak
+    rows: Optional[int]
+    pid: int
+
+
+# Get the peak resident memory of this process in MiB
+def getPeakMemory() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+# Run one stage and measure its wall time and memory
+def runStage(stage: str, func: Callable, *args):
+    # UTILS_PROFILE_STAGE is read here, so it also works in worker processes
+    dump_profile = os.environ.get(PROFILE_STAGE_ENV) == stage
+    before = getPeakMemory()
+    start = time.perf_counter()
+    with profileStage(stage, os.environ.get(PROFILE_DIR_ENV, '.')) if dump_profile else contextlib.nullcontext():
+        result = func(*args)
+    seconds = time.perf_counter() - start
+    after = getPeakMemory()
+
+    report = StageReport(
+        stage, seconds, after, None if after is None else after - before,
+        len(result) if hasattr(result, '__len__') and not isinstance(result, str) else None,
+        os.getpid())
+    return result, report
+
+
+# Run independent stages in the pool (or in this process without one), keeping their order
+def runStages(stages: Dict[str, tuple], reports: List[StageReport], pool: ProcessPoolExecutor = None) -> dict:
+    if pool is None:
+        outcomes = {stage: runStage(stage, *task) for stage, task in stages.items()}
+    else:
+        futures = {stage: pool.submit(runStage, stage, *task) for stage, task in stages.items()}
+        outcomes = {stage: future.result() for stage, future in futures.items()}
+
+    results = {}
+    for stage, (result, report) in outcomes.items():
+        results[stage] = result
+        reports.append(report)
+    return results
+
+
+def createParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.cli',
+        description="Rank the Areas most underserved by public transport and export the report maps.")
+    parser.add_argument('--data-dir', default=DATA_DIR,
+                        help="directory with MRTLRTStnPtt.json and All Regions_Coordinates.csv (default: %(default)s)")
+    parser.add_argument('--population', help="HDB population CSV (default: DATA_DIR/hsetod2023/population_subzone.csv)")
+    parser.add_argument('--regions', help="region coordinates CSV (default: DATA_DIR/All Regions_Coordinates.csv)")
+    parser.add_argument('--train-stations',
+                        help="train station GeoJSON or zipped shapefile, e.g. DATA_DIR/TrainStation_Jul2024.zip "
+                             "(default: DATA_DIR/RapidTransitSystemStation/TrainStationCoordinates.json)")
+    parser.add_argument('--bus-stops', help="bus stops CSV/JSON/Parquet with Longitude and Latitude, or a zipped "
+                                            "LTA BusStopLocation shapefile (default: the DataMall snapshot in CACHE_DIR)")
+    parser.add_argument('--bus-weighting', choices=['stops', 'frequency'], default='stops',
+                        help="measure bus supply in bus stops, or in buses per hour (default: %(default)s)")
+    parser.add_argument('--bus-period', choices=FREQUENCY_PERIODS, default='AM_Peak_Freq',
+                        help="BusServices headway column used by --bus-weighting frequency (default: %(default)s)")
+    parser.add_argument('--bus-routes', help="BusRoutes CSV/JSON/Parquet (default: the DataMall snapshot in CACHE_DIR)")
+    parser.add_argument('--bus-services', help="BusServices CSV/JSON/Parquet (default: the DataMall snapshot in CACHE_DIR)")
+    parser.add_argument('--cache-dir', help="DataMall snapshot and region cache directory (default: DATA_DIR/cache)")
+    parser.add_argument('--env-file', default=os.path.join(ROOT_DIR, '.env.local'),
+                        help="file with the DataMall API_KEY, used when the bus stop snapshot is stale (default: %(default)s)")
+    parser.add_argument('--report-dir', default=REPORT_DIR, help="output directory (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=10, help="number of underserved Areas to print (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="worker processes for independent stages, 1 to run everything in this process")
+    parser.add_argument('--no-maps', action='store_true', help="skip the map export")
+    parser.add_argument('--accessibility-to', nargs='+', metavar='STATION',
+                        help="add the train travel time (accessibility_minutes) from every Area to these stations, "
+                             "e.g. 'RAFFLES PLACE MRT STATION', or 'interchanges' for the nearest interchange")
+    parser.add_argument('--grid-size', type=float,
+                        help="also rank grid cells of this width (m) instead of only planning Areas; "
+                             "population is spread evenly over each Area, so only stop densities gain resolution")
+    parser.add_argument('--grid-shape', choices=['square', 'hex'], default='square',
+                        help="grid cell shape (default: %(default)s)")
+    parser.add_argument('--snapshot', nargs=4, action='append', metavar=('YEAR', 'POPULATION', 'BUS_STOPS', 'TRAIN_STATIONS'),
+                        help="trend mode: analyse this year's population CSV, bus stops and train stations; "
+                             "repeat once per year to rank the Areas whose discrepancy is widening")
+    parser.add_argument('--profile', action='store_true',
+                        help="time every helper / data_cleaning / geodataframe / maps call and print a summary "
+                             "(calls are logged to REPORT_DIR/profile.jsonl)")
+    parser.add_argument('--profile-stage', metavar='STAGE',
+                        help="write a cProfile file of one stage (e.g. discrepancy) to REPORT_DIR/STAGE.prof")
+    return parser
+
+
+# Analyse every --snapshot year (in parallel with --workers) and save the trend tables
+def runTrendMode(args, data_dir: str, cache_dir: str, reports: List[StageReport]) -> None:
+    from utils.pipeline import PT_TYPES, loadRegions
+    from utils.printer import printWideningAreas
+    from utils.trends import analyseTrends, parseSnapshots
+
+    regions_csv = args.regions or os.path.join(data_dir, 'All Regions_Coordinates.csv')
+    loaded = runStages({
+        'regions': (loadRegions, regions_csv, os.path.join(cache_dir, 'regions.parquet')),
+    }, reports)
+    snapshots = parseSnapshots(args.snapshot)
+    trends = runStages({
+        'trends': (analyseTrends, loaded['regions'], snapshots, args.workers,
+                   regions_csv, os.path.join(data_dir, 'MRTLRTStnPtt.json')),
+    }, reports)['trends']
+
+    trends['trend'].to_csv(os.path.join(args.report_dir, 'trend_analysis.csv'), index=False)
+    for pt_type in PT_TYPES:
+        trends[f'{pt_type}_matrix'].to_csv(os.path.join(args.report_dir, f'{pt_type}_trend_matrix.csv'))
+        trends[f'{pt_type}_growth'].to_csv(os.path.join(args.report_dir, f'{pt_type}_trend_growth.csv'), index=False)
+        printWideningAreas(trends[f'{pt_type}_growth'], pt_type, num_rows=args.top)
+
+
+# Get the DataMall key from the environment or the env file
+def getAccountKey(env_file: str) -> Optional[str]:
+    if os.environ.get('API_KEY'):
+        return os.environ['API_KEY']
+    if os.path.exists(env_file):
+        from dotenv import dotenv_values
+        return dotenv_values(env_file).get('API_KEY')
+    return None
+
+
+def main(argv: List[str] = None) -> List[StageReport]:
+    args = createParser().parse_args(argv)
+    data_dir = os.path.abspath(args.data_dir)
+    cache_dir = args.cache_dir or os.path.join(data_dir, 'cache')
+    os.makedirs(args.report_dir, exist_ok=True)
+    # Lookup files, passed to the loaders of every worker
+    regions_csv = args.regions or os.path.join(data_dir, 'All Regions_Coordinates.csv')
+    mrt_json = os.path.join(data_dir, 'MRTLRTStnPtt.json')
+
+    # Set before the pool starts, so worker processes profile their stages too
+    profile_log = os.path.join(os.path.abspath(args.report_dir), 'profile.jsonl')
+    if args.profile:
+        from utils.profiling import enableFromEnvironment
+        if os.path.exists(profile_log):
+            os.remove(profile_log)
+        os.environ.update({PROFILE_ENV: '1', PROFILE_LOG_ENV: profile_log})
+        enableFromEnvironment()
+    if args.profile_stage:
+        os.environ.update({PROFILE_STAGE_ENV: args.profile_stage, PROFILE_DIR_ENV: os.path.abspath(args.report_dir)})
+
+    reports: List[StageReport] = []
+    start = time.perf_counter()
+    if args.snapshot:
+        runTrendMode(args, data_dir, cache_dir, reports)
+        from utils.printer import printStageReports
+        printStageReports(reports)
+        print(f"Finished in {time.perf_counter() - start:.2f} s, reports written to {os.path.abspath(args.report_dir)}")
+        return reports
+
+    from utils.pipeline import (PT_TYPES, countBusStops, countTrainStops, createAccessibilityDF, createDiscrepancyDF,
+                                createGridDF, loadBusNetwork, loadBusStops, loadPopulation, loadRegions,
+                                loadTrainStations, rankUnderservedAreas, renderMap)
+
+    pool = None
+    if args.workers > 1:
+        pool = ProcessPoolExecutor(max_workers=args.workers)
+
+    acc_key = getAccountKey(args.env_file)
+    loaders = {
+        'population': (loadPopulation, args.population or os.path.join(data_dir, 'hsetod2023', 'population_subzone.csv'),
+                       regions_csv),
+        'regions': (loadRegions, regions_csv, os.path.join(cache_dir, 'regions.parquet')),
+        'train_stations': (loadTrainStations, args.train_stations or os.path.join(
+            data_dir, 'RapidTransitSystemStation', 'TrainStationCoordinates.json'), mrt_json),
+        'bus_stops': (loadBusStops, args.bus_stops, acc_key, cache_dir),
+    }
+    if args.bus_weighting == 'frequency':
+        loaders['bus_network'] = (loadBusNetwork, args.bus_routes, args.bus_services, acc_key, cache_dir, args.bus_period)
+
+    try:
+        loaded = runStages(loaders, reports, pool)
+        region_df = loaded['regions']
+
+        per_area = {
+            'bus_stops_count': (countBusStops, region_df, loaded['bus_stops'], loaded.get('bus_network')),
+            'train_stops_count': (countTrainStops, region_df, loaded['train_stations']),
+        }
+        if args.accessibility_to:
+            destinations = 'interchanges' if args.accessibility_to == ['interchanges'] else args.accessibility_to
+            per_area['accessibility'] = (createAccessibilityDF, region_df, loaded['train_stations'], destinations)
+        counts = runStages(per_area, reports, pool)
+
+        # The rest of the analysis depends on both counts
+        analysis = runStages({
+            'discrepancy': (createDiscrepancyDF, region_df, loaded['population'],
+                            counts['bus_stops_count'], counts['train_stops_count']),
+        }, reports)
+        regionPTHDB_df = analysis['discrepancy']
+        if args.accessibility_to:
+            regionPTHDB_df = regionPTHDB_df.merge(counts['accessibility'], on='Area', how='left')
+        regionPTHDB_df.drop(columns='geometry').to_csv(os.path.join(args.report_dir, 'region_analysis.csv'), index=False)
+        runStages({'rankings': (rankUnderservedAreas, regionPTHDB_df, args.report_dir, args.top)}, reports)
+
+        if args.grid_size:
+            cells = runStages({
+                'grid': (createGridDF, region_df, loaded['population'], loaded['bus_stops'], loaded['train_stations'],
+                         args.grid_size, args.grid_shape),
+            }, reports)
+            cells['grid'].to_csv(os.path.join(args.report_dir, 'grid_analysis.csv'), index=False)
+            runStages({'grid_rankings': (rankUnderservedAreas, cells['grid'], args.report_dir, args.top, 'cells')}, reports)
+
+        if not args.no_maps:
+            from utils import pd
+            from utils.geodataframe import cleanRegionPTDF, createChoropleth
+
+            # Every Area is drawn in the population and stop count maps, as in the notebooks
+            combined_df = pd.merge(region_df, loaded['population'], on="Area", how="outer")
+            combined_df['population_count'] = combined_df['population_count'].fillna(0).astype(int)
+            regionPT_df = cleanRegionPTDF(region_df, counts['bus_stops_count'], counts['train_stops_count'])
+
+            # Serialise the region geometry once for the three density maps
+            density_choropleth = createChoropleth(
+                regionPTHDB_df, [f'normalized_{pt_type}_density_discrepancy' for pt_type in PT_TYPES])
+            maps = {
+                'population_heatmap': ('addPopulationHeatmap', combined_df, None),
+                'regionPT_heatmap': ('createRegionHeatMap', regionPT_df, None),
+            }
+            maps.update({f'{pt_type}_density_map': ('addDensityHeatmap', regionPTHDB_df, pt_type)
+                         for pt_type in PT_TYPES})
+
+            runStages({
+                f'map:{name}': (renderMap, layer, geo_df, os.path.join(args.report_dir, f'{name}.html'), pt_type,
+                                density_choropleth if layer == 'addDensityHeatmap' else None)
+                for name, (layer, geo_df, pt_type) in maps.items()
+            }, reports, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    from utils.printer import printProfileSummary, printStageReports
+    printStageReports(reports)
+    if args.profile:
+        from utils.profiling import readProfileLog
+        printProfileSummary(readProfileLog(profile_log))
+    print(f"Finished in {time.perf_counter() - start:.2f} s, reports written to {os.path.abspath(args.report_dir)}")
+    return reports
+
+
+if __name__ == '__main__':
+    main()
@@ -21,3 +21,6 @@ DATASETS = {
     "busRoutes": "http://datamall2.mytransport.sg/ltaodataservice/BusRoutes",
     "busStops": "http://datamall2.mytransport.sg/ltaodataservice/BusStops"
 }
+
+# BusServices columns with the headway range (minutes) of every period, e.g. "08-12"
+FREQUENCY_PERIODS = ['AM_Peak_Freq', 'AM_Offpeak_Freq', 'PM_Peak_Freq', 'PM_Offpeak_Freq']
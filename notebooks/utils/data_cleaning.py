@@ -1,59 +1,61 @@
-from utils.helper import removeDepots, dropRows, getCentroid, loadMRTJSON, split_slash, split_alphanumeric, prepare_area_list, determine_area
+from __future__ import annotations
+from utils.helper import dropRows, loadMRTJSON, prepare_area_index, determine_area
+from typing import Iterable, Optional, Union
 from . import pd
+from utils.schema import compactDF
 
 
-def cleanTrainStationDF(dataframe: pd.DataFrame) -> pd.DataFrame:
-    trainStation_coords_new = dataframe[dataframe.apply(
-        removeDepots, axis=1)]
-    trainStation_df = dropRows(trainStation_coords_new)
+# mrt_json is the MRTLRTStnPtt.json of STN_NO per station, helper.MRT_JSON by default
+def cleanTrainStationDF(dataframe: pd.DataFrame, compact: bool = False, mrt_json: str = None) -> pd.DataFrame:
+    import geopandas as gpd
+    import shapely
+
+    # Train depots are not considered public transportation
+    is_station = ~dataframe['STN_NAM_DE'].str.lower().str.contains('depot', regex=False)
+    trainStation_df = dropRows(dataframe[is_station])
     trainStation_df = trainStation_df.rename(columns={
         'TYP_CD_DES': 'TYPE',
         'STN_NAM_DE': 'STN_NAME',
         'geometry': 'GEOMETRY'
     })
 
-    # Apply the function to the GeoDataFrame
-    trainStation_df['COORDINATES'] = trainStation_df['GEOMETRY'].apply(
-        getCentroid)
+    # Get the centre of every station polygon in one call
+    trainStation_df['COORDINATES'] = gpd.GeoSeries(
+        shapely.centroid(trainStation_df['GEOMETRY'].to_numpy()), index=trainStation_df.index)
 
     # Merge the STN_NAME and STN_NO
-    mrtJSONDF = loadMRTJSON()
-    new_df = pd.merge(trainStation_df, mrtJSONDF, on="STN_NAME", how="inner")
+    mrtJSONDF = loadMRTJSON(mrt_json)
+    new_df = pd.merge(pd.DataFrame(trainStation_df), mrtJSONDF, on="STN_NAME", how="inner")
     new_df = new_df.drop_duplicates(subset="STN_NAME", keep='last')
 
-    # Duplicate rows that are interchanges
-    # Apply the function to the DataFrame and explode the list
-    df_expanded = new_df['STN_NO'].apply(split_slash).explode()
-    df_expanded = df_expanded.rename('STN_NO')
-    df_expanded = df_expanded.to_frame()
-
-    # Merge with the original DataFrame to retain other columns
-    df_expanded = df_expanded.merge(new_df.drop(
-        columns=['STN_NO']), left_index=True, right_index=True).reset_index(drop=True)
-    # print(df_expanded)
+    # Duplicate rows that are interchanges, keeping STN_NO as the first column
+    df_expanded = new_df.assign(STN_NO=new_df['STN_NO'].str.split('/')).explode('STN_NO')
+    df_expanded = df_expanded[['STN_NO'] + new_df.columns.drop('STN_NO').tolist()].reset_index(drop=True)
 
     # Split into Line column and Station Number column
-    df_expanded[['LINE', 'NUM']] = df_expanded['STN_NO'].apply(
-        lambda x: pd.Series(split_alphanumeric(x)))
-    df_expanded['NUM'] = pd.to_numeric(df_expanded['NUM'], errors='coerce')
-    df_expanded['NUM'] = df_expanded['NUM'].fillna(0)
-    df_expanded['NUM'] = df_expanded['NUM'].astype(int)
+    df_expanded[['LINE', 'NUM']] = df_expanded['STN_NO'].str.extract(r'^([a-zA-Z]+)(\d*)')
+    df_expanded['NUM'] = pd.to_numeric(df_expanded['NUM'], errors='coerce').fillna(0).astype(int)
 
     # Sort according to Station Number
-    new_df = df_expanded.sort_values(by=['LINE', 'NUM'])
+    new_df = df_expanded.sort_values(by=['LINE', 'NUM']).reset_index(drop=True)
 
-    return new_df.reset_index(drop=True)
+    # Use categorical / downcast dtypes and report the memory saved
+    if compact:
+        new_df = compactDF(new_df, 'cleanTrainStationDF')
+
+    return new_df
 
 
 # Preprocess HDB Population Data
-def cleanHDBDF(dataframe: pd.DataFrame) -> pd.DataFrame:
+# regions_csv gives the Area names subzones are matched to, helper.REGIONS_CSV by default
+def cleanHDBDF(dataframe: pd.DataFrame, compact: bool = False, regions_csv: str = None) -> pd.DataFrame:
     # Remove entries that have 0 HSE
     df = dataframe[dataframe['HSE'] != 0]
 
-    area_list = prepare_area_list()
+    area_index = prepare_area_index(regions_csv)
 
-    # Apply function to create 'MRT' column
-    df['Area'] = df.apply(lambda row: determine_area(row, area_list), axis=1)
+    # Map every Subzone to its Area with a single lookup
+    df['Area'] = determine_area(df, area_index)
     # print(df.to_string())
 
     # Group by MRT Area
@@ -74,4 +76,83 @@ def cleanHDBDF(dataframe: pd.DataFrame) -> pd.DataFrame:
         "Time": "Year"
     })
 
+    # Use categorical / downcast dtypes, with 'Type' as a dwelling-type bitmask
+    if compact:
+        new_df = compactDF(new_df, 'cleanHDBDF')
+
+    return new_df
+
+
+# Columns that are renamed the same way as in cleanHDBDF
+STREAM_COLUMN_NAMES = {
+    "SZ": "HDBSubzone",
+    "TOD": "Type",
+    "Time": "Year"
+}
+
+
+# Stream one or more population extracts in chunks, folding each chunk into running per-Area/per-Year aggregates
+def streamHDBDF(csv_paths: Union[str, Iterable[str]], chunksize: int = 100_000,
+                value_col: str = 'HSE', label_col: Optional[str] = 'TOD', compact: bool = False,
+                regions_csv: str = None) -> pd.DataFrame:
+    """
+    Peak memory is bounded by `chunksize` rather than by the number of files.
+    With the defaults a single hsetod extract gives the same rows as cleanHDBDF,
+    with one row per Area and Year when several years are loaded. Census tables
+    with a different value column (e.g. value_col='Pop') work the same way;
+    pass label_col=None to skip joining the label column (e.g. 5-year age bands).
+    Subzones are matched to the Areas of regions_csv, as in cleanHDBDF.
+    """
+    if isinstance(csv_paths, str):
+        csv_paths = [csv_paths]
+
+    area_index = prepare_area_index(regions_csv)
+    label_cols = ['PA', 'SZ'] + ([label_col] if label_col else [])
+    aggregates = {}
+
+    for csv_path in csv_paths:
+        reader = pd.read_csv(csv_path, chunksize=chunksize,
+                             dtype={col: 'category' for col in label_cols})
+        for chunk in reader:
+            # Remove entries that have no count
+            chunk = chunk[chunk[value_col] != 0]
+            if chunk.empty:
+                continue
+            chunk = chunk.assign(Area=determine_area(chunk, area_index))
+
+            keys = ['Area', 'Time']
+            grouped = chunk.groupby(keys, sort=False, observed=True)
+            for key, count in grouped[value_col].sum().items():
+                agg = aggregates.setdefault(key, {'count': 0, 'PA': {}, 'SZ': {}, 'labels': []})
+                agg['count'] += count
+
+            # dicts keep the first-seen order, like list(dict.fromkeys(x))
+            for col in ['PA', 'SZ']:
+                firsts = chunk[keys + [col]].drop_duplicates()
+                for area, year, value in firsts.itertuples(index=False):
+                    aggregates[(area, year)][col][value] = None
+
+            if label_col:
+                labels = grouped[label_col].agg(lambda x: ', '.join(x.astype(str)))
+                for key, joined in labels.items():
+                    aggregates[key]['labels'].append(joined)
+
+    rows = []
+    for (area, year), agg in sorted(aggregates.items()):
+        row = {
+            'Area': area,
+            'population_count': agg['count'],
+            'PA': list(agg['PA']),
+            'SZ': list(agg['SZ']),
+        }
+        if label_col:
+            row[label_col] = ', '.join(agg['labels'])
+        row['Time'] = year
+        rows.append(row)
+
+    new_df = pd.DataFrame(rows).rename(columns=STREAM_COLUMN_NAMES)
+
+    if compact:
+        new_df = compactDF(new_df, 'streamHDBDF')
+
     return new_df
@@ -0,0 +1,69 @@
+# LTA DATAMALL CLIENT
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# DataMall returns at most 500 records per call, paged with $skip
+PAGE_SIZE = 500
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# Create a pooled session that retries transient failures with exponential backoff
+def createSession(acc_key: str, max_workers: int = MAX_WORKERS, max_retries: int = MAX_RETRIES,
+                  backoff_factor: float = BACKOFF_FACTOR) -> requests.Session:
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+
+    session = requests.Session()
+    session.headers.update({"AccountKey": acc_key, "accept": "application/json"})
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Fetch a single page of records
+def fetchPage(session: requests.Session, api_link: str, skip: int, timeout: float = 30) -> list:
+    response = session.get(api_link, params={"$skip": skip}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['value']
+
+
+# Fetch every page of a DataMall endpoint concurrently, requesting each page only once
+def fetchAllRecords(api_link: str, acc_key: str, max_workers: int = MAX_WORKERS,
+                    page_size: int = PAGE_SIZE, max_retries: int = MAX_RETRIES,
+                    backoff_factor: float = BACKOFF_FACTOR) -> List[dict]:
+    """
+    Pages are requested in waves of `max_workers` concurrent calls. The first
+    empty page marks the end of the dataset, so no further waves are issued and
+    any pages past it are discarded.
+    """
+    listRecords = []
+    curNum = 0
+
+    with createSession(acc_key, max_workers, max_retries, backoff_factor) as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            skips = [curNum + i * page_size for i in range(max_workers)]
+            # map() keeps the results in $skip order
+            pages = executor.map(lambda skip: fetchPage(session, api_link, skip), skips)
+
+            finished = False
+            for page in pages:
+                if not page:
+                    finished = True
+                    break
+                listRecords.extend(page)
+            if finished:
+                break
+            curNum += max_workers * page_size
+
+    return listRecords
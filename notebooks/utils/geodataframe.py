@@ -1,35 +1,116 @@
-from shapely.geometry import mapping, Polygon
-import geopandas as gpd
-from . import pd, folium, Polygon, gpd
-from utils.helper import createColorMap, createIndexedDict, convertZeroToNan
-from area import area
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import numpy as np
+import shapely
+from . import pd, folium, gpd
+from utils.helper import createColorMap, evaluateColorMap
+from utils.schema import compactDF
+from utils.maps import createRegionGeoJSON, SIMPLIFY_TOLERANCE
+
+REGIONS_CSV = '../data/All Regions_Coordinates.csv'
+REGIONS_CACHE = '../data/cache/regions.parquet'
+
+
+# Function to flatten geometries into their Polygon parts, keeping the index of the geometry each part came from
+def explodePolygons(geometries: np.ndarray, indices: np.ndarray):
+    # make_valid can return nested multi-part geometries and collections with stray lines
+    while True:
+        multi = np.isin(shapely.get_type_id(geometries), [4, 5, 6, 7])
+        if not multi.any():
+            break
+        parts, part_index = shapely.get_parts(geometries, return_index=True)
+        geometries, indices = parts, indices[part_index]
+
+    polygons = shapely.get_type_id(geometries) == 3
+    return geometries[polygons], indices[polygons]
+
+
+# Function to repair invalid geometries and merge each group of Polygons into one MultiPolygon
+def createMultiPolygons(polygons: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    for _ in range(2):
+        invalid = ~shapely.is_valid(polygons)
+        polygons[invalid] = shapely.make_valid(polygons[invalid])
+        polygons, indices = explodePolygons(polygons, indices)
+        # Overlapping parts make the MultiPolygon itself invalid, which the second pass repairs
+        polygons = shapely.multipolygons(polygons, indices=indices)
+        indices = np.arange(len(polygons))
+    return polygons
+
+
+# Identify the CSV a region cache was built from: its resolved path, mtime and size
+def getSourceStamp(csv_path: str) -> dict:
+    stat = os.stat(csv_path)
+    return {'path': os.path.realpath(csv_path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+# Read a region cache, or None when it is missing or was built from another CSV (or an older version of it)
+def readRegionCache(cache_path: str, source: dict):
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    import pyarrow.parquet as pq
+    # The stamp is stored in the pandas attrs metadata, so the check does not read the geometry
+    metadata = pq.read_schema(cache_path).metadata or {}
+    if json.loads(metadata.get(b'PANDAS_ATTRS', b'{}')).get('source') != source:
+        return None
+    gdf = gpd.read_parquet(cache_path)
+    gdf.attrs.pop('source', None)
+    return gdf
+
 
 # Function to create GeoDataFrame
-def createAreaGeoDF() -> gpd.GeoDataFrame:
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv('../data/All Regions_Coordinates.csv')
+def createAreaGeoDF(csv_path: str = REGIONS_CSV, cache_path: str = REGIONS_CACHE) -> gpd.GeoDataFrame:
+    # Reuse the binary cache only if it was built from this exact CSV
+    source = getSourceStamp(csv_path)
+    cached = readRegionCache(cache_path, source)
+    if cached is not None:
+        return cached
 
-    # Group by the 'area' column
-    grouped = df.groupby('Area')
+    # Read the CSV file into a DataFrame
+    # The export repeats every vertex without an Area, so those rows are dropped
+    df = pd.read_csv(csv_path).dropna(subset=['Area'])
 
-    # Function to create a Polygon from a group of coordinates
-    def create_polygon(group):
-        coords = list(zip(group['Longitude'], group['Latitude']))
-        return Polygon(coords)
+    # Each (Area, Polygon ID) is one ring, with its vertices ordered by Point Order
+    df = df.sort_values(['Area', 'Polygon ID', 'Point Order'], kind='stable')
+    ring_codes, rings = pd.factorize(pd.MultiIndex.from_frame(df[['Area', 'Polygon ID']]))
+    area_codes, areas = pd.factorize(rings.get_level_values(0))
 
-    # Apply the function to each group and create a GeoDataFrame
-    polygons = grouped.apply(create_polygon)
+    # Build every ring in one call, then group the rings of each Area into a MultiPolygon
+    polygons = shapely.polygons(shapely.linearrings(
+        df[['Longitude', 'Latitude']].to_numpy(), indices=ring_codes))
+    multipolygons = createMultiPolygons(polygons, area_codes)
 
-    # Convert the Series to a GeoDataFrame
-    gdf = gpd.GeoDataFrame(polygons, columns=['geometry'])
+    gdf = gpd.GeoDataFrame({'Area': areas}, geometry=multipolygons, crs="EPSG:4326")
 
-    # Reset the index to have the 'area' column back
-    gdf = gdf.reset_index()
-    return gdf.set_crs(epsg=4326, inplace=True)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Written atomically, since parallel runs can share the cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        gdf.attrs['source'] = source
+        gdf.to_parquet(tmp_path)
+        gdf.attrs.pop('source')
+        os.replace(tmp_path, cache_path)
+    return gdf
 
 
 # Function to add GeoDataFrame to Folium map
-def addPolygonToMap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map) -> folium.Map:
+# lightweight=True adds every region as one simplified GeoJSON layer instead of one object each
+def addPolygonToMap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map, lightweight: bool = False) -> folium.Map:
+    if lightweight:
+        folium.GeoJson(
+            createRegionGeoJSON(geo_df, ['Area']),
+            # One style object for the whole layer
+            style={
+                'color': '#000000',
+                "fillColor": "#ffffff",
+                "fillOpacity": 0.2,
+                "weight": 2},
+            popup=folium.GeoJsonPopup(fields=['Area'], labels=False)
+        ).add_to(folium_map)
+        return folium_map
+
     for _, row in geo_df.iterrows():
         sim_geo = gpd.GeoSeries(row['geometry']).simplify(tolerance=0.001)
         geo_j = sim_geo.to_json()
@@ -44,24 +125,69 @@ def addPolygonToMap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map) -> folium.
     return folium_map
         
         
-# Function to add Population to Folium map
-def addPopulationHeatmap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map) -> folium.Map:
-    colormap = createColorMap(
-        geo_df['population_count'].min(), geo_df['population_count'].max(), caption = "Population Density")
+@dataclass
+class Choropleth:
+    # Simplified geometry with the metric values and their colours as feature properties
+    geojson: dict
+    # (min, max) of every metric column, for the colour map legends
+    ranges: Dict[str, Tuple[float, float]]
+
+
+# Serialise and simplify the geometry once, embedding a colour for every metric column
+def createChoropleth(geo_df: gpd.GeoDataFrame, metric_columns: List[str], extra_columns: List[str] = None,
+                     tolerance: float = SIMPLIFY_TOLERANCE) -> Choropleth:
+    colours, ranges = {}, {}
+    for col_name in metric_columns:
+        ranges[col_name] = (geo_df[col_name].min(), geo_df[col_name].max())
+        colormap = createColorMap(*ranges[col_name], caption=col_name)
+        colours[f'{col_name}_colour'] = evaluateColorMap(colormap, geo_df[col_name])
+
+    columns = list(dict.fromkeys(['Area'] + metric_columns + (extra_columns or []))) + list(colours)
+    geojson = json.loads(createRegionGeoJSON(geo_df.assign(**colours), columns, tolerance=tolerance))
+    return Choropleth(geojson, ranges)
+
+
+# Get one Leaflet style function for a layer: the constant style, with the colour baked into every
+# feature's properties; features whose metric is not above 0 get empty_style on top
+def createLayerStyle(col_name: str, style: dict, empty_style: dict = None) -> folium.JsCode:
+    lines = [
+        "function(feature) {",
+        f"  const style = Object.assign({{}}, {json.dumps(style)});",
+        f"  style.fillColor = feature.properties[{json.dumps(f'{col_name}_colour')}];",
+    ]
+    if empty_style:
+        lines.append(f"  if (!(feature.properties[{json.dumps(col_name)}] > 0)) Object.assign(style, {json.dumps(empty_style)});")
+    lines += ["  return style;", "}"]
+    return folium.JsCode("\n".join(lines))
+
+
+# Function to add one metric of a shared Choropleth to a Folium map
+# The style is evaluated by the browser, so folium does not call a Python function for every feature
+def addChoroplethLayer(choropleth: Choropleth, folium_map: folium.Map, col_name: str, caption: str,
+                       style: dict, tooltip: folium.GeoJsonTooltip, empty_style: dict = None) -> folium.Map:
+    colormap = createColorMap(*choropleth.ranges[col_name], caption=caption)
     colormap.add_to(folium_map)
 
-    population_dict = createIndexedDict(geo_df, 'population_count')
-    color_dict = {key: colormap(
-        population_dict[key]) for key in population_dict.keys()}
-
     geo_json = folium.GeoJson(
-        geo_df.to_json(),
-        style_function=lambda feature: {
-            "fillColor": color_dict[feature['properties']["Area"]],
-            "color": "black",
-            "weight": 0.5,
-            "fillOpacity": 1 if int(feature['properties']['population_count']) > 0 else 0,
-        },
+        choropleth.geojson,
+        tooltip=tooltip,
+        style=createLayerStyle(col_name, style, empty_style),
+    )
+
+    geo_json.add_to(folium_map)
+    return folium_map
+
+
+# Function to add Population to Folium map
+# Pass a Choropleth from createChoropleth to share its geometry payload between several maps
+def addPopulationHeatmap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map, choropleth: Choropleth = None) -> folium.Map:
+    if choropleth is None:
+        choropleth = createChoropleth(geo_df, ['population_count'])
+
+    return addChoroplethLayer(
+        choropleth, folium_map, 'population_count', caption="Population Density",
+        style={"color": "black", "weight": 0.5, "fillOpacity": 1},
+        empty_style={"fillOpacity": 0},
         tooltip=folium.GeoJsonTooltip(
             fields=["Area", "population_count"],
             aliases=["Area: ", "Population: "],
@@ -69,110 +195,85 @@ def addPopulationHeatmap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map) -> fo
         ),
     )
 
-    geo_json.add_to(folium_map)
-    return folium_map
 
+# Stop count columns shown in the region tooltips and popups, with buses per hour when the stops were weighted
+PT_LABELS = {'bus_stops_count': "Bus Stops: ", 'bus_frequency': "Buses per Hour: ", 'train_stops_count': "Train Stops: "}
 
-# Function to add regions with number of PT stops to the map as a heatmap
-def createRegionHeatMap(geo_df: gpd.GeoDataFrame, geo_map: folium.Map) -> folium.Map:
-    colormap = createColorMap(
-        geo_df['total_stops'].min(), geo_df['total_stops'].max(), caption = "PT Stops")
-    colormap.add_to(geo_map)
 
-    pt_stops_dict = createIndexedDict(geo_df, 'total_stops')
-    color_dict = {key: colormap(
-        pt_stops_dict[key]) for key in pt_stops_dict.keys()}
+# Get the PT_LABELS columns present in a cleanRegionPTDF table
+def getPTColumns(geo_df: gpd.GeoDataFrame) -> List[str]:
+    return [col_name for col_name in PT_LABELS if col_name in geo_df.columns]
 
-    # print(color_dict)
-    # print(geo_df.to_json())   
-    geo_json = folium.GeoJson(
-        geo_df.to_json(),
-        style_function=lambda feature: {
-            "fillColor": color_dict[feature['properties']["Area"]],
-            "color": "black" if feature['properties']['total_stops'] > 0 else 'none ',
-            "weight": 0.5,
-            "fillOpacity": 1 if feature['properties']['total_stops'] > 0 else 0,
-        },
+
+# Function to add regions with number of PT stops to the map as a heatmap
+def createRegionHeatMap(geo_df: gpd.GeoDataFrame, geo_map: folium.Map, choropleth: Choropleth = None) -> folium.Map:
+    pt_columns = getPTColumns(geo_df)
+    if choropleth is None:
+        choropleth = createChoropleth(geo_df, ['total_stops'], pt_columns)
+
+    return addChoroplethLayer(
+        choropleth, geo_map, 'total_stops', caption="PT Stops",
+        style={"color": "black", "weight": 0.5, "fillOpacity": 1},
+        empty_style={"color": "none", "fillOpacity": 0},
         tooltip=folium.GeoJsonTooltip(
-            fields=["Area", "bus_stops_count", "train_stops_count"],
-            aliases=["Area: ", "Bus Stops: ", "Train Stops: "],
+            fields=["Area"] + pt_columns,
+            aliases=["Area: "] + [PT_LABELS[col_name] for col_name in pt_columns],
             localize=True
         ),
     )
 
-    geo_json.add_to(geo_map)
-    return geo_map
-    
-    # geo_df['normalized_stops'] = convertZeroToNan(geo_df, 'normalized_stops')
-
-    # folium.Choropleth(
-    #     geo_data=geo_df.to_json(),
-    #     name='choropleth',
-    #     data=geo_df,
-    #     columns=['Area', 'normalized_stops'],
-    #     key_on='feature.properties.Area',
-    #     fill_color='YlOrRd',
-    #     fill_opacity=0.7,
-    #     line_weight=1,
-    #     line_opacity=0.2,
-    #     nan_fill_color="white",
-    #     nan_fill_opacity=0.7,
-    #     legend_name='Relative Number of Stops per Region',
-    #     highlight=True
-    # ).add_to(geo_map)
-
-    # return geo_map
-
 
 # Function to add Population to Folium map
-def addDensityHeatmap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map, pt_type: str) -> folium.Map:
-    colormap = createColorMap(
-        geo_df[f'normalized_{pt_type}_density_discrepancy'].min(), geo_df[f'normalized_{pt_type}_density_discrepancy'].max(), caption=f"Normalized {pt_type.capitalize()} Density Discrepancy")
-    colormap.add_to(folium_map)
-
-    density_dict = createIndexedDict(geo_df, f'normalized_{pt_type}_density_discrepancy')
-    color_dict = {key: colormap(
-        density_dict[key]) for key in density_dict.keys()}
-
-    geo_json = folium.GeoJson(
-        geo_df.to_json(),
-        style_function=lambda feature: {
-            "fillColor": color_dict[feature['properties']["Area"]],
-            "color": "black",
-            "weight": 0.5,
-            "fillOpacity": 1,
-        },
+def addDensityHeatmap(geo_df: gpd.GeoDataFrame, folium_map: folium.Map, pt_type: str, choropleth: Choropleth = None,
+                      caption: str = None) -> folium.Map:
+    col_name = f'normalized_{pt_type}_density_discrepancy'
+    if choropleth is None:
+        choropleth = createChoropleth(geo_df, [col_name])
+
+    return addChoroplethLayer(
+        choropleth, folium_map, col_name, caption=caption or f"Normalized {pt_type.capitalize()} Density Discrepancy",
+        style={"color": "black", "weight": 0.5, "fillOpacity": 1},
         tooltip=folium.GeoJsonTooltip(
-            fields=["Area", f"normalized_{pt_type}_density_discrepancy"],
+            fields=["Area", col_name],
             aliases=["Area: ", "Density: "],
             localize=True
         ),
     )
 
-    geo_json.add_to(folium_map)
-    return folium_map
-
 # Add the regions to the map with stop counts
-def addRegionswithPT(geo_df: gpd.GeoDataFrame, folium_map: folium.Map) -> folium.Map:
+# lightweight=True adds every region as one simplified GeoJSON layer instead of one object each
+def addRegionswithPT(geo_df: gpd.GeoDataFrame, folium_map: folium.Map, lightweight: bool = False) -> folium.Map:
+    pt_columns = getPTColumns(geo_df)
+    if lightweight:
+        folium.GeoJson(
+            createRegionGeoJSON(geo_df, ['Area'] + pt_columns),
+            popup=folium.GeoJsonPopup(
+                fields=['Area'] + pt_columns,
+                aliases=['Region: '] + [PT_LABELS[col_name] for col_name in pt_columns])
+        ).add_to(folium_map)
+        return folium_map
+
     for _, row in geo_df.iterrows():
         sim_geo = gpd.GeoSeries(row['geometry']).simplify(tolerance=0.001)
         geo_j = sim_geo.to_json()
         geo_j = folium.GeoJson(data=geo_j)
-        popup_text = f"Region: {row['Area']}<br>Bus Stops: {row['bus_stops_count']}<br>Train Stops: {row['train_stops_count']}"
+        popup_text = "<br>".join([f"Region: {row['Area']}"] + [f"{PT_LABELS[col_name]}{row[col_name]}" for col_name in pt_columns])
         folium.Popup(popup_text).add_to(geo_j)
         geo_j.add_to(folium_map)
 
     return folium_map
 
 # Process the dataframe to determine the total number of public transport stops in an area
-def cleanRegionPTDF(geo_df: gpd.GeoDataFrame, bus_stops_df: gpd.GeoDataFrame, train_stops_df: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def cleanRegionPTDF(geo_df: gpd.GeoDataFrame, bus_stops_df: gpd.GeoDataFrame, train_stops_df: gpd.GeoDataFrame, compact: bool = False) -> gpd.GeoDataFrame:
     # Merge the counts with the regions GeoDataFrame
     regionPT_df = geo_df.merge(bus_stops_df, on='Area', how='left').merge(
         train_stops_df, on='Area', how='left')
-    regionPT_df['bus_stops_count'] = regionPT_df['bus_stops_count'].fillna(
-        0).astype(int)
+    regionPT_df['bus_stops_count'] = regionPT_df['bus_stops_count'].fillna(0).astype(int)
     regionPT_df['train_stops_count'] = regionPT_df['train_stops_count'].fillna(
         0).astype(int)
+    # Buses per hour (BusNetwork.createWeightedStopsDF) stay fractional, next to the count rather than in it
+    if 'bus_frequency' in regionPT_df.columns:
+        regionPT_df['bus_frequency'] = regionPT_df['bus_frequency'].fillna(0.0)
 
     # Calculate the total number of stops per region
     regionPT_df['total_stops'] = regionPT_df['bus_stops_count'] + \
@@ -182,19 +283,75 @@ def cleanRegionPTDF(geo_df: gpd.GeoDataFrame, bus_stops_df: gpd.GeoDataFrame, tr
     max_stops = regionPT_df['total_stops'].max()
     regionPT_df['normalized_stops'] = regionPT_df['total_stops'] / max_stops
 
+    # Use categorical / downcast dtypes and report the memory saved
+    if compact:
+        regionPT_df = compactDF(regionPT_df, 'cleanRegionPTDF')
+
     return regionPT_df
 
+# WGS84 radius used by the spherical area formula of the `area` package
+WGS84_RADIUS = 6378137
+# Land areas already computed in this session, keyed by the geometry's WKB; the least recently used
+# are dropped past LAND_AREA_CACHE_SIZE, which holds every Area plus a fine grid
+LAND_AREA_CACHE = OrderedDict()
+LAND_AREA_CACHE_SIZE = 20000
+
+
+# Calculate the geodesic area (m2) of every geometry in one NumPy pass
+def calculateGeodesicAreas(geometries: np.ndarray) -> np.ndarray:
+    """
+    Same spherical formula as `area.area` (Chamberlain & Duquette, JPL 07-03),
+    evaluated over the packed ring coordinates instead of per geometry. Results
+    agree with `area.area` to within 2.5e-6 relative error, approached only by the
+    sub-square-metre slivers of the Lazarus Areas (4e-6 m2 absolute); geometries
+    above a square metre agree to within 1e-9.
+    """
+    polygons, geom_idx = explodePolygons(np.asarray(geometries, dtype=object), np.arange(len(geometries)))
+    rings, polygon_idx = shapely.get_rings(polygons, return_index=True)
+    # Only empty geometries, e.g. grid cells clipped away entirely
+    if not len(rings):
+        return np.zeros(len(geometries))
+    # The first ring of every polygon is its exterior, the rest are holes
+    is_exterior = np.r_[True, polygon_idx[1:] != polygon_idx[:-1]]
+
+    coords, ring_idx = shapely.get_coordinates(rings, return_index=True)
+    lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+
+    # Position of every vertex within its (closed) ring, to wrap around the ring ends
+    ring_sizes = np.bincount(ring_idx, minlength=len(rings))
+    ring_starts = np.r_[0, np.cumsum(ring_sizes)[:-1]]
+    sizes = ring_sizes[ring_idx]
+    position = np.arange(len(coords)) - ring_starts[ring_idx]
+    middle = ring_starts[ring_idx] + (position + 1) % sizes
+    upper = ring_starts[ring_idx] + (position + 2) % sizes
+
+    terms = (lon[upper] - lon) * np.sin(lat[middle])
+    ring_areas = np.abs(np.bincount(ring_idx, weights=terms, minlength=len(rings)))
+    ring_areas *= WGS84_RADIUS * WGS84_RADIUS / 2
+    ring_areas[ring_sizes <= 2] = 0
+    ring_areas[~is_exterior] *= -1
+
+    polygon_areas = np.bincount(polygon_idx, weights=ring_areas, minlength=len(polygons))
+    return np.bincount(geom_idx, weights=polygon_areas, minlength=len(geometries))
+
+
 # Get Land Area based on Geometry column in dataframe
 def getLandArea(geo_df: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    def calculate_area(geometry):
-        # Convert geometry to GeoJSON format
-        geojson = mapping(geometry)
-        # Calculate the area in square meters
-        area_m2 = area(geojson)
+    keys = shapely.to_wkb(geo_df['geometry'].to_numpy())
+    missing = [i for i, key in enumerate(keys) if key not in LAND_AREA_CACHE]
+
+    # Only geometries not seen before need their area calculated
+    if missing:
+        areas = calculateGeodesicAreas(geo_df['geometry'].to_numpy()[missing])
         # Convert to square kilometers
-        return area_m2 / 1e6
+        LAND_AREA_CACHE.update(zip(keys[missing], areas / 1e6))
+
+    land_areas = [LAND_AREA_CACHE[key] for key in keys]
+    geo_df['land_area-km2'] = land_areas
 
-    # Apply the transformation and area calculation to each geometry in the GeoDataFrame
-    geo_df['land_area-km2'] = geo_df['geometry'].apply(calculate_area)
+    for key in keys:
+        LAND_AREA_CACHE.move_to_end(key)
+    while len(LAND_AREA_CACHE) > LAND_AREA_CACHE_SIZE:
+        LAND_AREA_CACHE.popitem(last=False)
 
     return geo_df
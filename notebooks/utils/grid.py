@@ -0,0 +1,241 @@
+# SQUARE / HEXAGON GRID AGGREGATION
+from typing import Dict, Tuple
+import numpy as np
+import shapely
+from . import pd, gpd, folium
+from utils.catchment import SVY21, getTransformer, projectToMetres
+from utils.geodataframe import addDensityHeatmap
+from utils.helper import addDensityDiscrepancies
+
+GRID_SHAPES = ('square', 'hex')
+# Legend note for population spread from Area polygons, where the grid adds no resolution to population density
+AREA_POPULATION_CAVEAT = "population spread evenly over each Area"
+# Default cell width (m): centre spacing of squares, or the width across flats of hexagons
+CELL_SIZE = 250
+
+
+# Project every coordinate of an array of WGS84 geometries to SVY21 metres
+def projectGeometries(geometries: np.ndarray, crs: str = SVY21) -> np.ndarray:
+    return shapely.transform(geometries, lambda coords: projectToMetres(coords[:, 0], coords[:, 1], crs))
+
+
+# Project every coordinate of an array of SVY21 geometries back to WGS84
+def unprojectGeometries(geometries: np.ndarray, crs: str = SVY21) -> np.ndarray:
+    def transform(coords):
+        lon, lat = getTransformer(crs).transform(coords[:, 0], coords[:, 1], direction='INVERSE')
+        return np.column_stack([lon, lat])
+    return shapely.transform(geometries, transform)
+
+
+# Get the coordinates of bus stops (Longitude / Latitude) or of cleanTrainStationDF stations (COORDINATES)
+def getLonLat(stops_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    if 'Longitude' in stops_df:
+        return stops_df['Longitude'].to_numpy(dtype=float), stops_df['Latitude'].to_numpy(dtype=float)
+    coordinates = stops_df['COORDINATES'].to_numpy()
+    return shapely.get_x(coordinates), shapely.get_y(coordinates)
+
+
+# Round fractional axial hexagon coordinates to the nearest hexagon (cube rounding)
+def roundHexagons(q: np.ndarray, r: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+class SpatialGrid:
+    """
+    A square or pointy-top hexagonal grid in SVY21 metres over the regions of
+    createAreaGeoDF, as a finer spatial unit than the planning Area.
+
+    Cells are numbered row * n_cols + col, so points are binned with integer
+    arithmetic on their projected coordinates instead of a spatial join. Only
+    cells that overlap land are kept in `cells`, with the Area they overlap
+    most and their land area.
+
+    Population only has as much resolution as the polygons it is spread
+    from: without subzone polygons every cell of an Area gets the Area's
+    population density, see createGridDF.
+    """
+
+    def __init__(self, regions: gpd.GeoDataFrame, cell_size: float = CELL_SIZE, shape: str = 'square'):
+        if shape not in GRID_SHAPES:
+            raise ValueError(f"Unknown grid shape '{shape}', expected one of {GRID_SHAPES}")
+        self.shape = shape
+        self.cell_size = cell_size
+        # Hexagons: circumradius and vertical spacing of rows
+        self.radius = cell_size / np.sqrt(3)
+        self.row_height = 1.5 * self.radius if shape == 'hex' else cell_size
+
+        self.regions = regions.reset_index(drop=True)
+        self.region_geometries = projectGeometries(self.regions.geometry.to_numpy())
+
+        # One cell of margin so rounding at the edges never gives negative rows / columns
+        minx, miny, maxx, maxy = shapely.total_bounds(self.region_geometries)
+        self.origin = (minx - cell_size, miny - self.row_height)
+        self.n_cols = int(np.ceil((maxx - self.origin[0]) / cell_size)) + 2
+        self.n_rows = int(np.ceil((maxy - self.origin[1]) / self.row_height)) + 2
+
+        # Label every land cell with the Area covering most of it
+        # Kept to spread Area values over the cells without intersecting again
+        self.overlaps = self.overlapCells(self.region_geometries)
+        zone_idx, cell_ids, overlap = self.overlaps
+        overlaps = pd.DataFrame({'cell': cell_ids, 'zone': zone_idx, 'overlap': overlap})
+        land_area = overlaps.groupby('cell')['overlap'].sum()
+        main_zone = overlaps.sort_values('overlap').drop_duplicates('cell', keep='last').set_index('cell')['zone']
+
+        self.cells = pd.DataFrame(index=land_area.index.rename('cell'))
+        self.cells['Area'] = self.regions['Area'].to_numpy()[main_zone.loc[land_area.index].to_numpy()]
+        # Overlapping region polygons never count a cell more than once
+        self.cells['land_area-km2'] = np.minimum(land_area.to_numpy(), self.cellArea) / 1e6
+
+    @property
+    def cellArea(self) -> float:
+        if self.shape == 'hex':
+            return 1.5 * np.sqrt(3) * self.radius ** 2
+        return self.cell_size ** 2
+
+    # Get the cell id of every point in SVY21 metres, or -1 outside the grid
+    def binPoints(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=float) - self.origin[0]
+        y = np.asarray(y, dtype=float) - self.origin[1]
+
+        if self.shape == 'hex':
+            # Axial coordinates of the nearest hexagon centre, then odd-r offset columns
+            q, r = roundHexagons((np.sqrt(3) / 3 * x - y / 3) / self.radius, (2 / 3 * y) / self.radius)
+            rows, cols = r, q + (r - (r & 1)) // 2
+        else:
+            rows = np.floor(y / self.cell_size).astype(np.int64)
+            cols = np.floor(x / self.cell_size).astype(np.int64)
+
+        inside = (rows >= 0) & (rows < self.n_rows) & (cols >= 0) & (cols < self.n_cols)
+        return np.where(inside, rows * self.n_cols + cols, -1)
+
+    # Get the cell id of every WGS84 point
+    def binLonLat(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        points = projectToMetres(lon, lat)
+        return self.binPoints(points[:, 0], points[:, 1])
+
+    # Get the centre (SVY21 metres) of every cell
+    def cellCentres(self, cell_ids: np.ndarray) -> np.ndarray:
+        rows, cols = np.divmod(np.asarray(cell_ids, dtype=np.int64), self.n_cols)
+        if self.shape == 'hex':
+            # Odd rows are shifted right by half a cell
+            x = self.cell_size * (cols + 0.5 * (rows & 1))
+            y = self.row_height * rows
+        else:
+            x = self.cell_size * (cols + 0.5)
+            y = self.cell_size * (rows + 0.5)
+        return np.column_stack([x + self.origin[0], y + self.origin[1]])
+
+    # Get the polygon (SVY21 metres) of every cell
+    def cellPolygons(self, cell_ids: np.ndarray) -> np.ndarray:
+        centres = self.cellCentres(cell_ids)
+        if self.shape == 'hex':
+            angles = np.radians(30 + 60 * np.arange(7))
+            offsets = self.radius * np.column_stack([np.cos(angles), np.sin(angles)])
+        else:
+            half = self.cell_size / 2
+            offsets = np.array([[-half, -half], [half, -half], [half, half], [-half, half], [-half, -half]])
+        return shapely.polygons(centres[:, None, :] + offsets[None, :, :])
+
+    # Get the ids of every cell that can overlap a bounding box (SVY21 metres)
+    def cellsInBounds(self, bounds: np.ndarray) -> np.ndarray:
+        minx, miny, maxx, maxy = bounds
+        # Hexagons reach half a cell beyond their row / column, so widen the range by one
+        margin = 1 if self.shape == 'hex' else 0
+        rows = np.arange(
+            max(int(np.floor((miny - self.origin[1]) / self.row_height)) - margin, 0),
+            min(int(np.floor((maxy - self.origin[1]) / self.row_height)) + margin, self.n_rows - 1) + 1)
+        cols = np.arange(
+            max(int(np.floor((minx - self.origin[0]) / self.cell_size)) - margin, 0),
+            min(int(np.floor((maxx - self.origin[0]) / self.cell_size)) + margin, self.n_cols - 1) + 1)
+        return (rows[:, None] * self.n_cols + cols[None, :]).ravel()
+
+    # Get the overlap area (m2) between polygons in SVY21 metres and the cells they touch
+    def overlapCells(self, geometries: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        zone_idx, cell_ids = [], []
+        for i, bounds in enumerate(shapely.bounds(geometries)):
+            candidates = self.cellsInBounds(bounds)
+            zone_idx.append(np.full(len(candidates), i))
+            cell_ids.append(candidates)
+        zone_idx, cell_ids = np.concatenate(zone_idx), np.concatenate(cell_ids)
+
+        cells = self.cellPolygons(cell_ids)
+        shapely.prepare(geometries)
+        overlap = np.zeros(len(cell_ids))
+
+        # Only cells on a boundary need an actual intersection
+        inside = shapely.contains_properly(geometries[zone_idx], cells)
+        overlap[inside] = self.cellArea
+        edge = ~inside & shapely.intersects(geometries[zone_idx], cells)
+        overlap[edge] = shapely.area(shapely.intersection(geometries[zone_idx[edge]], cells[edge]))
+
+        keep = overlap > 0
+        return zone_idx[keep], cell_ids[keep], overlap[keep]
+
+    # Count WGS84 points in every land cell
+    def countPoints(self, lon: np.ndarray, lat: np.ndarray) -> pd.Series:
+        cell_ids = self.binLonLat(lon, lat)
+        counts = np.bincount(cell_ids[cell_ids >= 0], minlength=self.n_rows * self.n_cols)
+        return pd.Series(counts[self.cells.index.to_numpy()], index=self.cells.index)
+
+    # Spread zone values over the cells in proportion to the overlapping area
+    def spreadValues(self, values: np.ndarray, geometries: np.ndarray, overlaps) -> pd.Series:
+        zone_idx, cell_ids, overlap = overlaps
+        weights = overlap / shapely.area(geometries)[zone_idx]
+        totals = np.bincount(cell_ids, weights=values[zone_idx] * weights, minlength=self.n_rows * self.n_cols)
+        return pd.Series(totals[self.cells.index.to_numpy()], index=self.cells.index)
+
+    # Spread a value of every zone (e.g. subzone population) over the cells by area-weighting
+    def redistribute(self, zones: gpd.GeoDataFrame, value_col: str) -> pd.Series:
+        geometries = projectGeometries(zones.geometry.to_numpy())
+        return self.spreadValues(zones[value_col].to_numpy(dtype=float), geometries, self.overlapCells(geometries))
+
+    # Spread a value per Area (e.g. cleanHDBDF population_count) over the cells by area-weighting
+    def redistributeAreas(self, area_df: pd.DataFrame, value_col: str) -> pd.Series:
+        values = self.regions['Area'].map(area_df.set_index('Area')[value_col]).fillna(0).to_numpy(dtype=float)
+        return self.spreadValues(values, self.region_geometries, self.overlaps)
+
+    # Build the discrepancy table per cell, ready for getDensityDiscrepancyDF / printTopUnderservedAreas
+    def createGridDF(self, population_per_area: pd.DataFrame, stops: Dict[str, pd.DataFrame],
+                     subzones: gpd.GeoDataFrame = None) -> pd.DataFrame:
+        """
+        Population is spread from the subzone polygons in `subzones` (with a
+        population_count column) when given. Otherwise it is spread from the
+        Area polygons, so every cell of an Area gets the same population
+        density and only the stop densities gain resolution. The source is
+        kept in attrs['population_from'] for the map legend.
+        """
+        grid_df = self.cells.copy()
+        if subzones is not None:
+            grid_df['population_count'] = self.redistribute(subzones, 'population_count')
+            grid_df.attrs['population_from'] = 'subzone'
+        else:
+            grid_df['population_count'] = self.redistributeAreas(population_per_area, 'population_count')
+            grid_df.attrs['population_from'] = 'Area'
+
+        for pt_type, stops_df in stops.items():
+            grid_df[f'{pt_type}_stops_count'] = self.countPoints(*getLonLat(stops_df))
+        grid_df['total_stops'] = grid_df[[f'{pt_type}_stops_count' for pt_type in stops]].sum(axis=1)
+
+        # As with Areas, only cells where people live are analysed
+        grid_df = grid_df[grid_df['population_count'] > 0].reset_index()
+        return addDensityDiscrepancies(grid_df, list(stops) + ['total'])
+
+    # Attach the WGS84 cell polygons to a table with a `cell` column, e.g. for addDensityHeatmap
+    def getGeoDataFrame(self, grid_df: pd.DataFrame) -> gpd.GeoDataFrame:
+        geometry = unprojectGeometries(self.cellPolygons(grid_df['cell'].to_numpy()))
+        return gpd.GeoDataFrame(grid_df, geometry=geometry, crs="EPSG:4326")
+
+    # Add the density discrepancy of every cell to the map, noting in the legend how population was spread
+    def addDensityHeatmap(self, grid_df: pd.DataFrame, folium_map: folium.Map, pt_type: str) -> folium.Map:
+        caption = f"Normalized {pt_type.capitalize()} Density Discrepancy per {self.shape} cell"
+        if grid_df.attrs.get('population_from', 'Area') == 'Area':
+            caption += f" ({AREA_POPULATION_CAVEAT})"
+        return addDensityHeatmap(self.getGeoDataFrame(grid_df), folium_map, pt_type, caption=caption)
@@ -1,72 +1,58 @@
 # HELPER FUNCTIONS
-from . import pd, gpd
-import re
-from typing import List
-import branca.colormap as cm
-import requests
+from __future__ import annotations
+import os
+from functools import lru_cache
+from typing import Sequence, TYPE_CHECKING
 import numpy as np
+from . import pd
+
+# geopandas, branca and requests are only imported by the functions that use them
+if TYPE_CHECKING:
+    import branca.colormap as cm
+    import geopandas as gpd
+
+# Default data files of the lookup helpers, relative to the notebooks directory; pass a path to read another one
+MRT_JSON = "../data/MRTLRTStnPtt.json"
+REGIONS_CSV = "../data/All Regions_Coordinates.csv"
 
 # Public Transport Analysis
 def getRes(api_link: str, acc_key: str):
+    import requests
     return requests.get(api_link, headers={"AccountKey": acc_key})
 
 def getJSON(response):
     return response.json()['value']
 
-def getDataframe(jsonList: list) -> pd.DataFrame:
+def getDataframe(jsonList: list = None, dataset: str = None, acc_key: str = None, **cache_kwargs) -> pd.DataFrame:
+    # Serve a DATASETS snapshot from the on-disk cache when a dataset name is given
+    if dataset is not None:
+        from utils.cache import loadSnapshot
+        return loadSnapshot(dataset, acc_key, **cache_kwargs)
     return pd.DataFrame(jsonList)
 
-def getAllRecords(api_link: str, acc_key: str) -> list:
-    listRecords = []
-    curNum = 0
-
-    while True:
-        # print(curNum)
-        new_api_link = api_link + f"?$skip={curNum}"
-        if getJSON(getRes(new_api_link, acc_key)): # List
-            listRecords.extend(getJSON(getRes(new_api_link, acc_key)))
-        else:
-            break
-        curNum += 500
-    # print(listRecords)
-    return listRecords
-
+def getAllRecords(api_link: str, acc_key: str, max_workers: int = 8) -> list:
+    # Each $skip page is fetched once, concurrently over a pooled session
+    from utils.datamall import fetchAllRecords
+    return fetchAllRecords(api_link, acc_key, max_workers=max_workers)
 
-# Train depots are not considered public transportation as commuters do not have access
-def removeDepots(row):
-    return 'depot' not in row['STN_NAM_DE'].lower()
 
-# Drop unnecessary rows
+# Drop unnecessary rows (already absent when only the needed columns were read)
 def dropRows(dataframe: pd.DataFrame) -> pd.DataFrame:
-    return dataframe.drop(['TYP_CD', 'STN_NAM', 'ATTACHEMEN'], axis=1)
+    return dataframe.drop(['TYP_CD', 'STN_NAM', 'ATTACHEMEN'], axis=1, errors='ignore')
 
-# Get the centre of the polygon to find the location of the station
-def getCentroid(polygon):
-    return polygon.centroid
+# Read each MRT JSON file only once per process
+@lru_cache(maxsize=None)
+def readMRTJSON(json_path: str) -> pd.DataFrame:
+    return pd.read_json(json_path)
 
 # Load JSON containing MRT station coordinates (except TEL)
-def loadMRTJSON() -> pd.DataFrame:
-    return pd.read_json("../data/MRTLRTStnPtt.json")
-
-# Function to extract alphabetical and numerical parts
-def split_alphanumeric(station):
-    match = re.match(r'([a-zA-Z]+)(\d*)', station)
-    if match:
-        letters = match.group(1)
-        numbers = match.group(2) if match.group(2) else None
-        return letters, numbers
-    return None, None
-
-# Function to split rows with slashes into multiple rows
-def split_slash(station) -> List:
-    if '/' in station:
-        parts = station.split('/')
-        return [part for part in parts]
-    return [station]
+def loadMRTJSON(json_path: str = None) -> pd.DataFrame:
+    # Copy so callers cannot modify the cached frame
+    return readMRTJSON(os.path.abspath(json_path or MRT_JSON)).copy()
 
 # Function to create MRT List
-def prepare_mrt_list():
-    mrt_df = pd.read_json("../data/MRTLRTStnPtt.json")
+def prepare_mrt_list(json_path: str = None):
+    mrt_df = loadMRTJSON(json_path)
 
     def remove_and_lowercase(text):
         words = text.split()[:-2]  # Remove last two words
@@ -78,9 +64,8 @@ def prepare_mrt_list():
     return mrt_df['STN_NAME']
 
 # Function to create Area List (in lowercase)
-def prepare_area_list() -> list:
-    area_list = pd.read_csv(
-        '../data/All Regions_Coordinates.csv')['Area'].to_list()
+def prepare_area_list(csv_path: str = None) -> list:
+    area_list = pd.read_csv(csv_path or REGIONS_CSV)['Area'].to_list()
 
     area_list = list(set(area_list))
     area_list_lower = [str(area).lower() for area in area_list]
@@ -95,45 +80,54 @@ def capitalize(words: list) -> str:
     # Join the capitalized words back into a single string
     return ' '.join(capitalized_words)
 
+# Location names that do not alter the area
+KEY_WORDS = ['North', 'South', 'East', 'West', 'Central', 'Rise',
+             'Drive', 'Way', 'Station', 'Kampong', '1', '2', 'Place']
+
 # Function to strip location names that do not alter the area
 def strip_key_words(word: str) -> str:
-    key_words = ['North', 'South', 'East', 'West', 'Central', 'Rise',
-                 'Drive', 'Way', 'Station', 'Kampong', '1', '2', 'Place']
-    for key_word in key_words:
+    for key_word in KEY_WORDS:
         word = word.replace(key_word.lower(), '')
     return word.strip()
 
-# Function to determine mrt based on Subzone column
-def determine_mrt(row, mrt_list: list):
-    sz_value = row['SZ'].lower()
+# Vectorized strip_key_words over a Series of lowercase names
+def strip_key_words_series(words: pd.Series) -> pd.Series:
+    for key_word in KEY_WORDS:
+        words = words.str.replace(key_word.lower(), '', regex=False)
+    return words.str.strip()
 
-    # Check if SZ value is in MRT name list
-    if any(sz_value == mrt_name for mrt_name in mrt_list):
-        return next((capitalize(mrt_name) for mrt_name in mrt_list if sz_value == mrt_name), row['PA'])
+# Function to build a lookup index from lowercase names to their capitalized form
+def create_lookup_index(names) -> dict:
+    return {name: capitalize(name) for name in names}
 
-    # Strip directional words and check again
-    stripped_value = strip_key_words(sz_value)
-    if any(stripped_value == mrt_name for mrt_name in mrt_list):
-        return next((capitalize(mrt_name) for mrt_name in mrt_list if stripped_value == mrt_name), row['PA'])
+# Function to create Area lookup index
+def prepare_area_index(csv_path: str = None) -> dict:
+    return create_lookup_index(prepare_area_list(csv_path))
 
-    # Default to 'PA' if no match found
-    return row['PA']
+# Function to create MRT lookup index
+def prepare_mrt_index(json_path: str = None) -> dict:
+    return create_lookup_index(prepare_mrt_list(json_path))
 
-# Function to determine area based on Subzone column
-def determine_area(row, area_list: list):
-    sz_value = row['SZ'].lower()
+# Function to match each Subzone to a name in the lookup index, defaulting to 'PA'
+def match_subzone(df: pd.DataFrame, lookup_index: dict) -> pd.Series:
+    # Only the distinct subzones need to be matched
+    sz_values = pd.Series(df['SZ'].unique())
+    sz_lower = sz_values.str.lower()
+
+    # Check the SZ value first, then again with directional words stripped
+    matched = sz_lower.map(lookup_index)
+    matched = matched.fillna(strip_key_words_series(sz_lower).map(lookup_index))
 
-    # Check if SZ value is in MRT name list
-    if any(sz_value == area_name for area_name in area_list):
-        return next((capitalize(area_name) for area_name in area_list if sz_value == area_name), row['PA'])
+    sz_lookup = dict(zip(sz_values, matched))
+    return df['SZ'].map(sz_lookup).fillna(df['PA'])
 
-    # Strip directional words and check again
-    stripped_value = strip_key_words(sz_value)
-    if any(stripped_value == area_name for area_name in area_list):
-        return next((capitalize(area_name) for area_name in area_list if stripped_value == area_name), row['PA'])
+# Function to determine mrt based on Subzone column
+def determine_mrt(df: pd.DataFrame, mrt_index: dict) -> pd.Series:
+    return match_subzone(df, mrt_index)
 
-    # Default to 'PA' if no match found
-    return row['PA']
+# Function to determine area based on Subzone column
+def determine_area(df: pd.DataFrame, area_index: dict) -> pd.Series:
+    return match_subzone(df, area_index)
 
 # Population Analysis
 
@@ -141,23 +135,56 @@ def determine_area(row, area_list: list):
 def createIndexedDict(dataframe: pd.DataFrame, col_name: str) -> pd.DataFrame:
     return dataframe.set_index("Area")[col_name]
 
+# Colour of Areas without a value (e.g. no stops), the low end of every colour map
+NO_DATA_COLOUR = "#78777dff"
+
 # Create a colour map
 def createColorMap(minvalue: int, maxvalue: int, caption: str) -> cm.LinearColormap:
+    import branca.colormap as cm
     colormap = cm.LinearColormap(
-        colors=["#78777d", "#ac172b"], 
+        colors=[NO_DATA_COLOUR[:7], "#ac172b"], 
         vmin=minvalue, 
         vmax=maxvalue)
     colormap.caption = caption
 
     return colormap
 
+# Evaluate a linear colour map for every value at once, giving the same "#RRGGBBAA" strings as colormap(value),
+# and NO_DATA_COLOUR for NaN
+def evaluateColorMap(colormap: cm.LinearColormap, values) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    index = np.asarray(colormap.index, dtype=float)
+    colors = np.asarray(colormap.colors, dtype=float)
+
+    # Segment of the colour map each value falls in, and its position p within it
+    upper = np.clip(np.searchsorted(index, values, side='left'), 1, len(index) - 1)
+    lower = upper - 1
+    width = index[upper] - index[lower]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(width > 0, (values - index[lower]) * 1.0 / width, 1.0)[:, None]
+    rgba = (1.0 - p) * colors[lower] + p * colors[upper]
+    rgba[values >= index[-1]] = colors[-1]
+    rgba[values <= index[0]] = colors[0]
+
+    missing = np.isnan(values)
+    rgba[missing] = 0
+    rgba_bytes = (rgba * 255.9999).astype(int)
+    colours = np.array(["#%02x%02x%02x%02x" % tuple(row) for row in rgba_bytes.tolist()])
+    colours[missing] = NO_DATA_COLOUR
+    return colours
+
 
 # Convert all 0 values to be NaN
 def convertZeroToNan(df: gpd.GeoDataFrame, col_name: str) -> gpd.GeoDataFrame:
     return df[col_name].replace(0, np.nan)
 
-# Create a new dataframe that determines the number of public transport stops within a region   
-def createPTStopsDF(geo_df: gpd.GeoDataFrame, pt_stops_gdf: gpd.GeoDataFrame, pt_type: str) -> gpd.GeoDataFrame:
+# Create a new dataframe that determines the number of public transport stops within a region
+# Pass a RegionIndex to reuse its prebuilt STRtree and share the stop assignment with the maps
+def createPTStopsDF(geo_df: gpd.GeoDataFrame, pt_stops_gdf: gpd.GeoDataFrame, pt_type: str, region_index=None) -> gpd.GeoDataFrame:
+    if region_index is not None:
+        return region_index.countStops(pt_stops_gdf, pt_type)
+
+    import geopandas as gpd
     pt_stops_in_region = gpd.sjoin(geo_df, pt_stops_gdf.set_crs("EPSG:4326"), how='inner')
     pt_stops_count = pt_stops_in_region.groupby(
         'Area').size().reset_index(name=f'{pt_type}_stops_count')
@@ -170,6 +197,34 @@ def normalizeColumn(df: pd.DataFrame, col_name: str) -> pd.DataFrame:
     df[f"normalized_{col_name}"] = (df[col_name] - df[col_name].min()) / (df[col_name].max() - df[col_name].min())
     return df
 
+# Get the column measuring the supply of a stop type: total_stops, {pt_type}_stops_count, or
+# bus_frequency (buses per hour) when the bus stops were weighted by BusNetwork.createWeightedStopsDF.
+# total_stops stays a count of stops, as buses per hour and train stations are not on the same scale
+def getCountColumn(df: pd.DataFrame, pt_type: str) -> str:
+    if pt_type == 'total':
+        return 'total_stops'
+    if pt_type == 'bus' and 'bus_frequency' in df.columns:
+        return 'bus_frequency'
+    return f'{pt_type}_stops_count'
+
+# Add the density, per capita, normalized and discrepancy columns of the analysis to a table of
+# population_count, land_area-km2 and {pt_type}_stops_count / total_stops, for Areas or grid cells alike
+def addDensityDiscrepancies(df: pd.DataFrame, pt_types: Sequence[str] = ('bus', 'train', 'total')) -> pd.DataFrame:
+    df['population_density'] = df['population_count'] / df['land_area-km2']
+    df = normalizeColumn(df, 'population_density')
+    for pt_type in pt_types:
+        count_col = getCountColumn(df, pt_type)
+        df[f'{pt_type}_stops_density'] = df[count_col] / df['land_area-km2']
+        df[f'{pt_type}_stops_per_capita'] = df[count_col] / df['population_count']
+        df = normalizeColumn(df, f'{pt_type}_stops_density')
+        df = normalizeColumn(df, f'{pt_type}_stops_per_capita')
+
+    for pt_type in pt_types:
+        df[f'{pt_type}_density_discrepancy'] = df['normalized_population_density'] - df[f'normalized_{pt_type}_stops_density']
+        df = normalizeColumn(df, f'{pt_type}_density_discrepancy')
+
+    return df
+
 # Get Density Discrepancy dataframe, sorted from highest to lowest
 def getDensityDiscrepancyDF(df: pd.DataFrame, pt_type: str) -> pd.DataFrame:
     areas_needing_more_stops = df[df[f'{pt_type}_density_discrepancy'] > 0]
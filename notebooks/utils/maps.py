@@ -1,6 +1,19 @@
+import os
+import time
+import numpy as np
+import shapely
 from utils.constants import TRAIN_COLOURS
 from . import pd, folium, gpd
 from folium.plugins import FastMarkerCluster
+from folium.utilities import JsCode
+
+# Decimal places kept for coordinates in lightweight layers (~1 m)
+COORDINATE_PRECISION = 5
+# Simplification tolerance (degrees) used for region outlines
+SIMPLIFY_TOLERANCE = 0.001
+# Style of the lightweight train station layer, run by the browser with each station's line colour
+TRAIN_STOP_STYLE = JsCode(
+    "function(feature) { return {color: feature.properties.colour, fillColor: feature.properties.colour}; }")
 
 # Function to create Singapore map
 def createSingaporeMap() -> folium.Map:
@@ -10,10 +23,50 @@ def createSingaporeMap() -> folium.Map:
         max_bounds=True
     )
 
+# Create one GeoJSON FeatureCollection of points, with coordinates rounded to the given precision
+def createPointGeoJSON(lon, lat, properties: pd.DataFrame, precision: int = COORDINATE_PRECISION) -> dict:
+    coordinates = np.round(np.column_stack([lon, lat]), precision).tolist()
+    records = properties.to_dict('records')
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": coords}, "properties": props}
+            for coords, props in zip(coordinates, records)
+        ]
+    }
+
+# Create one GeoJSON FeatureCollection of simplified, coordinate-quantized regions
+def createRegionGeoJSON(geo_df: gpd.GeoDataFrame, columns: list, tolerance: float = SIMPLIFY_TOLERANCE,
+                        precision: int = COORDINATE_PRECISION) -> str:
+    geometry = geo_df.geometry.to_numpy()
+    if tolerance:
+        geometry = shapely.simplify(geometry, tolerance)
+    geometry = shapely.set_precision(geometry, grid_size=10 ** -precision)
+    layer_df = gpd.GeoDataFrame(geo_df[columns].reset_index(drop=True), geometry=geometry, crs=geo_df.crs)
+    return layer_df.to_json(drop_id=True)
+
+# Save a map and report its size and render time
+def saveMap(geo_map: folium.Map, path: str) -> folium.Map:
+    start = time.perf_counter()
+    geo_map.save(path)
+    print(f"[map] {path}: {os.path.getsize(path) / 1024 ** 2:.2f} MiB, "
+          f"rendered in {time.perf_counter() - start:.2f} s")
+    return geo_map
+
 # Add bus stop markers
-def addBusStopMarkers(df: pd.DataFrame, geo_map: folium.Map) -> folium.Map:
+# lightweight=True draws every stop from a single GeoJSON layer instead of one Marker each
+def addBusStopMarkers(df: pd.DataFrame, geo_map: folium.Map, lightweight: bool = False) -> folium.Map:
 
     bus_stops_layer = folium.FeatureGroup(name='Bus Stops', show=False)
+    if lightweight:
+        folium.GeoJson(
+            createPointGeoJSON(df['Longitude'], df['Latitude'], df[['Description']]),
+            marker=folium.CircleMarker(radius=3, color='purple', fill=True, fill_opacity=0.8, weight=1),
+            tooltip=folium.GeoJsonTooltip(fields=['Description'], labels=False)
+        ).add_to(bus_stops_layer)
+        bus_stops_layer.add_to(geo_map)
+        return geo_map
+
     for index, point in df.iterrows():
         folium.Marker(
             location=[point['Latitude'], point['Longitude']],
@@ -28,7 +81,8 @@ def addBusStopMarkers(df: pd.DataFrame, geo_map: folium.Map) -> folium.Map:
     return geo_map
 
 # Add bus stop clusters within its region
-def addBusStopClusters(df: pd.DataFrame, geo_map: folium.Map, regions_gdf: gpd.GeoDataFrame) -> folium.Map:
+# Pass the RegionIndex used for createPTStopsDF to reuse its bus stop assignment
+def addBusStopClusters(df: pd.DataFrame, geo_map: folium.Map, regions_gdf: gpd.GeoDataFrame, region_index=None) -> folium.Map:
     
     bus_stops_layer = folium.FeatureGroup(name='Bus Stops Clusters', show=False)
 
@@ -40,7 +94,10 @@ def addBusStopClusters(df: pd.DataFrame, geo_map: folium.Map, regions_gdf: gpd.G
     )
 
     # Perform spatial join to associate each bus stop with its region
-    bus_stops_in_area = gpd.sjoin(gdf_bus_stops, regions_gdf, how='inner')
+    if region_index is not None:
+        bus_stops_in_area = region_index.assignStops(gdf_bus_stops, 'bus')
+    else:
+        bus_stops_in_area = gpd.sjoin(gdf_bus_stops, regions_gdf, how='inner')
 
     # Group bus stops by region
     grouped = bus_stops_in_area.groupby('Area')
@@ -70,7 +127,8 @@ def addTrainLines(df: pd.DataFrame, geo_map: folium.Map) -> folium.Map:
     return geo_map
 
 # Add train station markers
-def addTrainStopMarkers(df: pd.DataFrame, geo_map: folium.Map) -> folium.Map:
+# lightweight=True draws every station from a single GeoJSON layer instead of one Marker each
+def addTrainStopMarkers(df: pd.DataFrame, geo_map: folium.Map, lightweight: bool = False) -> folium.Map:
     """
     red, blue, green, purple, orange, darkred, lightred, beige, darkblue, darkgreen, cadetblue, darkpurple, white, pink, lightblue, lightgreen, gray, black, lightgray
     """
@@ -94,6 +152,21 @@ def addTrainStopMarkers(df: pd.DataFrame, geo_map: folium.Map) -> folium.Map:
     }
     
     train_stops_layer = folium.FeatureGroup(name='Train Stops')
+    if lightweight:
+        coordinates = df['COORDINATES'].to_numpy()
+        properties = pd.DataFrame({
+            'STN_NAME': df['STN_NAME'].astype(str).to_numpy(),
+            'colour': df['LINE'].map(TRAIN_COLOURS).astype(str).to_numpy()
+        })
+        folium.GeoJson(
+            createPointGeoJSON(shapely.get_x(coordinates), shapely.get_y(coordinates), properties),
+            marker=folium.CircleMarker(radius=5, fill=True, fill_opacity=1, weight=1),
+            style=TRAIN_STOP_STYLE,
+            tooltip=folium.GeoJsonTooltip(fields=['STN_NAME'], labels=False)
+        ).add_to(train_stops_layer)
+        train_stops_layer.add_to(geo_map)
+        return geo_map
+
     for index, point in df.iterrows():
         folium.Marker(
             location=[point['COORDINATES'].y, point['COORDINATES'].x],
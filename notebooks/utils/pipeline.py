@@ -0,0 +1,350 @@
+# INCREMENTAL DENSITY-DISCREPANCY PIPELINE
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+import numpy as np
+import shapely
+from . import pd, gpd
+from utils.data_cleaning import cleanHDBDF, cleanTrainStationDF
+from utils.geodataframe import calculateGeodesicAreas, cleanRegionPTDF, createAreaGeoDF, getLandArea
+from utils.helper import addDensityDiscrepancies, createPTStopsDF, getDensityDiscrepancyDF
+from utils.spatial_index import RegionIndex
+
+PT_TYPES = ['bus', 'train', 'total']
+
+
+@dataclass
+class DerivedColumn:
+    name: str
+    inputs: List[str]
+    # Computes the column for a subset of Areas (rows of the pipeline table)
+    compute: Callable[[pd.DataFrame], pd.Series] = None
+    # Min-max normalization of inputs[0] over every Area
+    normalize: bool = False
+
+
+@dataclass
+class ColumnStats:
+    min: float
+    max: float
+    min_area: str
+    max_area: str
+
+
+@dataclass
+class UpdateReport:
+    trigger: str
+    # Number of Areas recomputed for every column touched by the update
+    recomputed: Dict[str, int] = field(default_factory=dict)
+
+
+# Build the derived columns of the discrepancy analysis in dependency order
+def createDerivedColumns(pt_types: List[str]) -> List[DerivedColumn]:
+    count_cols = {pt_type: f'{pt_type}_stops_count' for pt_type in pt_types}
+    count_cols['total'] = 'total_stops'
+
+    columns = [
+        DerivedColumn('total_stops', list(count_cols.values())[:-1],
+                      lambda df: df[list(count_cols.values())[:-1]].sum(axis=1)),
+        DerivedColumn('population_density', ['population_count', 'land_area-km2'],
+                      lambda df: df['population_count'] / df['land_area-km2']),
+    ]
+    for kind, count_col in count_cols.items():
+        columns += [
+            DerivedColumn(f'{kind}_stops_density', [count_col, 'land_area-km2'],
+                          lambda df, c=count_col: df[c] / df['land_area-km2']),
+            DerivedColumn(f'{kind}_stops_per_capita', [count_col, 'population_count'],
+                          lambda df, c=count_col: df[c] / df['population_count']),
+        ]
+
+    normalized = ['population_density'] + [
+        f'{kind}_stops_{metric}' for kind in count_cols for metric in ['density', 'per_capita']]
+    columns += [DerivedColumn(f'normalized_{col}', [col], normalize=True) for col in normalized]
+
+    for kind in count_cols:
+        inputs = ['normalized_population_density', f'normalized_{kind}_stops_density']
+        columns += [
+            DerivedColumn(f'{kind}_density_discrepancy', inputs,
+                          lambda df, i=inputs: df[i[0]] - df[i[1]]),
+            DerivedColumn(f'normalized_{kind}_density_discrepancy', [f'{kind}_density_discrepancy'], normalize=True),
+        ]
+    return columns
+
+
+class DensityPipeline:
+    """
+    Dependency-tracked version of the discrepancy chain in 02_HDB-PT_visualization
+    (createPTStopsDF -> cleanRegionPTDF -> population merge -> getLandArea ->
+    normalizeColumn -> getDensityDiscrepancyDF).
+
+    Each derived column records the columns it is computed from. An update to an
+    input only recomputes the Areas whose input values actually changed, and
+    then only the columns downstream of them. Normalized columns keep their
+    global min/max, so they are recomputed for every Area only when an extreme
+    value moves.
+    """
+
+    def __init__(self, regions: gpd.GeoDataFrame, population: pd.DataFrame, stops: Dict[str, gpd.GeoDataFrame]):
+        self.pt_types = list(stops)
+        self.columns = createDerivedColumns(self.pt_types)
+        self.stats: Dict[str, ColumnStats] = {}
+        self.reports: List[UpdateReport] = []
+
+        self.regions = regions.set_index('Area')
+        self.region_index = RegionIndex(regions)
+        self.stops = dict(stops)
+
+        # Only Areas with residents are analysed, as in the notebook
+        population = population.set_index('Area')['population_count']
+        areas = self.regions.index.intersection(population.index).sort_values()
+        self.table = pd.DataFrame(index=areas)
+        self.table.index.name = 'Area'
+        self.table['population_count'] = population.loc[areas].astype(int)
+        self.table['land_area-km2'] = calculateGeodesicAreas(self.regions.geometry.loc[areas].to_numpy()) / 1e6
+        for pt_type in self.pt_types:
+            self.table[f'{pt_type}_stops_count'] = self.countStops(pt_type)
+
+        self.propagate({col: set(areas) for col in self.table.columns}, 'build')
+
+    # Get the columns each derived column depends on
+    @property
+    def dependencies(self) -> Dict[str, List[str]]:
+        return {column.name: column.inputs for column in self.columns}
+
+    # Count the stops of one type in every analysed Area
+    def countStops(self, pt_type: str) -> pd.Series:
+        counts = self.region_index.countStops(self.stops[pt_type], pt_type)
+        counts = counts.set_index('Area')[f'{pt_type}_stops_count']
+        return counts.reindex(self.table.index, fill_value=0).astype(int)
+
+    # Replace a column's values and get the Areas whose value changed
+    def setValues(self, col_name: str, values: pd.Series) -> Set[str]:
+        if col_name in self.table:
+            old = self.table.loc[values.index, col_name].to_numpy(dtype=float)
+            new = values.to_numpy(dtype=float)
+            changed = (old != new) & ~(np.isnan(old) & np.isnan(new))
+            changed_areas = set(values.index[changed])
+        else:
+            changed_areas = set(values.index)
+        self.table.loc[values.index, col_name] = values
+        return changed_areas
+
+    # Update the min/max of a column after the values of some Areas changed
+    def updateStats(self, col_name: str, changed: Set[str]) -> bool:
+        values = self.table[col_name]
+        stats = self.stats.get(col_name)
+        if stats is None or stats.min_area in changed or stats.max_area in changed:
+            # An extreme value moved, so the new extreme can be anywhere
+            new_stats = ColumnStats(values.min(), values.max(), values.idxmin(), values.idxmax())
+        else:
+            subset = values.loc[list(changed)]
+            new_stats = ColumnStats(stats.min, stats.max, stats.min_area, stats.max_area)
+            if subset.min() < stats.min:
+                new_stats.min, new_stats.min_area = subset.min(), subset.idxmin()
+            if subset.max() > stats.max:
+                new_stats.max, new_stats.max_area = subset.max(), subset.idxmax()
+
+        self.stats[col_name] = new_stats
+        return stats is None or (new_stats.min, new_stats.max) != (stats.min, stats.max)
+
+    # Recompute every column downstream of the changed inputs, for the affected Areas only
+    def propagate(self, dirty: Dict[str, Set[str]], trigger: str) -> UpdateReport:
+        report = UpdateReport(trigger)
+
+        for column in self.columns:
+            affected = set().union(*(dirty.get(col, set()) for col in column.inputs))
+            if not affected:
+                continue
+
+            if column.normalize:
+                source = column.inputs[0]
+                if self.updateStats(source, affected):
+                    # The global min/max moved, so every Area is renormalized
+                    affected = set(self.table.index)
+                stats = self.stats[source]
+                rows = self.table.loc[sorted(affected), source]
+                values = (rows - stats.min) / (stats.max - stats.min)
+            else:
+                values = column.compute(self.table.loc[sorted(affected)])
+
+            report.recomputed[column.name] = len(affected)
+            dirty[column.name] = self.setValues(column.name, values)
+
+        self.reports.append(report)
+        return report
+
+    # Replace the stop snapshot of one type (e.g. a new DataMall pull)
+    def updateStops(self, pt_type: str, stops_gdf: gpd.GeoDataFrame) -> UpdateReport:
+        self.stops[pt_type] = stops_gdf
+        count_col = f'{pt_type}_stops_count'
+        changed = self.setValues(count_col, self.countStops(pt_type))
+        return self.propagate({count_col: changed}, f'stops:{pt_type}')
+
+    # Add Areas that get residents for the first time, with their land area and stop counts
+    def addAreas(self, population: pd.Series) -> Dict[str, Set[str]]:
+        areas = population.index
+        if areas.empty:
+            return {}
+
+        self.table = self.table.reindex(self.table.index.union(areas).rename('Area'))
+        self.table.loc[areas, 'population_count'] = population
+        self.table.loc[areas, 'land_area-km2'] = calculateGeodesicAreas(self.regions.geometry.loc[areas].to_numpy()) / 1e6
+        count_cols = [f'{pt_type}_stops_count' for pt_type in self.pt_types]
+        for pt_type, count_col in zip(self.pt_types, count_cols):
+            self.table.loc[areas, count_col] = self.countStops(pt_type).loc[areas]
+        # The empty rows turned the integer inputs into floats
+        self.table[['population_count'] + count_cols] = self.table[['population_count'] + count_cols].astype(int)
+
+        return {col: set(areas) for col in ['population_count', 'land_area-km2'] + count_cols}
+
+    # Replace the population of some or all Areas (e.g. a new hsetod year)
+    def updatePopulation(self, population: pd.DataFrame) -> UpdateReport:
+        population = population.set_index('Area')['population_count']
+        # As in the build, Areas without a region polygon cannot be analysed
+        population = population.loc[population.index.intersection(self.regions.index)].astype(int)
+
+        dirty = self.addAreas(population.loc[population.index.difference(self.table.index)])
+        changed = self.setValues('population_count', population)
+        dirty['population_count'] = dirty.get('population_count', set()) | changed
+        return self.propagate(dirty, 'population')
+
+    # Replace the polygon of one Area
+    def updateRegion(self, area: str, geometry) -> UpdateReport:
+        self.regions.loc[area, 'geometry'] = geometry
+        self.region_index = RegionIndex(self.regions.reset_index())
+        dirty = {}
+        if area in self.table.index:
+            land_area = calculateGeodesicAreas(np.array([geometry], dtype=object)) / 1e6
+            dirty['land_area-km2'] = self.setValues('land_area-km2', pd.Series(land_area, index=[area]))
+
+            # Only the stops of the edited Area need to be recounted
+            shapely.prepare(geometry)
+            for pt_type in self.pt_types:
+                geometries = self.stops[pt_type].geometry.to_numpy()
+                count = int(shapely.intersects(geometry, geometries).sum())
+                count_col = f'{pt_type}_stops_count'
+                dirty[count_col] = self.setValues(count_col, pd.Series([count], index=[area]))
+
+        return self.propagate(dirty, f'region:{area}')
+
+    # Get the analysis table with the region geometry, like regionPTHDB_df in the notebook
+    def getDataFrame(self) -> gpd.GeoDataFrame:
+        df = self.table.reset_index()
+        geometry = self.regions.geometry.loc[df['Area']].to_numpy()
+        return gpd.GeoDataFrame(df, geometry=geometry, crs=self.regions.crs)
+
+
+# Full rebuild of the discrepancy table from the input files, as run by utils.cli and utils.trends.
+# Lookup files (regions_csv, mrt_json) are passed in, so every caller and worker reads its own data directory
+
+# regions_csv gives the Area names the subzones are matched to
+def loadPopulation(csv_path: str, regions_csv: str = None) -> pd.DataFrame:
+    return cleanHDBDF(pd.read_csv(csv_path), regions_csv=regions_csv)
+
+
+def loadRegions(csv_path: str, cache_path: str) -> gpd.GeoDataFrame:
+    return createAreaGeoDF(csv_path, cache_path)
+
+
+# Train stations come from a GeoJSON, or straight from a zipped layer such as TrainStation_Jul2024.zip
+def loadTrainStations(path: str, mrt_json: str = None) -> pd.DataFrame:
+    if path.endswith('.zip'):
+        from utils.archives import loadTrainStationLayer
+        return cleanTrainStationDF(loadTrainStationLayer(path), mrt_json=mrt_json)
+    return cleanTrainStationDF(gpd.read_file(path), mrt_json=mrt_json)
+
+
+# DataMall tables come from a file when given, else from the DataMall snapshot cache
+def loadDataMallTable(path: Optional[str], dataset: str, acc_key: Optional[str], cache_dir: str) -> pd.DataFrame:
+    if path is None:
+        from utils.cache import loadSnapshot
+        return loadSnapshot(dataset, acc_key=acc_key, cache_dir=cache_dir)
+    if path.endswith('.zip'):
+        from utils.archives import loadBusStopLayer
+        return loadBusStopLayer(path)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.json'):
+        return pd.read_json(path)
+    return pd.read_csv(path)
+
+
+def loadBusStops(bus_stops_path: Optional[str], acc_key: Optional[str], cache_dir: str) -> pd.DataFrame:
+    return loadDataMallTable(bus_stops_path, 'busStops', acc_key, cache_dir)
+
+
+def loadBusNetwork(routes_path: Optional[str], services_path: Optional[str], acc_key: Optional[str],
+                   cache_dir: str, period: str):
+    from utils.bus_network import BusNetwork
+    return BusNetwork(loadDataMallTable(routes_path, 'busRoutes', acc_key, cache_dir),
+                      loadDataMallTable(services_path, 'busServices', acc_key, cache_dir), period)
+
+
+# With a bus network, every Area also gets the buses per hour calling at its stops
+def countBusStops(region_df: gpd.GeoDataFrame, busStops_df: pd.DataFrame, bus_network=None) -> pd.DataFrame:
+    if bus_network is not None:
+        return bus_network.createWeightedStopsDF(busStops_df, RegionIndex(region_df))
+    busStops_gdf = gpd.GeoDataFrame(
+        busStops_df, geometry=gpd.points_from_xy(busStops_df.Longitude, busStops_df.Latitude))
+    return createPTStopsDF(region_df, busStops_gdf, 'bus', region_index=RegionIndex(region_df))
+
+
+def countTrainStops(region_df: gpd.GeoDataFrame, trainStation_df: pd.DataFrame) -> pd.DataFrame:
+    trainStops_gdf = gpd.GeoDataFrame(trainStation_df, geometry=trainStation_df.GEOMETRY)
+    return createPTStopsDF(region_df, trainStops_gdf, 'train', region_index=RegionIndex(region_df))
+
+
+# Same steps as the discrepancy cells of 02_HDB-PT_visualization
+def createDiscrepancyDF(region_df: gpd.GeoDataFrame, population_per_area: pd.DataFrame,
+                        bus_stops_count: pd.DataFrame, train_stops_count: pd.DataFrame) -> gpd.GeoDataFrame:
+    regionPT_df = cleanRegionPTDF(region_df, bus_stops_df=bus_stops_count, train_stops_df=train_stops_count)
+
+    # Remove those that have no one living there
+    regionPTHDB_df = pd.merge(regionPT_df, population_per_area[['Area', 'population_count']], how="outer", on="Area")
+    regionPTHDB_df = regionPTHDB_df[regionPTHDB_df['population_count'].notnull()].reset_index(drop=True)
+    regionPTHDB_df['population_count'] = regionPTHDB_df['population_count'].astype(int)
+    regionPTHDB_df = getLandArea(regionPTHDB_df)
+
+    return addDensityDiscrepancies(regionPTHDB_df, PT_TYPES)
+
+
+# Train travel time from every Area to the destination stations (or 'interchanges')
+def createAccessibilityDF(region_df: gpd.GeoDataFrame, trainStation_df: pd.DataFrame, destinations) -> pd.DataFrame:
+    from utils.accessibility import TrainNetwork
+    return TrainNetwork(trainStation_df).createAccessibilityDF(region_df, destinations)
+
+
+# Same analysis over grid cells instead of Areas
+def createGridDF(region_df: gpd.GeoDataFrame, population_per_area: pd.DataFrame, busStops_df: pd.DataFrame,
+                 trainStation_df: pd.DataFrame, cell_size: float, shape: str) -> pd.DataFrame:
+    from utils.grid import SpatialGrid
+    grid = SpatialGrid(region_df, cell_size, shape)
+    return grid.createGridDF(population_per_area, {'bus': busStops_df, 'train': trainStation_df})
+
+
+# Print and save the underserved Areas (or grid cells) of every stop type
+def rankUnderservedAreas(regionPTHDB_df: pd.DataFrame, report_dir: str, num_rows: int,
+                         unit: str = 'areas') -> Dict[str, pd.DataFrame]:
+    from utils.printer import printTopUnderservedAreas
+
+    rankings = {}
+    for pt_type in PT_TYPES:
+        rankings[pt_type] = getDensityDiscrepancyDF(regionPTHDB_df, pt_type)
+        printTopUnderservedAreas(rankings[pt_type], pt_type, num_rows=num_rows)
+        rankings[pt_type].drop(columns='geometry', errors='ignore').to_csv(
+            os.path.join(report_dir, f'underserved_{pt_type}_{unit}.csv'), index=False)
+    return rankings
+
+
+# Render one of the report maps; `layer` names the geodataframe function that draws it
+def renderMap(layer: str, geo_df: gpd.GeoDataFrame, path: str, pt_type: str = None, choropleth=None) -> str:
+    from utils import geodataframe
+    from utils.maps import createSingaporeMap, saveMap
+
+    singapore_map = createSingaporeMap()
+    if pt_type is None:
+        singapore_map = getattr(geodataframe, layer)(geo_df, singapore_map, choropleth=choropleth)
+    else:
+        singapore_map = getattr(geodataframe, layer)(geo_df, singapore_map, pt_type=pt_type, choropleth=choropleth)
+    saveMap(singapore_map, path)
+    return path
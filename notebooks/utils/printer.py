@@ -1,6 +1,52 @@
-from . import pd
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 def printTopUnderservedAreas(df: pd.DataFrame, pt_type: str, num_rows: int = 5) -> None:
     print(f"Top {num_rows} Areas Needing More {pt_type.capitalize()} Stops:")
     print(df[['Area', f'{pt_type}_density_discrepancy']].head(num_rows))
     print()
+
+def printWideningAreas(growth_df: pd.DataFrame, pt_type: str, num_rows: int = 5) -> None:
+    print(f"Top {num_rows} Areas With A Widening {pt_type.capitalize()} Stop Gap:")
+    print(growth_df[growth_df['widening']][['Area', 'first_discrepancy', 'last_discrepancy', 'growth_per_year']].head(num_rows))
+    print()
+
+def printCacheReport(report) -> None:
+    age = "n/a" if report.age is None else f"{report.age.total_seconds() / 86400:.1f} days"
+    print(f"[cache] {report.dataset}: {report.status}, {report.rows} rows, "
+          f"snapshot age {age}, loaded in {report.load_seconds * 1000:.1f} ms")
+
+def printMemoryReport(name: str, before: int, after: int) -> None:
+    print(f"[memory] {name}: {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB "
+          f"({(1 - after / before) * 100 if before else 0:.0f}% smaller)")
+
+def printStageReports(reports) -> None:
+    print(f"{'stage':<24}{'wall s':>9}{'peak MiB':>10}{'+MiB':>8}{'rows':>8}  pid")
+    for report in reports:
+        peak = "n/a" if report.peak_mib is None else f"{report.peak_mib:.0f}"
+        growth = "n/a" if report.growth_mib is None else f"{report.growth_mib:.0f}"
+        rows = "-" if report.rows is None else report.rows
+        print(f"{report.stage:<24}{report.seconds:>9.2f}{peak:>10}{growth:>8}{rows:>8}  {report.pid}")
+    print()
+
+def printProfileSummary(records) -> None:
+    # One line per function, slowest total first
+    summary = {}
+    for record in records:
+        calls, seconds, peak, rows_in, rows_out = summary.get(record.function, (0, 0.0, None, None, None))
+        if record.peak_mib is not None:
+            peak = record.peak_mib if peak is None else max(peak, record.peak_mib)
+        summary[record.function] = (calls + 1, seconds + record.seconds, peak,
+                                    record.rows_in if record.rows_in is not None else rows_in,
+                                    record.rows_out if record.rows_out is not None else rows_out)
+
+    print(f"{'function':<40}{'calls':>7}{'total s':>10}{'mean ms':>10}{'peak MiB':>10}{'rows in':>9}{'rows out':>9}")
+    for function, (calls, seconds, peak, rows_in, rows_out) in sorted(summary.items(), key=lambda item: -item[1][1]):
+        peak = "n/a" if peak is None else f"{peak:.1f}"
+        rows_in = "-" if rows_in is None else rows_in
+        rows_out = "-" if rows_out is None else rows_out
+        print(f"{function:<40}{calls:>7}{seconds:>10.3f}{seconds / calls * 1000:>10.1f}{peak:>10}{rows_in:>9}{rows_out:>9}")
+    print()
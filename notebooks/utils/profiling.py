@@ -0,0 +1,239 @@
+# OPT-IN PROFILING
+# Time every public function of helper, data_cleaning, geodataframe and maps, either for a block:
+#   with profiled() as profiler: ...
+#   printProfileSummary(profiler.records)
+# or for a whole run, by setting UTILS_PROFILE=1 (and optionally UTILS_PROFILE_LOG=calls.jsonl)
+# before utils is imported
+import atexit
+import cProfile
+import functools
+import importlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional
+
+PROFILE_ENV = 'UTILS_PROFILE'
+PROFILE_LOG_ENV = 'UTILS_PROFILE_LOG'
+# Set to a stage name to dump a cProfile file of that CLI stage into UTILS_PROFILE_DIR
+PROFILE_STAGE_ENV = 'UTILS_PROFILE_STAGE'
+PROFILE_DIR_ENV = 'UTILS_PROFILE_DIR'
+
+PROFILED_MODULES = ['utils.helper', 'utils.data_cleaning', 'utils.geodataframe', 'utils.maps']
+# Library calls the utils spend most of their time in: spatial join, GeoJSON export and folium rendering
+LIBRARY_CALLS = [
+    ('geopandas', 'sjoin'),
+    ('geopandas.GeoDataFrame', 'to_json'),
+    ('folium.Map', 'save'),
+    ('folium.Map', '_repr_html_'),
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CallRecord:
+    function: str
+    seconds: float
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    peak_mib: Optional[float]   # Peak traced allocation above the memory in use when the call started
+    depth: int                  # 0 for calls made outside any other profiled function
+    pid: int
+
+
+# Get the number of rows of a DataFrame, Series, array or list, or None for anything else
+def countRows(value) -> Optional[int]:
+    shape = getattr(value, 'shape', None)
+    if isinstance(shape, tuple) and shape:
+        return shape[0]
+    if isinstance(value, list):
+        return len(value)
+    return None
+
+
+# Rows of the first table-like argument
+def countRowsIn(args: tuple, kwargs: dict) -> Optional[int]:
+    for value in (*args, *kwargs.values()):
+        rows = countRows(value)
+        if rows is not None:
+            return rows
+    return None
+
+
+def resolve(path: str):
+    module_name, _, attribute = path.rpartition('.')
+    try:
+        return importlib.import_module(path)
+    except ImportError:
+        return getattr(importlib.import_module(module_name), attribute)
+
+
+class Profiler:
+    """
+    Replaces the public functions of PROFILED_MODULES (and LIBRARY_CALLS) with
+    wrappers that record a CallRecord per call, until uninstall().
+
+    Names already imported elsewhere with `from utils.helper import ...` are
+    rebound in every loaded utils module and in __main__, so calls between the
+    utils modules and from a notebook are recorded too.
+
+    Peak memory comes from tracemalloc, which slows allocation-heavy code
+    down; pass memory=False to only record time and rows.
+    """
+
+    def __init__(self, memory: bool = True, log_path: str = None):
+        self.memory = memory
+        self.log_path = log_path
+        self.records: List[CallRecord] = []
+        # (owner, attribute, original, wrapper, whether owner defined it itself) for every patched function
+        self.patched = []
+        # [memory in use at the start, peak so far] of every profiled call in progress
+        self.stack = []
+        self.started_tracing = False
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            depth = len(self.stack)
+            self.enter()
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                self.record(CallRecord(name, seconds, countRowsIn(args, kwargs), countRows(result),
+                                       self.exit(), depth, os.getpid()))
+        return wrapper
+
+    def enter(self) -> None:
+        if not self.memory:
+            self.stack.append(None)
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        # The caller keeps its peak so far, since the peak is reset for this call
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self.stack.append([current, current])
+
+    def exit(self) -> Optional[float]:
+        frame = self.stack.pop()
+        if frame is None:
+            return None
+        start, peak = frame
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        return (peak - start) / 1024 ** 2
+
+    def record(self, record: CallRecord) -> None:
+        self.records.append(record)
+        logger.debug("%s", record)
+        if self.log_path:
+            # Opened per call, so worker processes can append to the same log
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(asdict(record)) + '\n')
+
+    def patch(self, owner, attribute: str, name: str) -> None:
+        original = getattr(owner, attribute)
+        wrapper = self.wrap(name, original)
+        self.patched.append((owner, attribute, original, wrapper, attribute in vars(owner)))
+        setattr(owner, attribute, wrapper)
+
+    def install(self) -> 'Profiler':
+        for module_name in PROFILED_MODULES:
+            module = importlib.import_module(module_name)
+            for attribute, value in list(vars(module).items()):
+                # Plain functions defined in the module; lru_cache wrappers keep their cache API
+                if (not attribute.startswith('_') and inspect.isfunction(value)
+                        and value.__module__ == module_name):
+                    self.patch(module, attribute, f"{module_name.split('.')[-1]}.{attribute}")
+
+        for owner_path, attribute in LIBRARY_CALLS:
+            self.patch(resolve(owner_path), attribute, f"{owner_path.split('.')[-1]}.{attribute}")
+
+        self.rebind({id(original): wrapper for _, _, original, wrapper, _ in self.patched})
+        return self
+
+    def uninstall(self) -> None:
+        self.rebind({id(wrapper): original for _, _, original, wrapper, _ in self.patched})
+        for owner, attribute, original, _, owned in reversed(self.patched):
+            if owned:
+                setattr(owner, attribute, original)
+            else:
+                # Inherited, e.g. folium.Map._repr_html_
+                delattr(owner, attribute)
+        self.patched = []
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    # Swap functions imported by name into other modules, keyed by id(function)
+    @staticmethod
+    def rebind(replacements: dict) -> None:
+        modules = [module for name, module in list(sys.modules.items())
+                   if name == '__main__' or name.startswith('utils.')]
+        for module in modules:
+            for attribute, value in list(vars(module).items()):
+                if id(value) in replacements:
+                    setattr(module, attribute, replacements[id(value)])
+
+
+@contextmanager
+def profiled(memory: bool = True, log_path: str = None):
+    profiler = Profiler(memory, log_path).install()
+    try:
+        yield profiler
+    finally:
+        profiler.uninstall()
+
+
+# Write a cProfile file (e.g. for snakeviz or flameprof) of everything run inside the block
+@contextmanager
+def profileStage(name: str, output_dir: str = '.'):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"{name.replace(':', '_')}.prof")
+        profile.dump_stats(path)
+        logger.info("cProfile of %s written to %s", name, path)
+
+
+# One row per call, for filtering and grouping in a notebook
+def createProfileDF(records: List[CallRecord]):
+    from utils import pd
+    return pd.DataFrame([asdict(record) for record in records], columns=list(CallRecord.__dataclass_fields__))
+
+
+# Read the records of a UTILS_PROFILE_LOG file
+def readProfileLog(log_path: str) -> List[CallRecord]:
+    with open(log_path) as f:
+        return [CallRecord(**json.loads(line)) for line in f if line.strip()]
+
+
+# Install a profiler for the whole process when UTILS_PROFILE is set, and print its summary at exit
+def enableFromEnvironment() -> Optional[Profiler]:
+    if os.environ.get(PROFILE_ENV, '').lower() in ('', '0', 'false'):
+        return None
+    profiler = Profiler(memory=os.environ[PROFILE_ENV].lower() != 'time',
+                        log_path=os.environ.get(PROFILE_LOG_ENV)).install()
+    if not profiler.log_path:
+        from utils.printer import printProfileSummary
+        atexit.register(lambda: printProfileSummary(profiler.records))
+    return profiler
@@ -0,0 +1,102 @@
+# WHAT-IF SCENARIOS FOR PLANNED MRT STATIONS
+from itertools import combinations
+from typing import Dict, List, Sequence
+import numpy as np
+from . import pd
+from utils.spatial_index import RegionIndex
+
+
+# Build the Area x candidate station incidence matrix
+def createIncidenceMatrix(areas: Sequence[str], candidates_df: pd.DataFrame, region_index: RegionIndex) -> np.ndarray:
+    area_position = {area: i for i, area in enumerate(areas)}
+    station_idx, region_idx = region_index.queryPoints(
+        candidates_df['Longitude'].to_numpy(), candidates_df['Latitude'].to_numpy())
+
+    incidence = np.zeros((len(areas), len(candidates_df)), dtype=np.float32)
+    for station, area in zip(station_idx, region_index.areas[region_idx]):
+        # Stations in Areas without residents do not affect the discrepancy
+        if area in area_position:
+            incidence[area_position[area], station] += 1
+    return incidence
+
+
+# Create every combination of named station sets (e.g. line phases) up to a given size
+def combineStationSets(station_sets: Dict[str, List[str]], max_size: int) -> Dict[str, List[str]]:
+    scenarios = {}
+    for size in range(1, max_size + 1):
+        for names in combinations(station_sets, size):
+            scenarios[' + '.join(names)] = [stn for name in names for stn in station_sets[name]]
+    return scenarios
+
+
+class ScenarioEvaluator:
+    """
+    Scores many sets of candidate stations against a baseline analysis table
+    (regionPTHDB_df in the notebook, or DensityPipeline.getDataFrame()).
+
+    The candidates are assigned to Areas once. After that, every scenario is a
+    row of a 0/1 selection matrix, and the train stop counts of all scenarios
+    come from one matrix product with the incidence matrix. Densities,
+    normalization and discrepancies then follow the notebook formulas, applied
+    to all scenarios at once.
+    """
+
+    def __init__(self, baseline_df: pd.DataFrame, candidates_df: pd.DataFrame, region_index: RegionIndex):
+        baseline_df = baseline_df.sort_values('Area').reset_index(drop=True)
+        self.areas = baseline_df['Area'].to_numpy()
+        self.land_area = baseline_df['land_area-km2'].to_numpy(dtype=float)
+        self.train_counts = baseline_df['train_stops_count'].to_numpy(dtype=float)
+        self.population_density = baseline_df['normalized_population_density'].to_numpy(dtype=float)
+
+        # Candidates need STN_NO, Longitude and Latitude
+        self.candidates = candidates_df.reset_index(drop=True)
+        self.station_position = {stn: i for i, stn in enumerate(self.candidates['STN_NO'])}
+        self.incidence = createIncidenceMatrix(self.areas, self.candidates, region_index)
+
+        self.baseline_discrepancy = self.getDiscrepancy(np.zeros((1, len(self.candidates)), dtype=np.float32))[0]
+
+    # Get the 0/1 selection matrix of a list of scenarios
+    def createSelectionMatrix(self, scenarios: Sequence[Sequence[str]]) -> np.ndarray:
+        selection = np.zeros((len(scenarios), len(self.candidates)), dtype=np.float32)
+        for row, stations in enumerate(scenarios):
+            selection[row, [self.station_position[stn] for stn in stations]] = 1
+        return selection
+
+    # Get the train density discrepancy of every Area for every scenario (scenarios x Areas)
+    def getDiscrepancy(self, selection: np.ndarray) -> np.ndarray:
+        train_counts = self.train_counts + selection @ self.incidence.T
+        density = train_counts / self.land_area
+
+        # normalizeColumn, applied per scenario
+        min_density = density.min(axis=1, keepdims=True)
+        max_density = density.max(axis=1, keepdims=True)
+        normalized = (density - min_density) / (max_density - min_density)
+
+        return self.population_density - normalized
+
+    # Rank scenarios by how much they reduce the total underserved train_density_discrepancy
+    def scoreScenarios(self, scenarios, batch_size: int = 10_000) -> pd.DataFrame:
+        # Accept either a list of station lists or a dict of named scenarios
+        if isinstance(scenarios, dict):
+            names, scenarios = list(scenarios), list(scenarios.values())
+        else:
+            names = list(range(len(scenarios)))
+
+        baseline_total = np.clip(self.baseline_discrepancy, 0, None).sum()
+        totals, underserved = [], []
+        for start in range(0, len(scenarios), batch_size):
+            discrepancy = self.getDiscrepancy(self.createSelectionMatrix(scenarios[start:start + batch_size]))
+            totals.append(np.clip(discrepancy, 0, None).sum(axis=1))
+            underserved.append((discrepancy > 0).sum(axis=1))
+
+        ranked = pd.DataFrame({
+            'scenario': names,
+            'stations': scenarios,
+            'num_stations': [len(stations) for stations in scenarios],
+            'underserved_areas': np.concatenate(underserved) if scenarios else [],
+            'train_density_discrepancy': np.concatenate(totals) if scenarios else [],
+        })
+        ranked['discrepancy_reduction'] = baseline_total - ranked['train_density_discrepancy']
+        ranked['reduction_per_station'] = ranked['discrepancy_reduction'] / ranked['num_stations'].where(ranked['num_stations'] > 0)
+
+        return ranked.sort_values('discrepancy_reduction', ascending=False).reset_index(drop=True)
@@ -0,0 +1,93 @@
+# COMPACT DTYPES FOR THE CORE DATAFRAMES
+from typing import List, Sequence, Tuple
+from . import pd
+
+# Low-cardinality string columns that are stored as categoricals
+CATEGORICAL_COLUMNS = ['PA', 'SZ', 'TOD', 'Area', 'STN_NAME', 'LINE', 'Description']
+
+# Integer columns that are downcast to the smallest width that fits
+INTEGER_COLUMNS = ['NUM', 'Year', 'Time']
+
+# Counts (and any other *_count column) stay int64, so summing them later cannot overflow
+COUNT_COLUMNS = ['HSE', 'population_count', 'total_stops']
+
+# Separator used when the TOD of an Area are joined into its 'Type'
+TYPE_SEPARATOR = ', '
+
+# Every TOD of the SingStat dwelling-type tables, in their order; bit i of a 'Type' mask is
+# TYPE_LABELS[i] in every frame and every year
+TYPE_LABELS = (
+    'HDB 1- and 2-Room Flats',
+    'HDB 3-Room Flats',
+    'HDB 4-Room Flats',
+    'HDB 5-Room and Executive Flats',
+    'HUDC Flats (excluding those privatised)',
+    'Landed Properties',
+    'Condominiums and Other Apartments',
+    'Others',
+)
+
+
+# Get the deep memory footprint of a DataFrame in bytes
+def memoryUsage(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+# Function to check whether a column holds integers that can be downcast
+def is_integer_column(df: pd.DataFrame, col_name: str) -> bool:
+    return col_name in INTEGER_COLUMNS and pd.api.types.is_integer_dtype(df[col_name])
+
+
+# Function to check whether a column holds integer counts
+def is_count_column(df: pd.DataFrame, col_name: str) -> bool:
+    if col_name not in COUNT_COLUMNS and not col_name.endswith('_count'):
+        return False
+    return pd.api.types.is_integer_dtype(df[col_name])
+
+
+# Encode the joined 'Type' strings as a bitmask over TYPE_LABELS
+def encodeTypes(types: pd.Series, labels: Sequence[str] = TYPE_LABELS) -> Tuple[pd.Series, List[str]]:
+    split_types = types.str.split(TYPE_SEPARATOR)
+    unknown = set(split_types.explode().dropna()) - set(labels)
+    if unknown:
+        raise ValueError(f"Unknown dwelling types {sorted(unknown)}, expected one of {list(labels)}")
+    bits = {label: 1 << i for i, label in enumerate(labels)}
+
+    masks = split_types.map(lambda x: sum(bits[label] for label in set(x)))
+    masks = pd.to_numeric(masks, downcast='unsigned')
+    return masks, list(labels)
+
+
+# Decode a 'Type' bitmask back into its dwelling types
+def decodeTypes(mask: int, labels: Sequence[str] = TYPE_LABELS) -> List[str]:
+    return [label for i, label in enumerate(labels) if mask & (1 << i)]
+
+
+# Convert string columns to categoricals and downcast integer columns
+def optimizeDtypes(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for col_name in df.columns:
+        if col_name in CATEGORICAL_COLUMNS and not isinstance(df[col_name].dtype, pd.CategoricalDtype):
+            # Lists and geometries cannot be categorized
+            if pd.api.types.infer_dtype(df[col_name], skipna=True) == 'string':
+                df[col_name] = df[col_name].astype('category')
+        elif is_integer_column(df, col_name):
+            # Signed so that differences (e.g. between years) cannot wrap around
+            df[col_name] = pd.to_numeric(df[col_name], downcast='integer')
+        elif is_count_column(df, col_name):
+            df[col_name] = df[col_name].astype('int64')
+
+    if 'Type' in df.columns and pd.api.types.is_string_dtype(df['Type']):
+        df['Type'], df.attrs['Type_labels'] = encodeTypes(df['Type'])
+
+    return df
+
+
+# Compact a DataFrame and report its memory footprint before and after
+def compactDF(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    before = memoryUsage(df)
+    df = optimizeDtypes(df)
+
+    from utils.printer import printMemoryReport
+    printMemoryReport(name, before, memoryUsage(df))
+    return df
@@ -0,0 +1,79 @@
+# REGION SPATIAL INDEX
+from typing import Dict, Tuple
+import numpy as np
+import shapely
+from . import pd, gpd
+
+
+class RegionIndex:
+    """
+    STRtree over the Area polygons, built once and reused for every stop type.
+
+    Queries use the same 'intersects' predicate as gpd.sjoin, so a stop lying on
+    a shared boundary is counted in both Areas exactly as createPTStopsDF did.
+    """
+
+    def __init__(self, geo_df: gpd.GeoDataFrame = None):
+        if geo_df is None:
+            from utils.geodataframe import createAreaGeoDF
+            geo_df = createAreaGeoDF()
+
+        self.areas = geo_df['Area'].to_numpy()
+        self.geometries = geo_df.geometry.to_numpy().copy()
+        # Prepared polygons make the exact point-in-polygon test cheap
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+        # Latest assignment of every stop type, with the stops frame and the length it was computed for
+        self.assignments: Dict[str, Tuple[gpd.GeoDataFrame, int, gpd.GeoDataFrame]] = {}
+
+    # Get (point index, region index) pairs for point geometries
+    def queryPointGeometries(self, points: np.ndarray) -> np.ndarray:
+        # The tree narrows each point down to the regions whose bounding box contains it,
+        # then the exact test runs on the coordinates against the prepared regions
+        point_idx, region_idx = self.tree.query(points)
+        hits = shapely.intersects_xy(
+            self.geometries[region_idx], shapely.get_x(points)[point_idx], shapely.get_y(points)[point_idx])
+        return np.vstack([point_idx[hits], region_idx[hits]])
+
+    # Get (point index, region index) pairs for arrays of coordinates
+    def queryPoints(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        return self.queryPointGeometries(shapely.points(lon, lat))
+
+    # Get (geometry index, region index) pairs for any array of geometries
+    def queryGeometries(self, geometries: np.ndarray) -> np.ndarray:
+        return self.tree.query(geometries, predicate='intersects')
+
+    # Get the Area of every point, or None when it falls outside all regions
+    def assignPoints(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        point_idx, region_idx = self.queryPoints(lon, lat)
+        # Points on a shared boundary keep their first matching region
+        point_idx, first = np.unique(point_idx, return_index=True)
+        assigned = np.full(len(lon), None, dtype=object)
+        assigned[point_idx] = self.areas[region_idx[first]]
+        return assigned
+
+    # Attach the Area to every stop, with one row per (stop, Area) match like an inner sjoin
+    # The assignment is reused while the same frame comes back with the same length, so a new year or
+    # an edited copy is never served the assignment of other stops; pass refresh=True after editing
+    # the geometries of a frame in place
+    def assignStops(self, stops_gdf: gpd.GeoDataFrame, pt_type: str, refresh: bool = False) -> gpd.GeoDataFrame:
+        cached = self.assignments.get(pt_type)
+        if not refresh and cached is not None and cached[0] is stops_gdf and cached[1] == len(stops_gdf):
+            return cached[2]
+
+        geometries = stops_gdf.geometry.to_numpy()
+        if (shapely.get_type_id(geometries) == 0).all():
+            stop_idx, region_idx = self.queryPointGeometries(geometries)
+        else:
+            stop_idx, region_idx = self.queryGeometries(geometries)
+
+        assigned = stops_gdf.iloc[stop_idx].copy()
+        assigned['Area'] = self.areas[region_idx]
+        # The frame itself is held, so no later frame can take its identity
+        self.assignments[pt_type] = (stops_gdf, len(stops_gdf), assigned)
+        return assigned
+
+    # Count the stops of one type in every Area, in the same format as createPTStopsDF
+    def countStops(self, stops_gdf: gpd.GeoDataFrame, pt_type: str, refresh: bool = False) -> pd.DataFrame:
+        assigned = self.assignStops(stops_gdf, pt_type, refresh)
+        return assigned.groupby('Area').size().reset_index(name=f'{pt_type}_stops_count')
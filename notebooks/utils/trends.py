@@ -0,0 +1,113 @@
+# MULTI-YEAR TREND ANALYSIS
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+import numpy as np
+from . import pd, gpd
+from utils.pipeline import PT_TYPES, createDiscrepancyDF, loadBusStops, loadPopulation, loadTrainStations
+from utils.spatial_index import RegionIndex
+
+# Regions, their index and the lookup files, set once per worker process by initTrendWorker
+WORKER_STATE = {}
+
+
+@dataclass
+class Snapshot:
+    year: int
+    population: str       # hsetod-style CSV, as read by cleanHDBDF
+    bus_stops: str        # CSV/JSON/Parquet with Longitude and Latitude
+    train_stations: str   # Anything gpd.read_file reads, e.g. TrainStationCoordinates.json
+
+
+# Build the shared state of a worker: the geometry arrives once per worker (or not at all with fork),
+# then the STRtree and the geodesic land areas are computed once and reused for every year
+def initTrendWorker(regions: gpd.GeoDataFrame, regions_csv: str = None, mrt_json: str = None) -> None:
+    from utils.geodataframe import getLandArea
+    WORKER_STATE.update(regions_csv=regions_csv, mrt_json=mrt_json)
+    WORKER_STATE['regions'] = regions
+    WORKER_STATE['region_index'] = RegionIndex(regions)
+    # Fills LAND_AREA_CACHE for every Area
+    getLandArea(regions[['Area', 'geometry']].copy())
+
+
+# Run the per-Area discrepancy pipeline for one snapshot, in a worker set up by initTrendWorker
+def analyseSnapshot(snapshot: Snapshot) -> pd.DataFrame:
+    regions, region_index = WORKER_STATE['regions'], WORKER_STATE['region_index']
+    bus_df = loadBusStops(snapshot.bus_stops, None, None)
+    train_df = loadTrainStations(snapshot.train_stations, WORKER_STATE['mrt_json'])
+    bus_gdf = gpd.GeoDataFrame(bus_df, geometry=gpd.points_from_xy(bus_df.Longitude, bus_df.Latitude))
+    train_gdf = gpd.GeoDataFrame(train_df, geometry=train_df.GEOMETRY)
+
+    bus_counts = region_index.countStops(bus_gdf, 'bus')
+    train_counts = region_index.countStops(train_gdf, 'train')
+    population = loadPopulation(snapshot.population, WORKER_STATE['regions_csv'])
+    year_df = createDiscrepancyDF(regions, population, bus_counts, train_counts)
+    return pd.DataFrame(year_df.drop(columns='geometry')).assign(Year=snapshot.year)
+
+
+# Run every snapshot, in parallel worker processes when workers > 1
+def analyseSnapshots(regions: gpd.GeoDataFrame, snapshots: Sequence[Snapshot], workers: int = 1,
+                     regions_csv: str = None, mrt_json: str = None) -> pd.DataFrame:
+    if workers > 1 and len(snapshots) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(snapshots)), initializer=initTrendWorker,
+                                 initargs=(regions, regions_csv, mrt_json)) as pool:
+            years = list(pool.map(analyseSnapshot, snapshots))
+    else:
+        initTrendWorker(regions, regions_csv, mrt_json)
+        years = [analyseSnapshot(snapshot) for snapshot in snapshots]
+    return pd.concat(years, ignore_index=True)
+
+
+# Year x Area matrix of one discrepancy column
+def createTrendMatrix(trend_df: pd.DataFrame, pt_type: str = 'total') -> pd.DataFrame:
+    return trend_df.pivot_table(index='Year', columns='Area', values=f'{pt_type}_density_discrepancy')
+
+
+# Get the least-squares change per year of every Area (column), skipping the years an Area is missing
+def getGrowthRates(matrix: pd.DataFrame) -> pd.Series:
+    years = matrix.index.to_numpy(dtype=float)[:, None]
+    values = matrix.to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+    n = observed.sum(axis=0)
+
+    year_mean = np.where(observed, years, 0).sum(axis=0) / np.maximum(n, 1)
+    value_mean = np.nansum(values, axis=0) / np.maximum(n, 1)
+    dx = np.where(observed, years - year_mean, 0)
+    dy = np.where(observed, values - value_mean, 0)
+    variance = (dx ** 2).sum(axis=0)
+    slope = np.divide((dx * dy).sum(axis=0), variance, out=np.full(len(n), np.nan), where=variance > 0)
+    return pd.Series(slope, index=matrix.columns, name='growth_per_year')
+
+
+# Rank the Areas whose discrepancy is growing fastest, with their first and last year values
+def createGrowthDF(trend_df: pd.DataFrame, pt_type: str = 'total') -> pd.DataFrame:
+    matrix = createTrendMatrix(trend_df, pt_type)
+    first = matrix.apply(lambda col: col.dropna().iloc[0] if col.notna().any() else np.nan)
+    last = matrix.apply(lambda col: col.dropna().iloc[-1] if col.notna().any() else np.nan)
+
+    growth_df = pd.DataFrame({
+        'first_discrepancy': first,
+        'last_discrepancy': last,
+        'growth_per_year': getGrowthRates(matrix),
+        'years': matrix.notna().sum(),
+    }).rename_axis('Area').reset_index()
+    growth_df['widening'] = growth_df['growth_per_year'] > 0
+    return growth_df.sort_values('growth_per_year', ascending=False, na_position='last').reset_index(drop=True)
+
+
+# Load the snapshots, analyse every year and build the matrix and growth table for each stop type
+# regions_csv and mrt_json are the lookup files of cleanHDBDF and cleanTrainStationDF (helper defaults when None)
+def analyseTrends(regions: gpd.GeoDataFrame, snapshots: Sequence[Snapshot], workers: int = 1,
+                  regions_csv: str = None, mrt_json: str = None) -> Dict[str, pd.DataFrame]:
+    snapshots = sorted(snapshots, key=lambda snapshot: snapshot.year)
+    trend_df = analyseSnapshots(regions, snapshots, workers, regions_csv, mrt_json)
+    results = {'trend': trend_df}
+    for pt_type in PT_TYPES:
+        results[f'{pt_type}_matrix'] = createTrendMatrix(trend_df, pt_type)
+        results[f'{pt_type}_growth'] = createGrowthDF(trend_df, pt_type)
+    return results
+
+
+def parseSnapshots(values: List[List[str]]) -> List[Snapshot]:
+    return [Snapshot(int(year), population, bus_stops, train_stations)
+            for year, population, bus_stops, train_stations in values]